@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
-from .models import TexFile
+from .models import ConversionJob, TexFile
 
 
 
@@ -122,3 +122,162 @@ def delete_tex_file(
     """
     db.delete(tex_file)
     db.commit()
+
+
+
+
+# CONVERSION JOBS
+
+
+
+def create_conversion_job(
+    db: Session,
+    file_bytes: bytes,
+    file_category: str,
+    context: str,
+    filename: str | None = None,
+    page_selection: str | None = None
+):
+    """
+    Persist a queued conversion job together with its upload.
+    """
+    job = ConversionJob(
+        status="queued",
+        context=context,
+        filename=filename,
+        page_selection=page_selection,
+        file_category=file_category,
+        input_data=file_bytes,
+        pages_done=0,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow(),
+    )
+
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    return job
+
+
+def get_conversion_job(
+    db: Session,
+    job_id
+):
+    """
+    Retrieve a conversion job by id, or None.
+    """
+    return (
+        db.query(ConversionJob)
+        .filter(ConversionJob.id == job_id)
+        .first()
+    )
+
+
+def list_queued_conversion_jobs(
+    db: Session
+):
+    """
+    Jobs waiting for a worker, oldest first (used to resume after a restart).
+    """
+    return (
+        db.query(ConversionJob)
+        .filter(ConversionJob.status == "queued")
+        .order_by(ConversionJob.created_at.asc())
+        .all()
+    )
+
+
+def update_conversion_job(
+    db: Session,
+    job: ConversionJob,
+    **fields
+):
+    """
+    Set the given columns on a conversion job and persist them.
+    """
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.updated_at = datetime.utcnow()
+
+    db.commit()
+    db.refresh(job)
+
+    return job
+
+
+def claim_conversion_job(
+    db: Session,
+    job_id
+) -> bool:
+    """
+    Atomically move a queued job that still has its upload to "running".
+    False when another worker claimed it first (or it is not claimable).
+    """
+    claimed = (
+        db.query(ConversionJob)
+        .filter(
+            ConversionJob.id == job_id,
+            ConversionJob.status == "queued",
+            ConversionJob.input_data.isnot(None),
+        )
+        .update(
+            {"status": "running", "pages_done": 0, "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+
+    return claimed == 1
+
+
+def touch_conversion_job(
+    db: Session,
+    job_id
+) -> None:
+    """
+    Refresh a running job's updated_at, its lease heartbeat.
+    """
+    (
+        db.query(ConversionJob)
+        .filter(ConversionJob.id == job_id, ConversionJob.status == "running")
+        .update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+
+
+def requeue_stale_conversion_jobs(
+    db: Session,
+    stale_before: datetime
+):
+    """
+    Put running jobs whose worker stopped updating them before `stale_before`
+    back in the queue. Returns the ids this call re-queued; each update is
+    conditional, so two workers recovering at once never both get a job.
+    """
+    stale_ids = [
+        job_id
+        for (job_id,) in db.query(ConversionJob.id)
+        .filter(ConversionJob.status == "running", ConversionJob.updated_at < stale_before)
+        .order_by(ConversionJob.created_at.asc())
+        .all()
+    ]
+    requeued = []
+    for job_id in stale_ids:
+        updated = (
+            db.query(ConversionJob)
+            .filter(
+                ConversionJob.id == job_id,
+                ConversionJob.status == "running",
+                ConversionJob.updated_at < stale_before,
+            )
+            .update(
+                {"status": "queued", "pages_done": 0, "updated_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if updated == 1:
+            requeued.append(job_id)
+
+    return requeued
@@ -12,7 +12,7 @@ relationships
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, Index, String, Text, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Index, Integer, LargeBinary, String, Text, TIMESTAMP, ForeignKey
 from .base import Base
 
 
@@ -100,3 +100,112 @@ class TexFile(Base):
         default=datetime.utcnow,
         onupdate=datetime.utcnow
     )
+
+
+class ConversionJob(Base):
+    __tablename__ = "conversion_jobs"
+    __table_args__ = (
+        Index("ix_conversion_jobs_status", "status"),
+    )
+
+    id = Column(
+        String(36),
+        primary_key=True,
+        default=lambda: str(uuid.uuid4())
+    )
+
+    # queued | running | done | failed
+    status = Column(
+        Text,
+        nullable=False,
+        default="queued"
+    )
+
+    context = Column(
+        Text,
+        nullable=False,
+        default="general"
+    )
+
+    filename = Column(
+        Text,
+        nullable=True
+    )
+
+    file_category = Column(
+        Text,
+        nullable=False
+    )
+
+    # Comma-separated 1-based PDF pages to convert; NULL means the default pages.
+    page_selection = Column(
+        Text,
+        nullable=True
+    )
+
+    # Upload bytes, kept until the job finishes so it can be resumed after a restart.
+    input_data = Column(
+        LargeBinary,
+        nullable=True
+    )
+
+    pages_total = Column(
+        Integer,
+        nullable=True
+    )
+
+    pages_done = Column(
+        Integer,
+        nullable=False,
+        default=0
+    )
+
+    latex = Column(
+        Text,
+        nullable=True
+    )
+
+    raw_text = Column(
+        Text,
+        nullable=True
+    )
+
+    # JSON list of per-page summaries.
+    pages = Column(
+        Text,
+        nullable=True
+    )
+
+    # JSON list of pages left out as blank or duplicate.
+    skipped_pages = Column(
+        Text,
+        nullable=True
+    )
+
+    processing_time_ms = Column(
+        Integer,
+        nullable=True
+    )
+
+    error = Column(
+        Text,
+        nullable=True
+    )
+
+    error_status = Column(
+        Integer,
+        nullable=True
+    )
+
+    created_at = Column(
+        TIMESTAMP,
+        nullable=False,
+        default=datetime.utcnow
+    )
+
+    updated_at = Column(
+        TIMESTAMP,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow
+    )
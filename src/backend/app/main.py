@@ -12,10 +12,16 @@ load_dotenv(_env_path)
 
 from app.routes.convert import router as convert_router
 from app.routes.export import router as export_router
+from app.routes.metrics import router as metrics_router
 from app.routes.tex_export import router as tex_export_router
 from app.routes import tex
 from app.db.base import Base
 from app.db.session import engine
+from app.services.conversion_jobs import conversion_jobs
+from app.services.gemini import close_client
+from app.utils.executors import CONVERT_CPU_BACKEND, shutdown_process_executor, warm_process_pool
+from app.utils.shared_pages import warm_up
+from app.utils.uploads import MAX_FILE_SIZE_BYTES, MULTIPART_OVERHEAD_BYTES, UploadSizeLimitMiddleware
 
 app = FastAPI()
 
@@ -38,6 +44,34 @@ def _startup():
     Base.metadata.create_all(bind=engine)
 
 
+@app.on_event("startup")
+async def _start_conversion_jobs():
+    # Runs after _startup, so the conversion_jobs table exists before recovery.
+    await conversion_jobs.start()
+
+
+@app.on_event("startup")
+async def _start_process_pool():
+    if CONVERT_CPU_BACKEND == "process":
+        await warm_process_pool(warm_up)
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await conversion_jobs.stop()
+    close_client()
+    shutdown_process_executor()
+
+
+# UPLOAD SIZE LIMIT (added before CORS so 413s still carry CORS headers)
+
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_bytes=MAX_FILE_SIZE_BYTES + MULTIPART_OVERHEAD_BYTES,
+)
+
+
 # CORS
 
 
@@ -56,6 +90,7 @@ app.add_middleware(
 
 app.include_router(convert_router, prefix="/api")
 app.include_router(export_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
 app.include_router(tex.router)  # tex routes already include /api
 app.include_router(tex_export_router, prefix="/api")
 
@@ -1,27 +1,80 @@
-import io
-import os
+import json
+import logging
 import tempfile
 import time
-from typing import List
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, File, HTTPException, Query, UploadFile
-from PIL import UnidentifiedImageError
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
 
-from app.services.gemini import convert_image_to_latex
-from app.services.latex import extract_document_body, wrap_latex_document
-from app.utils.image import preprocess_image
-from app.utils.pdf import pdf_to_images
+from app.db import crud
+from app.deps import get_db
+from app.services.conversion_jobs import conversion_jobs, job_to_dict
+from app.services.gemini import GenerationProfile, get_generation_profile
+from app.services.metrics import StageTimer
+from app.utils.executors import run_storage
+from app.utils.pdf import parse_page_ranges
+from app.utils.uploads import (
+    MAX_FILE_SIZE_BYTES,
+    PDF_MAGIC,
+    UPLOAD_CHUNK_SIZE,
+    Upload,
+    too_large_detail,
+)
+from app.services.convert_pipeline import (
+    MAX_PDF_PAGES,
+    ConversionError,
+    PageDelta,
+    assemble_document,
+    convert_pages,
+    iter_page_events,
+    page_summary,
+    pages_to_convert,
+    prepare_pages,
+    skipped_pages,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-MAX_FILE_SIZE_BYTES = 10 * 1024 * 1024
 ACCEPTED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
 ACCEPTED_PDF_TYPES = {"application/pdf"}
 ALL_ACCEPTED_TYPES = ACCEPTED_IMAGE_TYPES | ACCEPTED_PDF_TYPES
 
 
-def _validate_upload(file: UploadFile, file_bytes: bytes) -> str:
-    """Validate the uploaded file and return its category: 'image' or 'pdf'."""
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=too_large_detail(MAX_FILE_SIZE_BYTES))
+
+
+async def _spool_pdf(file: UploadFile, first_chunk: bytes) -> Upload:
+    # Copy chunk by chunk so no more than one chunk of the PDF is in memory.
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    upload = Upload(category="pdf", size=0, path=tmp.name)
+    try:
+        with tmp:
+            chunk = first_chunk
+            while chunk:
+                upload.size += len(chunk)
+                if upload.size > MAX_FILE_SIZE_BYTES:
+                    raise _too_large()
+                await run_storage(tmp.write, chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        upload.close()
+        raise
+    return upload
+
+
+async def _read_upload(file: UploadFile) -> Upload:
+    """
+    Validate the uploaded file and read it in chunks: images into memory,
+    PDFs spooled to a temporary file. Oversized files fail with 413 before
+    they are read; the PDF magic is checked on the first chunk.
+    """
     content_type = file.content_type or ""
 
     if content_type not in ALL_ACCEPTED_TYPES:
@@ -30,97 +83,245 @@ def _validate_upload(file: UploadFile, file_bytes: bytes) -> str:
             detail="Supported formats: jpeg, png, webp, pdf",
         )
 
-    if len(file_bytes) > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(status_code=413, detail="File too large (max 10MB)")
+    if file.size is not None and file.size > MAX_FILE_SIZE_BYTES:
+        raise _too_large()
 
     if content_type in ACCEPTED_PDF_TYPES:
-        if not file_bytes.startswith(b"%PDF"):
+        first_chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not first_chunk.startswith(PDF_MAGIC):
             raise HTTPException(status_code=422, detail="Invalid PDF file")
-        return "pdf"
+        return await _spool_pdf(file, first_chunk)
+
+    # One read of at most MAX_FILE_SIZE_BYTES + 1 bytes, so a file whose size
+    # was not reported still cannot be read past the limit.
+    data = await file.read(MAX_FILE_SIZE_BYTES + 1)
+    if len(data) > MAX_FILE_SIZE_BYTES:
+        raise _too_large()
+    return Upload(category="image", size=len(data), data=data)
 
-    return "image"
 
+def _parse_pages(pages: Optional[str]) -> Optional[List[int]]:
+    if pages is None or not pages.strip():
+        return None
+    try:
+        return parse_page_ranges(pages, limit=MAX_PDF_PAGES)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid pages: {exc}")
+
+
+PAGES_QUERY = Query(
+    default=None,
+    description='1-based PDF pages to convert, e.g. "2-4,7" (max 5). Ignored for images.',
+)
+
+
+def generation_profile(
+    context: str = Query(default="general"),
+    thinking_budget: Optional[int] = Query(
+        default=None,
+        ge=-1,
+        le=32768,
+        description="Thinking tokens per page (0 = off, -1 = model decides), fitted to the model's range.",
+    ),
+    max_output_tokens: Optional[int] = Query(default=None, ge=1, le=65536),
+    temperature: Optional[float] = Query(default=None, ge=0, le=2),
+    deadline_s: Optional[float] = Query(default=None, gt=0, le=600, description="Hard limit per Gemini call."),
+) -> GenerationProfile:
+    """The context's generation profile with any per-request overrides applied."""
+    return get_generation_profile(context).with_overrides(
+        thinking_budget=thinking_budget,
+        max_output_tokens=max_output_tokens,
+        temperature=temperature,
+        deadline_s=deadline_s,
+    )
 
-def _image_to_base64(img) -> str:
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return preprocess_image(buf.getvalue())
+
+def _profile_override(profile: GenerationProfile) -> Optional[GenerationProfile]:
+    # None lets the pipeline use the context's own profile.
+    return profile if profile.overridden else None
+
+
+def _finish_timer(timer: StageTimer, results) -> dict:
+    # Post-processing runs per page inside the gemini stage; report its sum.
+    timer.add("postprocess", sum(result.timings.get("postprocess", 0.0) for result in results))
+    timings = timer.finish()
+    timer.record("convert_stage_ms")
+    return timings
 
 
 @router.post("/convert")
 async def convert(
+    response: Response,
     file: UploadFile = File(...),
     context: str = Query(default="general"),
+    pages: Optional[str] = PAGES_QUERY,
+    profile: GenerationProfile = Depends(generation_profile),
 ):
-    file_bytes = await file.read()
-    file_category = _validate_upload(file, file_bytes)
+    timer = StageTimer()
+    with timer.stage("validate"):
+        page_selection = _parse_pages(pages)
+        upload = await _read_upload(file)
 
     start = time.time()
 
-    page_bodies: List[str] = []
-    raw_text_pages: List[str] = []
-
-    if file_category == "image":
-        # --- Single image path ---
-        try:
-            base64_img = preprocess_image(file_bytes)
-        except (UnidentifiedImageError, OSError, ValueError):
-            raise HTTPException(status_code=422, detail="Invalid image file")
-
-        try:
-            raw = convert_image_to_latex(base64_img, context=context)
-        except Exception as exc:
-            message = str(exc) or "Gemini API error"
-            if "429" in message:
-                raise HTTPException(status_code=429, detail="Gemini rate limit")
-            if "503" in message or "ServiceUnavailable" in message:
-                raise HTTPException(status_code=503, detail="Service unavailable")
-            raise HTTPException(status_code=500, detail=f"Gemini API error: {message}")
-
-        raw_text_pages.append(raw)
-        page_bodies.append(extract_document_body(raw))
-
-    else:
-        # --- PDF path (multi-page) ---
-        temp_path = None
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(file_bytes)
-                temp_path = tmp.name
-
-            images = pdf_to_images(temp_path, max_pages=5)
-            if not images:
-                raise HTTPException(status_code=422, detail="No pages found in PDF")
-
-            for img in images:
-                base64_img = _image_to_base64(img)
-                try:
-                    raw = convert_image_to_latex(base64_img, context=context)
-                except Exception as exc:
-                    message = str(exc) or "Gemini API error"
-                    if "429" in message:
-                        raise HTTPException(status_code=429, detail="Gemini rate limit")
-                    if "503" in message or "ServiceUnavailable" in message:
-                        raise HTTPException(status_code=503, detail="Service unavailable")
-                    raise HTTPException(status_code=500, detail=f"Gemini API error: {message}")
-
-                raw_text_pages.append(raw)
-                page_bodies.append(extract_document_body(raw))
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except OSError:
-                    pass
-
-    combined_body = "\n\n".join(page_bodies)
-    latex = wrap_latex_document(combined_body)
-    raw_text = "\n\n".join(raw_text_pages)
+    try:
+        prepared = await prepare_pages(upload.source, upload.category, page_selection, timer=timer)
+        with timer.stage("gemini"):
+            results = await convert_pages(prepared, context, _profile_override(profile))
+    except ConversionError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    finally:
+        upload.close()
+
+    with timer.stage("assemble"):
+        latex, raw_text = assemble_document(results)
 
     processing_ms = int((time.time() - start) * 1000)
+    timings = _finish_timer(timer, results)
+    response.headers["Server-Timing"] = timer.server_timing()
     return {
         "success": True,
         "latex": latex,
         "raw_text": raw_text,
         "processing_time_ms": processing_ms,
+        "timings_ms": timings,
+        "generation": profile.as_dict(),
+        "pages": [page_summary(result) for result in results],
+        "skipped_pages": skipped_pages(prepared),
     }
+
+
+async def _stream_events(
+    upload: Upload,
+    context: str,
+    page_selection: Optional[List[int]],
+    tokens: bool = False,
+    timer: Optional[StageTimer] = None,
+    profile: Optional[GenerationProfile] = None,
+) -> AsyncIterator[dict]:
+    start = time.time()
+    timer = timer or StageTimer()
+    profile = profile or get_generation_profile(context)
+    try:
+        prepared = await prepare_pages(upload.source, upload.category, page_selection, timer=timer)
+        total = len(pages_to_convert(prepared))
+        yield {
+            "event": "start",
+            "total_pages": total,
+            "skipped_pages": skipped_pages(prepared),
+            "generation": profile.as_dict(),
+        }
+
+        results = []
+        # Includes time spent sending events, which the client paces.
+        gemini_started = time.perf_counter()
+        async for result in iter_page_events(
+            prepared, context, stream_tokens=tokens, profile=_profile_override(profile)
+        ):
+            if isinstance(result, PageDelta):
+                # Only with tokens=true: body text of a page still being generated.
+                yield {"event": "delta", "page": result.page, "latex": result.text}
+                continue
+            results.append(result)
+            yield {
+                "event": "page",
+                **page_summary(result),
+                "latex": result.body,
+                "raw_text": result.raw_text,
+                "elapsed_ms": result.elapsed_ms,
+                "completed": len(results),
+                "total_pages": total,
+            }
+    except ConversionError as exc:
+        yield {"event": "error", "success": False, "status": exc.status_code, "error": exc.detail}
+        return
+    except Exception:
+        logger.error("Streaming conversion failed", exc_info=True)
+        yield {"event": "error", "success": False, "status": 500, "error": "Internal server error"}
+        return
+    timer.add("gemini", (time.perf_counter() - gemini_started) * 1000)
+
+    results.sort(key=lambda result: result.page)
+    with timer.stage("assemble"):
+        latex, raw_text = assemble_document(results)
+    yield {
+        "event": "done",
+        "success": True,
+        "latex": latex,
+        "raw_text": raw_text,
+        "processing_time_ms": int((time.time() - start) * 1000),
+        "timings_ms": _finish_timer(timer, results),
+        "generation": profile.as_dict(),
+        "pages": [page_summary(result) for result in results],
+        "skipped_pages": skipped_pages(prepared),
+    }
+
+
+async def _ndjson(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield (json.dumps(event) + "\n").encode("utf-8")
+
+
+@router.post("/convert/stream")
+async def convert_stream(
+    file: UploadFile = File(...),
+    context: str = Query(default="general"),
+    pages: Optional[str] = PAGES_QUERY,
+    tokens: bool = Query(default=False, description="Also stream each page's LaTeX body as it is generated."),
+    profile: GenerationProfile = Depends(generation_profile),
+):
+    """
+    Same conversion as /convert, streamed as NDJSON: a `start` event, one `page`
+    event per page as soon as it is ready, then `done` with the assembled document.
+    With `tokens=true`, `delta` events carry each page's body text as Gemini
+    generates it; the page's `page` event still has the complete body.
+    Failures after the stream has started arrive as an `error` event.
+    """
+    timer = StageTimer()
+    with timer.stage("validate"):
+        page_selection = _parse_pages(pages)
+        upload = await _read_upload(file)
+
+    return StreamingResponse(
+        _ndjson(_stream_events(upload, context, page_selection, tokens, timer, profile)),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(upload.close),
+    )
+
+
+@router.post("/convert/jobs", status_code=202)
+async def submit_convert_job(
+    file: UploadFile = File(...),
+    context: str = Query(default="general"),
+    pages: Optional[str] = PAGES_QUERY,
+):
+    """
+    Queue a conversion and return its job id at once; poll /convert/jobs/{job_id}.
+    """
+    page_selection = _parse_pages(pages)
+    upload = await _read_upload(file)
+    try:
+        # Jobs keep their upload in the database so they survive a restart.
+        file_bytes = upload.data if upload.path is None else await run_storage(Path(upload.path).read_bytes)
+    finally:
+        upload.close()
+
+    job_id = await conversion_jobs.submit(
+        file_bytes,
+        upload.category,
+        context,
+        filename=file.filename,
+        pages=page_selection,
+    )
+    return {"success": True, "job_id": job_id, "status": "queued"}
+
+
+@router.get("/convert/jobs/{job_id}")
+def get_convert_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+):
+    job = crud.get_conversion_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
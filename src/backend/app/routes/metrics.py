@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from app.services.metrics import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics():
+    """Counters and timing summaries from the convert pipeline (this process only)."""
+    return {"success": True, **metrics.snapshot()}
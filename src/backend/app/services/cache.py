@@ -0,0 +1,175 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+CONVERT_CACHE_ENABLED = os.getenv("CONVERT_CACHE_ENABLED", "1").lower() in {"1", "true", "yes"}
+CONVERT_CACHE_MEMORY_ENTRIES = int(os.getenv("CONVERT_CACHE_MEMORY_ENTRIES", "256"))
+CONVERT_CACHE_DIR = os.getenv(
+    "CONVERT_CACHE_DIR",
+    str(Path(tempfile.gettempdir()) / "monogram-convert-cache"),
+)
+CONVERT_CACHE_DISK_MAX_BYTES = int(os.getenv("CONVERT_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+def conversion_cache_key(
+    image: bytes,
+    context: str,
+    model: str,
+    prompt_version: str,
+) -> str:
+    """
+    Content address for one page conversion: the preprocessed page plus
+    everything that changes what Gemini would return for it.
+    """
+    digest = hashlib.sha256()
+    digest.update(image)
+    for part in (context, model, prompt_version):
+        digest.update(b"\0")
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Two-tier cache of raw Gemini output keyed by `conversion_cache_key`.
+
+    - Memory: LRU bounded by entry count.
+    - Disk: one file per key, bounded by total bytes; least recently used
+      files (by mtime, refreshed on read) are evicted first.
+    """
+
+    def __init__(
+        self,
+        memory_entries: int = CONVERT_CACHE_MEMORY_ENTRIES,
+        disk_dir: str | Path | None = CONVERT_CACHE_DIR,
+        disk_max_bytes: int = CONVERT_CACHE_DISK_MAX_BYTES,
+    ):
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir and disk_max_bytes > 0 else None
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*.tex"))
+
+    @property
+    def on_disk(self) -> bool:
+        return self.disk_dir is not None
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """The memory tier only; never touches the disk, so it is safe on the event loop."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            return value
+
+    def set_memory(self, key: str, value: str) -> None:
+        self._memory_set(key, value)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+
+        value = self._disk_get(key)
+        if value is not None:
+            self._memory_set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._memory_set(key, value)
+        self._disk_set(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self.disk_dir is not None:
+                for path in self.disk_dir.glob("*.tex"):
+                    path.unlink(missing_ok=True)
+                self._disk_bytes = 0
+
+    def _memory_set(self, key: str, value: str) -> None:
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.tex"
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            value = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def _disk_set(self, key: str, value: str) -> None:
+        if self.disk_dir is None:
+            return
+        data = value.encode("utf-8")
+        if len(data) > self.disk_max_bytes:
+            return
+
+        path = self._path(key)
+        with self._lock:
+            try:
+                previous = path.stat().st_size
+            except OSError:
+                previous = 0
+            tmp_name = None
+            try:
+                fd, tmp_name = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+                with os.fdopen(fd, "wb") as handle:
+                    handle.write(data)
+                os.replace(tmp_name, path)
+            except OSError:
+                # The disk tier is best effort; a full or missing directory
+                # only costs the entry.
+                if tmp_name is not None:
+                    Path(tmp_name).unlink(missing_ok=True)
+                return
+            self._disk_bytes += len(data) - previous
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        entries = []
+        for path in self.disk_dir.glob("*.tex"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._disk_bytes = total
+
+
+def _cache_from_env() -> ConversionCache:
+    if not CONVERT_CACHE_ENABLED:
+        return ConversionCache(memory_entries=0, disk_dir=None)
+    return ConversionCache()
+
+
+conversion_cache = _cache_from_env()
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.db.session import SessionLocal
+from app.services.convert_pipeline import (
+    ConversionError,
+    assemble_document,
+    iter_page_results,
+    page_summary,
+    pages_to_convert,
+    prepare_pages,
+    skipped_pages,
+)
+from app.utils.executors import run_storage
+
+logger = logging.getLogger(__name__)
+
+# Conversion jobs processed at the same time on this worker.
+CONVERT_JOB_WORKERS = int(os.getenv("CONVERT_JOB_WORKERS", "2"))
+# A running job is someone's until its worker has not updated it for this
+# long; then any worker (in any process) may re-queue it. Workers refresh
+# their running jobs every quarter lease.
+CONVERT_JOB_LEASE_S = float(os.getenv("CONVERT_JOB_LEASE_S", "120"))
+
+
+class ConversionJobQueue:
+    """
+    Runs the convert pipeline for jobs persisted in the database.
+
+    Job state lives in the `conversion_jobs` table; the in-memory queue only
+    holds ids. Several processes can share the table: a worker claims a job
+    with a conditional update, and keeps its `updated_at` fresh while it
+    runs. On start, and then every lease, running jobs nobody has updated for
+    `lease_s` (their worker died) are re-queued, so they resume from their
+    stored upload; on start, queued jobs are picked up too.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        workers: int = CONVERT_JOB_WORKERS,
+        lease_s: float = CONVERT_JOB_LEASE_S,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.lease_s = lease_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover_stale()))
+        for job_id in await run_storage(self._recover_unfinished):
+            self._queue.put_nowait(job_id)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(
+        self,
+        file_bytes: bytes,
+        file_category: str,
+        context: str,
+        filename: str | None = None,
+        pages: Optional[Sequence[int]] = None,
+    ) -> str:
+        """
+        Persist a new job and queue it. Returns the job id immediately.
+        """
+        await self.start()
+        page_selection = ",".join(str(page) for page in pages) if pages else None
+        job_id = await run_storage(
+            self._create, file_bytes, file_category, context, filename, page_selection
+        )
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def join(self) -> None:
+        """Wait until every queued job has been processed (used by tests)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def _create(self, file_bytes, file_category, context, filename, page_selection) -> str:
+        db = self.session_factory()
+        try:
+            job = crud.create_conversion_job(
+                db=db,
+                file_bytes=file_bytes,
+                file_category=file_category,
+                context=context,
+                filename=filename,
+                page_selection=page_selection,
+            )
+            return job.id
+        finally:
+            db.close()
+
+    def _recover_unfinished(self) -> List[str]:
+        db = self.session_factory()
+        try:
+            requeued = self._requeue_stale(db)
+            job_ids = [job.id for job in crud.list_queued_conversion_jobs(db)]
+            if job_ids:
+                logger.info(
+                    "Resuming %d unfinished conversion jobs (%d abandoned while running)",
+                    len(job_ids),
+                    len(requeued),
+                )
+            return job_ids
+        finally:
+            db.close()
+
+    def _requeue_stale(self, db: Session) -> List[str]:
+        stale_before = datetime.utcnow() - timedelta(seconds=self.lease_s)
+        return crud.requeue_stale_conversion_jobs(db, stale_before)
+
+    def _requeue_stale_jobs(self) -> List[str]:
+        db = self.session_factory()
+        try:
+            job_ids = self._requeue_stale(db)
+            if job_ids:
+                logger.info("Re-queued %d abandoned conversion jobs", len(job_ids))
+            return job_ids
+        finally:
+            db.close()
+
+    async def _recover_stale(self) -> None:
+        # Jobs whose worker died after this process started.
+        while True:
+            await asyncio.sleep(self.lease_s)
+            for job_id in await run_storage(self._requeue_stale_jobs):
+                self._queue.put_nowait(job_id)
+
+    def _touch(self, job_id: str) -> None:
+        db = self.session_factory()
+        try:
+            crud.touch_conversion_job(db, job_id)
+        finally:
+            db.close()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_s / 4)
+            await run_storage(self._touch, job_id)
+
+    def _update(self, job_id: str, **fields) -> None:
+        db = self.session_factory()
+        try:
+            job = crud.get_conversion_job(db, job_id)
+            if job is not None:
+                crud.update_conversion_job(db, job, **fields)
+        finally:
+            db.close()
+
+    def _claim(self, job_id: str):
+        db = self.session_factory()
+        try:
+            if not crud.claim_conversion_job(db, job_id):
+                return None
+            job = crud.get_conversion_job(db, job_id)
+            pages = (
+                [int(page) for page in job.page_selection.split(",")]
+                if job.page_selection
+                else None
+            )
+            return job.input_data, job.file_category, job.context, pages
+        finally:
+            db.close()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.error("Conversion job %s crashed", job_id, exc_info=True)
+                await run_storage(
+                    self._update,
+                    job_id,
+                    status="failed",
+                    error="Internal server error",
+                    error_status=500,
+                    input_data=None,
+                )
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        claimed = await run_storage(self._claim, job_id)
+        if claimed is None:
+            return
+        file_bytes, file_category, context, pages = claimed
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            await self._convert(job_id, file_bytes, file_category, context, pages)
+        finally:
+            heartbeat.cancel()
+
+    async def _convert(self, job_id: str, file_bytes: bytes, file_category: str, context: str, pages) -> None:
+        start = time.time()
+        try:
+            prepared = await prepare_pages(file_bytes, file_category, pages)
+            await run_storage(
+                self._update,
+                job_id,
+                pages_total=len(pages_to_convert(prepared)),
+                skipped_pages=json.dumps(skipped_pages(prepared)),
+            )
+
+            results = []
+            async for result in iter_page_results(prepared, context):
+                results.append(result)
+                await run_storage(self._update, job_id, pages_done=len(results))
+        except ConversionError as exc:
+            await run_storage(
+                self._update,
+                job_id,
+                status="failed",
+                error=exc.detail,
+                error_status=exc.status_code,
+                input_data=None,
+            )
+            return
+
+        results.sort(key=lambda result: result.page)
+        latex, raw_text = assemble_document(results)
+        await run_storage(
+            self._update,
+            job_id,
+            status="done",
+            latex=latex,
+            raw_text=raw_text,
+            pages=json.dumps([page_summary(result) for result in results]),
+            processing_time_ms=int((time.time() - start) * 1000),
+            input_data=None,
+        )
+
+
+def job_to_dict(job) -> dict:
+    payload = {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "pages_total": job.pages_total,
+        "pages_done": job.pages_done,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "result": None,
+        "error": None,
+    }
+    if job.status == "done":
+        payload["result"] = {
+            "latex": job.latex,
+            "raw_text": job.raw_text,
+            "processing_time_ms": job.processing_time_ms,
+            "pages": json.loads(job.pages) if job.pages else [],
+            "skipped_pages": json.loads(job.skipped_pages) if job.skipped_pages else [],
+        }
+    elif job.status == "failed":
+        payload["error"] = {"status": job.error_status, "message": job.error}
+    return payload
+
+
+conversion_jobs = ConversionJobQueue()
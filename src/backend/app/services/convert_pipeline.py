@@ -0,0 +1,717 @@
+import asyncio
+import functools
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, List, Optional, Sequence, Tuple, Union
+
+import httpx
+from PIL import UnidentifiedImageError
+
+from app.services.cache import conversion_cache, conversion_cache_key
+from app.services.gemini import (
+    GEMINI_PAGE_BATCH_SIZE,
+    GenerationProfile,
+    PageSplitError,
+    convert_image_to_latex,
+    convert_images_to_latex,
+    get_fast_model_name,
+    get_generation_profile,
+    get_model_name,
+    get_prompt_version,
+    get_rate_governor,
+    stream_image_to_latex,
+)
+from app.services.latex import LatexBodyStream, extract_document_body, wrap_latex_document
+from app.services.metrics import StageTimer, metrics
+from app.services.rate_limit import error_status
+from app.services.single_flight import SingleFlight
+from app.utils.executors import (
+    CONVERT_CPU_BACKEND,
+    run_cpu,
+    run_cpu_owned,
+    run_process,
+    run_process_owned,
+    run_storage,
+    submit_io,
+)
+from app.utils.image import (
+    MAX_SIZE,
+    PREPROCESS_ENGINE,
+    preprocess_image,
+    preprocess_page_batch,
+    preprocess_pil_image,
+)
+from app.utils.page_complexity import MODEL_ROUTING_ENABLED, route_page
+from app.utils.page_filter import PAGE_FILTER_ENABLED, find_skippable_pages
+from app.utils.pdf import PDF_CONTRAST_FACTOR, pdf_to_images
+from app.utils.shared_pages import (
+    SharedBytes,
+    SharedPage,
+    call_on_bytes,
+    call_on_image,
+    call_on_images,
+    release,
+    render_shared,
+    share_bytes,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pages of a single upload converted at the same time.
+CONVERT_PAGE_CONCURRENCY = int(os.getenv("CONVERT_PAGE_CONCURRENCY", "5"))
+MAX_PDF_PAGES = 5
+
+# Page conversions in flight, by cache key, so identical concurrent requests
+# (double submits, client retries) share one Gemini call per page.
+inflight_pages = SingleFlight()
+
+
+class ConversionError(Exception):
+    """Raised when a conversion fails; carries the HTTP status the route should return."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class PreparedPage:
+    # 1-based page number in the upload.
+    page: int
+    # Preprocessed JPEG bytes.
+    image: bytes
+    # How they were encoded (EncodedImage.params()).
+    encoding: dict
+    # Why the page is not sent to Gemini (blank / duplicate), if it is skipped.
+    skip: Optional[dict] = None
+    # Time spent preprocessing this page (its share of a batched pass).
+    preprocess_ms: float = 0.0
+    # ink_ratio, strokes, lines and route ("fast" / "default") when model
+    # routing is on (utils/page_complexity.py::route_page).
+    complexity: Optional[dict] = None
+
+
+@dataclass
+class PageResult:
+    page: int
+    raw_text: str
+    body: str
+    cache_hit: bool
+    elapsed_ms: int
+    encoding: dict
+    # Not cached, but shared with an identical conversion already in flight.
+    coalesced: bool = False
+    # Milliseconds per stage for this page: preprocess, gemini, postprocess.
+    timings: dict = field(default_factory=dict)
+    # The Gemini model the page was routed to, and why (PreparedPage.complexity).
+    model: str = ""
+    complexity: Optional[dict] = None
+
+
+@dataclass
+class PageDelta:
+    # Body text of a page that is still being generated (token streaming).
+    page: int
+    text: str
+
+
+def _gemini_error(exc: Exception) -> ConversionError:
+    # Only reached once the rate governor has given up retrying.
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return ConversionError(504, "Gemini deadline exceeded")
+    message = str(exc) or "Gemini API error"
+    status = error_status(exc)
+    if status == 429 or "429" in message:
+        return ConversionError(429, "Gemini rate limit")
+    if status == 503 or "503" in message or "ServiceUnavailable" in message:
+        return ConversionError(503, "Service unavailable")
+    return ConversionError(500, f"Gemini API error: {message}")
+
+
+def _rasterize_pdf(
+    source: Union[bytes, str],
+    pages: Optional[Sequence[int]] = None,
+    contrast: Optional[float] = PDF_CONTRAST_FACTOR,
+):
+    # Render straight at the size preprocess_image would downscale to.
+    if isinstance(source, str):
+        return pdf_to_images(
+            source,
+            max_pages=MAX_PDF_PAGES,
+            pages=pages,
+            max_size=MAX_SIZE,
+            contrast=contrast,
+        )
+
+    temp_path = None
+    try:
+        temp_path = _spool_pdf(source)
+        return _rasterize_pdf(temp_path, pages, contrast)
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _spool_pdf(source: bytes) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        tmp.write(source)
+        return tmp.name
+
+
+def _timed(func, *args, **kwargs):
+    # Runs on the worker, so the time excludes waiting for a free worker.
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+# The image stages run on the CPU backend (utils/executors.py). With the
+# process backend, rendered pages stay in shared memory (SharedPage) until
+# prepare_pages releases them, and only the JPEG results come back pickled.
+
+
+async def _render_pages(source: Union[bytes, str], pages: Optional[Sequence[int]], contrast: Optional[float]):
+    """Rendered PDF pages: PIL images, or SharedPage handles with the process backend."""
+    if CONVERT_CPU_BACKEND != "process":
+        return await run_cpu(_rasterize_pdf, source, pages, contrast)
+    path = source if isinstance(source, str) else await run_storage(_spool_pdf, source)
+    try:
+        # Pages rendered for a request that was cancelled meanwhile are freed
+        # when they arrive.
+        return await run_process_owned(
+            release,
+            render_shared,
+            pdf_to_images,
+            path,
+            max_pages=MAX_PDF_PAGES,
+            pages=pages,
+            max_size=MAX_SIZE,
+            contrast=contrast,
+        )
+    finally:
+        if path is not source:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+async def _on_image(func, image, *args, **kwargs):
+    """(func(image, ...), ms) on the CPU backend."""
+    if isinstance(image, SharedPage):
+        return await run_process(call_on_image, func, image, *args, **kwargs)
+    return await run_cpu(_timed, func, image, *args, **kwargs)
+
+
+async def _on_images(func, images, *args, **kwargs):
+    """(func(images, ...), ms) on the CPU backend."""
+    if images and isinstance(images[0], SharedPage):
+        return await run_process(call_on_images, func, images, *args, **kwargs)
+    return await run_cpu(_timed, func, images, *args, **kwargs)
+
+
+def _release_one(shared: SharedBytes) -> None:
+    release([shared])
+
+
+async def _preprocess_upload(source: bytes):
+    """(EncodedImage, ms) for an image upload, on the CPU backend."""
+    if CONVERT_CPU_BACKEND != "process":
+        return await run_cpu(_timed, preprocess_image, source, engine=PREPROCESS_ENGINE)
+    # Copying a 10 MB upload is too slow for the event loop.
+    shared = await run_cpu_owned(_release_one, share_bytes, source)
+    try:
+        return await run_process(call_on_bytes, preprocess_image, shared, engine=PREPROCESS_ENGINE)
+    finally:
+        release([shared])
+
+
+async def prepare_pages(
+    source: Union[bytes, str],
+    file_category: str,
+    pages: Optional[Sequence[int]] = None,
+    timer: Optional[StageTimer] = None,
+) -> List[PreparedPage]:
+    """
+    Turn a validated upload into preprocessed page images ready for Gemini.
+    `source` is the uploaded file's bytes, or for PDFs the path of a copy
+    already on disk. `pages` selects 1-based PDF pages (sorted); it is
+    ignored for single images.
+
+    PDF pages that are blank or near-duplicates of an earlier page come back
+    with `skip` set and no image; iter_page_results leaves them out.
+
+    Rasterizing, filtering and preprocessing run on CONVERT_CPU_BACKEND:
+    the thread pool, or worker processes fed through shared memory.
+
+    With model routing on, each converted page also gets its `complexity`
+    (see route_pages).
+
+    With `timer`, the rasterize, filter, preprocess and route stages are timed.
+    """
+    timer = timer or StageTimer()
+    if file_category == "image":
+        try:
+            with timer.stage("preprocess"):
+                encoded, elapsed_ms = await _preprocess_upload(source)
+            prepared = [
+                PreparedPage(page=1, image=encoded.data, encoding=encoded.params(), preprocess_ms=elapsed_ms)
+            ]
+        except (UnidentifiedImageError, OSError, ValueError):
+            raise ConversionError(422, "Invalid image file")
+        return await route_pages(prepared, timer)
+
+    batched = PREPROCESS_ENGINE == "numpy"
+    # The numpy engine folds the render contrast boost into its own pass.
+    contrast = None if batched else PDF_CONTRAST_FACTOR
+    with timer.stage("rasterize"):
+        images = await _render_pages(source, pages, contrast)
+    if not images:
+        raise ConversionError(422, "No pages found in PDF")
+
+    try:
+        # Pages past the end of the document are dropped, so the rendered images
+        # line up with the start of the (sorted) selection.
+        page_numbers = list(pages)[: len(images)] if pages else list(range(1, len(images) + 1))
+        if PAGE_FILTER_ENABLED:
+            with timer.stage("filter"):
+                skips, _filter_ms = await _on_images(find_skippable_pages, images, page_numbers)
+        else:
+            skips = [None] * len(images)
+
+        kept = [img for img, skip in zip(images, skips) if skip is None]
+        with timer.stage("preprocess"):
+            if not kept:
+                encoded, page_ms = [], []
+            elif batched:
+                encoded, batch_ms = await _on_images(preprocess_page_batch, kept, pre_contrast=PDF_CONTRAST_FACTOR)
+                page_ms = [batch_ms / len(kept)] * len(kept)
+            else:
+                timed = await asyncio.gather(*(_on_image(preprocess_pil_image, img) for img in kept))
+                encoded, page_ms = [image for image, _ms in timed], [ms for _image, ms in timed]
+    finally:
+        release([img for img in images if isinstance(img, SharedPage)])
+
+    prepared = []
+    encoded_pages = iter(zip(encoded, page_ms))
+    for number, skip in zip(page_numbers, skips):
+        if skip is not None:
+            prepared.append(PreparedPage(page=number, image=b"", encoding={}, skip=skip))
+        else:
+            image, elapsed_ms = next(encoded_pages)
+            prepared.append(
+                PreparedPage(page=number, image=image.data, encoding=image.params(), preprocess_ms=elapsed_ms)
+            )
+    return await route_pages(prepared, timer)
+
+
+async def route_pages(pages: List[PreparedPage], timer: Optional[StageTimer] = None) -> List[PreparedPage]:
+    """
+    Measure each page to convert (ink density, strokes, lines) and pick its
+    route: simple pages go to GEMINI_FAST_MODEL, the rest to GEMINI_MODEL.
+    Leaves `complexity` unset when CONVERT_MODEL_ROUTING_ENABLED is off.
+    """
+    to_route = pages_to_convert(pages)
+    if not MODEL_ROUTING_ENABLED or not to_route:
+        return pages
+    with (timer or StageTimer()).stage("route"):
+        routes = await asyncio.gather(*(run_cpu(route_page, page.image) for page in to_route))
+    for page, route in zip(to_route, routes):
+        page.complexity = route
+        metrics.increment("convert_routed_pages", route=route["route"])
+        logger.info(
+            "Page %d routed to the %s model (ink %.4f, %d strokes, %d lines)",
+            page.page,
+            route["route"],
+            route["ink_ratio"],
+            route["strokes"],
+            route["lines"],
+        )
+    return pages
+
+
+def pages_to_convert(pages: List[PreparedPage]) -> List[PreparedPage]:
+    return [page for page in pages if page.skip is None]
+
+
+def skipped_pages(pages: List[PreparedPage]) -> List[dict]:
+    """Response entries for the pages prepare_pages decided to skip."""
+    return [{"page": page.page, **page.skip} for page in pages if page.skip is not None]
+
+
+def _gemini_kwargs(context: str, profile: Optional[GenerationProfile], model: Optional[str] = None) -> dict:
+    # Without a profile the gemini service uses the context's own, and
+    # without a model GEMINI_MODEL.
+    kwargs = {"context": context}
+    if profile is not None:
+        kwargs["profile"] = profile
+    if model is not None:
+        kwargs["model"] = model
+    return kwargs
+
+
+async def _cache_get(key: str) -> Optional[str]:
+    # Memory hits are answered on the event loop; only the disk tier needs a thread.
+    raw = conversion_cache.get_memory(key)
+    if raw is None and conversion_cache.on_disk:
+        raw = await run_storage(conversion_cache.get, key)
+    return raw
+
+
+async def _cache_set(key: str, raw: str) -> None:
+    conversion_cache.set_memory(key, raw)
+    if conversion_cache.on_disk:
+        await run_storage(conversion_cache.set, key, raw)
+
+
+def page_model(page: PreparedPage) -> str:
+    """The Gemini model a page is converted with."""
+    if page.complexity is not None and page.complexity["route"] == "fast":
+        return get_fast_model_name()
+    return get_model_name()
+
+
+def _deadline_s(context: str, profile: Optional[GenerationProfile]) -> float:
+    return (profile or get_generation_profile(context)).deadline_s
+
+
+async def _governed(
+    func,
+    *args,
+    deadline_s: float,
+    retryable: Optional[Callable[[], bool]] = None,
+    **kwargs,
+):
+    # The rate governor queues, paces and retries on the event loop; an I/O
+    # thread only runs each request (see RateGovernor.admitted). Past the
+    # deadline the governor stops queueing and retrying, and wait_for gives
+    # up on a request still in flight.
+    governor = get_rate_governor()
+    request = governor.admitted(functools.partial(func, *args, **kwargs))
+    deadline = time.monotonic() + deadline_s
+    return await asyncio.wait_for(
+        governor.call_async(submit_io, request, retryable=retryable, deadline=deadline),
+        deadline_s,
+    )
+
+
+async def _call_gemini(
+    image: bytes,
+    context: str,
+    semaphore: asyncio.Semaphore,
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> str:
+    async with semaphore:
+        try:
+            return await _governed(
+                convert_image_to_latex,
+                image,
+                deadline_s=_deadline_s(context, profile),
+                **_gemini_kwargs(context, profile, model),
+            )
+        except Exception as exc:
+            raise _gemini_error(exc)
+
+
+async def _stream_gemini(
+    page: PreparedPage,
+    context: str,
+    semaphore: asyncio.Semaphore,
+    emit: Callable[[PageDelta], None],
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> Tuple[str, str]:
+    """
+    Convert one page with token streaming, handing each piece of body text
+    to `emit` (on the event loop) as it arrives. Returns (raw text, body).
+    """
+    loop = asyncio.get_running_loop()
+    emitted = False
+
+    def _run():
+        nonlocal emitted
+        processor = LatexBodyStream()
+        raw = []
+        for chunk in stream_image_to_latex(page.image, **_gemini_kwargs(context, profile, model)):
+            raw.append(chunk)
+            text = processor.feed(chunk)
+            if text:
+                emitted = True
+                loop.call_soon_threadsafe(emit, PageDelta(page.page, text))
+        text = processor.finish()
+        if text:
+            loop.call_soon_threadsafe(emit, PageDelta(page.page, text))
+        return "".join(raw), processor.body
+
+    async with semaphore:
+        try:
+            # A page whose text was already sent cannot be started over.
+            return await _governed(
+                _run, deadline_s=_deadline_s(context, profile), retryable=lambda: not emitted
+            )
+        except Exception as exc:
+            raise _gemini_error(exc)
+
+
+async def _convert_misses(
+    pages: List[PreparedPage],
+    context: str,
+    semaphore: asyncio.Semaphore,
+    emit: Optional[Callable[[PageDelta], None]],
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> Tuple[List[str], List[Optional[str]]]:
+    """
+    Call Gemini for uncached pages; returns their raw texts and, for
+    streamed pages, the bodies built while streaming (else None).
+    """
+    if not pages:
+        return [], []
+    if emit is not None:
+        streamed = await asyncio.gather(
+            *(_stream_gemini(page, context, semaphore, emit, profile, model) for page in pages)
+        )
+        return [raw for raw, _body in streamed], [body for _raw, body in streamed]
+
+    if len(pages) > 1:
+        try:
+            async with semaphore:
+                converted = await _governed(
+                    convert_images_to_latex,
+                    [page.image for page in pages],
+                    deadline_s=_deadline_s(context, profile),
+                    **_gemini_kwargs(context, profile, model),
+                )
+            return converted, [None] * len(pages)
+        except PageSplitError as exc:
+            logger.warning(
+                "Could not split batched Gemini response (%s); converting %d pages one by one",
+                exc,
+                len(pages),
+            )
+            metrics.increment("gemini_batch_fallbacks")
+        except Exception as exc:
+            raise _gemini_error(exc)
+    converted = await asyncio.gather(
+        *(_call_gemini(page.image, context, semaphore, profile, model) for page in pages)
+    )
+    return list(converted), [None] * len(pages)
+
+
+async def _convert_batch(
+    batch: List[PreparedPage],
+    context: str,
+    model_name: str,
+    semaphore: asyncio.Semaphore,
+    emit: Optional[Callable[[PageDelta], None]] = None,
+    profile: Optional[GenerationProfile] = None,
+) -> List[PageResult]:
+    """
+    Convert a group of pages. Cached pages are served from the cache; two or
+    more uncached pages go to Gemini in one batched request. If that response
+    cannot be split back into pages, they are converted one call each.
+
+    Uncached pages another request is already converting are not sent again:
+    they wait for that conversion and share its result (and its error,
+    unless it timed out: then they convert the page themselves).
+    With `emit`, uncached pages are streamed one call each instead, and their
+    body is the one built while streaming.
+
+    `profile` replaces the context's generation profile; pages converted
+    with different generation settings are cached separately. Every page of
+    the group goes to `model_name`.
+    """
+    started = time.perf_counter()
+    # GEMINI_MODEL is the gemini service's default; only routed pages name a model.
+    model = None if model_name == get_model_name() else model_name
+    generation = (profile or get_generation_profile(context)).cache_tag()
+    prompt_version = f"{get_prompt_version()}/{generation}"
+    keys = [conversion_cache_key(page.image, context, model_name, prompt_version) for page in batch]
+    raws = list(await asyncio.gather(*(_cache_get(key) for key in keys)))
+    cache_hits = [raw is not None for raw in raws]
+    bodies: List[Optional[str]] = [None] * len(batch)
+
+    claims = {index: inflight_pages.claim(keys[index]) for index, raw in enumerate(raws) if raw is None}
+    leading = [index for index, (_future, leader) in claims.items() if leader]
+    following = [index for index, (_future, leader) in claims.items() if not leader]
+
+    gemini_ms = [0.0] * len(batch)
+    gemini_started = time.perf_counter()
+    converted: List[str] = []
+    streamed_bodies: List[Optional[str]] = []
+    failure: Optional[Exception] = None
+    try:
+        converted, streamed_bodies = await _convert_misses(
+            [batch[index] for index in leading], context, semaphore, emit, profile, model
+        )
+    except Exception as exc:
+        failure = exc
+        raise
+    finally:
+        # Settle every claim before awaiting anything else, so no follower
+        # waits on a key nobody owns. Cancelled leaders resolve with None
+        # and their followers convert the page themselves; so do leaders
+        # that ran out of time, since a follower's deadline may be longer.
+        timed_out = isinstance(failure, ConversionError) and failure.status_code == 504
+        for position, index in enumerate(leading):
+            raw = converted[position] if converted else None
+            inflight_pages.resolve(keys[index], claims[index][0], raw, error=None if timed_out else failure)
+    for index, raw, body in zip(leading, converted, streamed_bodies):
+        raws[index] = raw
+        bodies[index] = body
+        gemini_ms[index] = (time.perf_counter() - gemini_started) * 1000
+    await asyncio.gather(*(_cache_set(keys[index], raws[index]) for index in leading))
+
+    if following:
+        metrics.increment("convert_coalesced_pages", len(following))
+        gemini_started = time.perf_counter()
+        # The leader's Gemini call has the same deadline. Once a follower
+        # has waited that long, it converts the page itself rather than
+        # depend on the leader indefinitely.
+        wait_s = _deadline_s(context, profile)
+        shared = await asyncio.gather(
+            *(inflight_pages.wait(claims[index][0], wait_s) for index in following)
+        )
+        for index, raw in zip(following, shared):
+            if raw is None:
+                # The request converting this page went away first (or is
+                # stuck); do it here.
+                raw = await _call_gemini(batch[index].image, context, semaphore, profile, model)
+                await _cache_set(keys[index], raw)
+            raws[index] = raw
+            gemini_ms[index] = (time.perf_counter() - gemini_started) * 1000
+
+    results = []
+    for index, (page, raw, body, cache_hit) in enumerate(zip(batch, raws, bodies, cache_hits)):
+        postprocess_started = time.perf_counter()
+        if body is None:
+            # Streamed pages were post-processed while they streamed.
+            body = extract_document_body(raw)
+        postprocess_ms = (time.perf_counter() - postprocess_started) * 1000
+        results.append(
+            PageResult(
+                page=page.page,
+                raw_text=raw,
+                body=body,
+                cache_hit=cache_hit,
+                elapsed_ms=int((time.perf_counter() - started) * 1000),
+                encoding=page.encoding,
+                coalesced=index in following,
+                timings={
+                    "preprocess": round(page.preprocess_ms, 1),
+                    "gemini": round(gemini_ms[index], 1),
+                    "postprocess": round(postprocess_ms, 1),
+                },
+                model=model_name,
+                complexity=page.complexity,
+            )
+        )
+    return results
+
+
+async def iter_page_events(
+    pages: List[PreparedPage],
+    context: str,
+    stream_tokens: bool = False,
+    profile: Optional[GenerationProfile] = None,
+) -> AsyncIterator[Union[PageDelta, PageResult]]:
+    """
+    Convert pages concurrently and yield each result as soon as it is ready
+    (completion order, not page order). Skipped pages yield nothing.
+
+    With GEMINI_PAGE_BATCH_SIZE > 1, consecutive pages are grouped into one
+    Gemini request and their results arrive together; a group only holds
+    pages routed to the same model. With `stream_tokens`,
+    every uncached page is its own streamed request and PageDelta events
+    with its body text arrive before its PageResult.
+
+    `profile` overrides the context's generation profile (see
+    services/gemini.py::GENERATION_PROFILES).
+    """
+    semaphore = asyncio.Semaphore(CONVERT_PAGE_CONCURRENCY)
+    by_model = {}
+    for page in pages_to_convert(pages):
+        by_model.setdefault(page_model(page), []).append(page)
+    batch_size = 1 if stream_tokens else max(1, GEMINI_PAGE_BATCH_SIZE)
+    events: asyncio.Queue = asyncio.Queue()
+    emit = events.put_nowait if stream_tokens else None
+    tasks = [
+        asyncio.create_task(
+            _convert_batch(group[start:start + batch_size], context, model_name, semaphore, emit, profile)
+        )
+        for model_name, group in by_model.items()
+        for start in range(0, len(group), batch_size)
+    ]
+    for task in tasks:
+        # Finished tasks go through the queue too, after the deltas they emitted.
+        task.add_done_callback(events.put_nowait)
+    try:
+        for _ in range(len(tasks)):
+            event = await events.get()
+            while isinstance(event, PageDelta):
+                yield event
+                event = await events.get()
+            for result in event.result():
+                yield result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # Mark sibling failures as retrieved; the first error already propagated.
+                task.exception()
+
+
+async def iter_page_results(
+    pages: List[PreparedPage],
+    context: str,
+    profile: Optional[GenerationProfile] = None,
+) -> AsyncIterator[PageResult]:
+    """
+    Convert pages concurrently and yield each PageResult as soon as it is
+    ready; see iter_page_events.
+    """
+    async for result in iter_page_events(pages, context, profile=profile):
+        yield result
+
+
+async def convert_pages(
+    pages: List[PreparedPage],
+    context: str,
+    profile: Optional[GenerationProfile] = None,
+) -> List[PageResult]:
+    """
+    Convert every page and return the results in page order.
+    """
+    results = [result async for result in iter_page_results(pages, context, profile)]
+    return sorted(results, key=lambda result: result.page)
+
+
+def assemble_document(results: List[PageResult]) -> Tuple[str, str]:
+    """
+    Return (latex, raw_text) for page results already sorted by page.
+    """
+    latex = wrap_latex_document("\n\n".join(result.body for result in results))
+    raw_text = "\n\n".join(result.raw_text for result in results)
+    return latex, raw_text
+
+
+def page_summary(result: PageResult) -> dict:
+    summary = {
+        "page": result.page,
+        "cache": "hit" if result.cache_hit else "coalesced" if result.coalesced else "miss",
+        "encoding": result.encoding,
+        "timings_ms": result.timings,
+        "model": result.model,
+    }
+    if result.complexity is not None:
+        summary["complexity"] = result.complexity
+    return summary
@@ -1,9 +1,37 @@
-import base64
+import functools
+import logging
 import os
+import re
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Iterator, List, Optional, Sequence, Tuple
 
+import httpx
 from google import genai
 from google.genai import types
 
+from app.services.gemini_transport import build_transport
+from app.services.metrics import metrics
+from app.services.rate_limit import RateGovernor, get_governor
+
+logger = logging.getLogger(__name__)
+
+# Optional override so the SDK can talk to a proxy or a local fake endpoint.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
+# Keep-alive connections held open to the Gemini API by the shared client.
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "16"))
+# Pages sent per generate_content call; 1 sends every page on its own.
+GEMINI_PAGE_BATCH_SIZE = int(os.getenv("GEMINI_PAGE_BATCH_SIZE", "1"))
+# "body": ask only for what goes between \\begin{document} and \\end{document};
+# wrap_latex_document adds the preamble, so generating one per page is wasted
+# output tokens. "document": ask for a complete document per page.
+GEMINI_OUTPUT_MODE = os.getenv("GEMINI_OUTPUT_MODE", "body")
+OUTPUT_MODES = ("body", "document")
+
+# Bump whenever SYSTEM_PROMPT, BODY_SYSTEM_PROMPT or CONTEXT_HINTS change so
+# cached pages are re-converted.
+PROMPT_VERSION = "1"
 
 SYSTEM_PROMPT = """You are an expert OCR and LaTeX typesetting engine specializing
 in handwritten academic content.
@@ -27,6 +55,31 @@ RULES:
 8. Ignore any hand written graph and instead add a box as a place holder for the graph to be filled in via images.
 
 
+"""
+
+# SYSTEM_PROMPT without the preamble: the page is typeset into a document
+# whose preamble (services/latex.py::DEFAULT_PREAMBLE) already loads amsmath,
+# amssymb and amsfonts. Keep the two prompts in step by hand.
+BODY_SYSTEM_PROMPT = """You are an expert OCR and LaTeX typesetting engine specializing
+in handwritten academic content.
+
+INPUT: An image of handwritten notes, equations, or diagrams.
+OUTPUT: The LaTeX document body only, ready to paste between
+\\begin{document} and \\end{document}.
+
+RULES:
+1. Output ONLY valid LaTeX code — no explanations, no markdown fences
+2. Do NOT output \\documentclass, \\usepackage, \\begin{document} or
+   \\end{document}: the preamble is provided (article class with amsmath,
+   amssymb and amsfonts loaded). Start directly with the page content.
+3. Use \\section{} for headers, \\begin{align} for displayed math
+4. Use $...$ for inline math
+5. If text is illegible, insert: \\textcolor{red}{[illegible]}
+6. NEVER invent content not present in the image
+7. For diagrams, add: % [Diagram: description]
+8. Ignore any hand written graph and instead add a box as a place holder for the graph to be filled in via images.
+
+
 """
 
 CONTEXT_HINTS = {
@@ -37,34 +90,395 @@ CONTEXT_HINTS = {
 }
 
 
-def get_system_prompt(context: str = "general") -> str:
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    Generation settings for one context: how long the model may think, how
+    much it may write, how freely it samples, and how long a call may take.
+    """
+
+    name: str
+    # Thinking tokens per page; 0 turns thinking off, -1 lets the model decide.
+    thinking_budget: int
+    max_output_tokens: int
+    temperature: float
+    # Seconds the convert pipeline allows one Gemini call, queueing and
+    # retries included: the rate governor stops queueing and retrying past
+    # it. Separately, config_fields times out each HTTP attempt after this
+    # long, counted from the attempt's start.
+    deadline_s: float
+    # Fields set per request instead of taken from the context's profile.
+    overridden: Tuple[str, ...] = ()
+
+    def with_overrides(self, **overrides) -> "GenerationProfile":
+        """A copy with the given fields replaced; None values are ignored."""
+        values = {field: value for field, value in overrides.items() if value is not None}
+        if not values:
+            return self
+        return replace(self, **values, overridden=tuple(sorted(set(self.overridden) | set(values))))
+
+    def cache_tag(self) -> str:
+        # Everything that changes the output (the deadline does not).
+        return f"think={self.thinking_budget},max={self.max_output_tokens},temp={self.temperature:g}"
+
+    def config_fields(self) -> dict:
+        return {
+            "temperature": self.temperature,
+            "max_output_tokens": self.max_output_tokens,
+            "thinking_config": types.ThinkingConfig(thinking_budget=self.thinking_budget),
+            "http_options": types.HttpOptions(timeout=int(self.deadline_s * 1000)),
+        }
+
+    def as_dict(self) -> dict:
+        return {
+            "profile": self.name,
+            "thinking_budget": self.thinking_budget,
+            "max_output_tokens": self.max_output_tokens,
+            "temperature": self.temperature,
+            "deadline_s": self.deadline_s,
+            "overridden": list(self.overridden),
+        }
+
+
+# One profile per CONTEXT_HINTS entry. Transcribing notes needs little
+# reasoning, so thinking is off for plain notes and small for dense notation.
+GENERATION_PROFILES = {
+    "general": GenerationProfile("general", thinking_budget=0, max_output_tokens=8192, temperature=0.2, deadline_s=60),
+    "math": GenerationProfile("math", thinking_budget=1024, max_output_tokens=8192, temperature=0.2, deadline_s=90),
+    "chemistry": GenerationProfile(
+        "chemistry", thinking_budget=1024, max_output_tokens=8192, temperature=0.2, deadline_s=90
+    ),
+    "physics": GenerationProfile("physics", thinking_budget=1024, max_output_tokens=8192, temperature=0.2, deadline_s=90),
+}
+
+
+def get_generation_profile(context: str = "general") -> GenerationProfile:
+    return GENERATION_PROFILES.get(context, GENERATION_PROFILES["general"])
+
+
+# Thinking budgets each model accepts, by model name prefix (the longest
+# match wins): (smallest budget, largest budget, whether 0 turns thinking
+# off). Models not listed get the profile's budget as it is.
+THINKING_BUDGETS = {
+    "gemini-2.5-pro": (128, 32768, False),
+    "gemini-2.5-flash": (1, 24576, True),
+    "gemini-2.5-flash-lite": (512, 24576, True),
+}
+
+
+def thinking_budget_for(model: str, budget: int) -> int:
+    """
+    `budget` clamped to the range `model` accepts. -1 (the model decides) is
+    kept; 0 becomes the smallest budget on models that always think, such as
+    gemini-2.5-pro.
+    """
+    name = model.removeprefix("models/")
+    prefixes = [prefix for prefix in THINKING_BUDGETS if name.startswith(prefix)]
+    if budget == -1 or not prefixes:
+        return budget
+    lowest, highest, can_turn_off = THINKING_BUDGETS[max(prefixes, key=len)]
+    if budget == 0 and can_turn_off:
+        return 0
+    return min(max(budget, lowest), highest)
+
+
+BATCH_PROMPT = """
+
+BATCH MODE:
+You will receive several page images, each preceded by a line "PAGE n".
+Convert every page on its own, following the rules above. Before each
+page's LaTeX output a line containing exactly
+%%% PAGE n %%%
+with that page's number. Output the pages in the order given.
+"""
+
+# "%%% PAGE 3 %%%" on a line of its own; a LaTeX comment if it leaks through.
+_PAGE_DELIMITER = re.compile(r"^[ \t]*%{3,}[ \t]*PAGE[ \t]+(\d+)[ \t]*%{3,}[ \t]*$", re.MULTILINE)
+
+
+class PageSplitError(ValueError):
+    """A batched response could not be split back into one body per page."""
+
+
+def get_output_mode() -> str:
+    # Unknown values fall back to the body-only default.
+    return GEMINI_OUTPUT_MODE if GEMINI_OUTPUT_MODE in OUTPUT_MODES else "body"
+
+
+def get_prompt_version() -> str:
+    """PROMPT_VERSION for the current output mode, as used in cache keys."""
+    mode = get_output_mode()
+    return PROMPT_VERSION if mode == "document" else f"{PROMPT_VERSION}-{mode}"
+
+
+def get_system_prompt(context: str = "general", mode: str = "document") -> str:
     hint = CONTEXT_HINTS.get(context, CONTEXT_HINTS["general"])
-    return SYSTEM_PROMPT + f"\n\nCONTEXT: {hint}"
+    prompt = BODY_SYSTEM_PROMPT if mode == "body" else SYSTEM_PROMPT
+    return prompt + f"\n\nCONTEXT: {hint}"
 
 
+def get_batch_system_prompt(context: str = "general", mode: str = "document") -> str:
+    return get_system_prompt(context, mode) + BATCH_PROMPT
 
 
-def convert_image_to_latex(base64_image: str, context: str = "general") -> str:
+# Built once at import per output mode, with each context's profile; unknown
+# contexts fall back to "general".
+_GENERATION_CONFIGS = {
+    (mode, context): types.GenerateContentConfig(
+        system_instruction=get_system_prompt(context, mode),
+        **get_generation_profile(context).config_fields(),
+    )
+    for mode in OUTPUT_MODES
+    for context in CONTEXT_HINTS
+}
+
+
+_BATCH_GENERATION_CONFIGS = {
+    (mode, context): types.GenerateContentConfig(
+        system_instruction=get_batch_system_prompt(context, mode),
+        **get_generation_profile(context).config_fields(),
+    )
+    for mode in OUTPUT_MODES
+    for context in CONTEXT_HINTS
+}
+
+
+def _config_for(
+    configs: dict, context: str, profile: Optional[GenerationProfile], model: Optional[str]
+) -> types.GenerateContentConfig:
+    mode = get_output_mode()
+    if context not in CONTEXT_HINTS:
+        context = "general"
+    config = configs[(mode, context)]
+    if profile is not None and profile != get_generation_profile(context):
+        config = config.model_copy(update=profile.config_fields())
+    budget = config.thinking_config.thinking_budget
+    fitted = thinking_budget_for(model or get_model_name(), budget)
+    if fitted != budget:
+        config = config.model_copy(update={"thinking_config": types.ThinkingConfig(thinking_budget=fitted)})
+    return config
+
+
+def get_generation_config(
+    context: str = "general", profile: Optional[GenerationProfile] = None, model: Optional[str] = None
+) -> types.GenerateContentConfig:
+    """
+    Config for one page; `profile` replaces the context's generation profile,
+    and the thinking budget is fitted to `model` (default GEMINI_MODEL).
+    """
+    return _config_for(_GENERATION_CONFIGS, context, profile, model)
+
+
+def get_batch_generation_config(
+    context: str = "general", profile: Optional[GenerationProfile] = None, model: Optional[str] = None
+) -> types.GenerateContentConfig:
+    return _config_for(_BATCH_GENERATION_CONFIGS, context, profile, model)
+
+
+_GEMINI_CLIENT: genai.Client | None = None
+_GEMINI_CLIENT_KEY: str | None = None
+_GEMINI_CLIENT_LOCK = threading.Lock()
+
+
+def _http_options() -> types.HttpOptions:
+    limits = httpx.Limits(
+        max_connections=GEMINI_MAX_CONNECTIONS,
+        max_keepalive_connections=GEMINI_MAX_CONNECTIONS,
+    )
+    client_args = {"limits": limits}
+    # Record / replay mode (GEMINI_TRANSPORT); the transport owns the pool.
+    transport = build_transport(limits)
+    if transport is not None:
+        client_args = {"transport": transport}
+    return types.HttpOptions(
+        base_url=GEMINI_BASE_URL,
+        client_args=client_args,
+        async_client_args=dict(client_args),
+    )
+
+
+def get_client() -> genai.Client:
+    """
+    Return the process-wide Gemini client, creating it on first use.
+    The underlying httpx pools are thread-safe and reuse connections across calls.
+    """
+    global _GEMINI_CLIENT, _GEMINI_CLIENT_KEY
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("Missing GEMINI_API_KEY")
 
-    client = genai.Client(api_key=api_key)
-
-    prompt = get_system_prompt(context)
-    model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-
-    response = client.models.generate_content(
-        model=model_name,
-        contents=[
-            types.Part.from_bytes(
-                data=base64.b64decode(base64_image),
-                mime_type="image/jpeg",
-            ),
-        ],
-        config=types.GenerateContentConfig(
-            system_instruction=prompt,
-        ),
+    with _GEMINI_CLIENT_LOCK:
+        if _GEMINI_CLIENT is None or _GEMINI_CLIENT_KEY != api_key:
+            _GEMINI_CLIENT = genai.Client(api_key=api_key, http_options=_http_options())
+            _GEMINI_CLIENT_KEY = api_key
+        return _GEMINI_CLIENT
+
+
+def get_rate_governor() -> RateGovernor:
+    """Rate governor shared by every call made with the current GEMINI_API_KEY."""
+    return get_governor(os.getenv("GEMINI_API_KEY") or "")
+
+
+def close_client() -> None:
+    global _GEMINI_CLIENT, _GEMINI_CLIENT_KEY
+    with _GEMINI_CLIENT_LOCK:
+        if _GEMINI_CLIENT is not None:
+            _GEMINI_CLIENT.close()
+        _GEMINI_CLIENT = None
+        _GEMINI_CLIENT_KEY = None
+
+
+def _image_part(image_bytes: bytes) -> types.Part:
+    # The SDK base64-encodes inline data itself when it builds the JSON request.
+    return types.Part.from_bytes(
+        data=image_bytes,
+        mime_type="image/jpeg",
     )
 
+
+def get_model_name() -> str:
+    return os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+
+def get_fast_model_name() -> str:
+    """The lighter model simple pages are routed to (see utils/page_complexity.py)."""
+    return os.getenv("GEMINI_FAST_MODEL", "gemini-2.5-flash-lite")
+
+
+def _record_call(mode: str, pages: int, started: float, response, model: str) -> None:
+    # Per-mode stats for comparing batched and per-page requests, and
+    # per-model latency for page routing (GET /api/metrics).
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.increment("gemini_requests", mode=mode)
+    metrics.increment("gemini_pages", pages, mode=mode)
+    metrics.observe("gemini_request_ms", elapsed_ms, mode=mode)
+    metrics.observe("gemini_page_ms", elapsed_ms / pages, mode=mode)
+    metrics.increment("gemini_model_pages", pages, model=model)
+    metrics.observe("gemini_model_request_ms", elapsed_ms, model=model)
+    logger.info("Gemini %s request: model=%s pages=%d %.0f ms", mode, model, pages, elapsed_ms)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        metrics.increment("gemini_prompt_tokens", usage.prompt_token_count or 0, mode=mode)
+        metrics.increment("gemini_output_tokens", usage.candidates_token_count or 0, mode=mode)
+
+
+def convert_image_to_latex(
+    image_bytes: bytes,
+    context: str = "general",
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> str:
+    """Convert one page; `model` replaces GEMINI_MODEL for this call."""
+    model = model or get_model_name()
+    client = get_client()
+    started = time.perf_counter()
+    response = get_rate_governor().call(
+        client.models.generate_content,
+        model=model,
+        contents=[_image_part(image_bytes)],
+        config=get_generation_config(context, profile, model),
+    )
+    _record_call("page", 1, started, response, model)
     return response.text
+
+
+async def convert_image_to_latex_async(
+    image_bytes: bytes,
+    context: str = "general",
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> str:
+    model = model or get_model_name()
+    client = get_client()
+    started = time.perf_counter()
+    response = await get_rate_governor().call_async(
+        functools.partial(
+            client.aio.models.generate_content,
+            model=model,
+            contents=[_image_part(image_bytes)],
+            config=get_generation_config(context, profile, model),
+        )
+    )
+    _record_call("page", 1, started, response, model)
+    return response.text
+
+
+def stream_image_to_latex(
+    image_bytes: bytes,
+    context: str = "general",
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    convert_image_to_latex with the SDK's streaming generation: yields the
+    text as the model produces it (see services/latex.py::LatexBodyStream).
+    """
+    model = model or get_model_name()
+    client = get_client()
+    started = time.perf_counter()
+    last_chunk = None
+    for chunk in get_rate_governor().stream(
+        client.models.generate_content_stream,
+        model=model,
+        contents=[_image_part(image_bytes)],
+        config=get_generation_config(context, profile, model),
+    ):
+        if last_chunk is None:
+            metrics.observe("gemini_first_token_ms", (time.perf_counter() - started) * 1000)
+        last_chunk = chunk
+        if chunk.text:
+            yield chunk.text
+    # Usage metadata comes with the final chunk.
+    _record_call("stream", 1, started, last_chunk, model)
+
+
+def split_batch_output(text: str, count: int) -> List[str]:
+    """
+    Split a batched response into one LaTeX document per page, in page order.
+    Raises PageSplitError unless it has exactly pages 1..count, in order.
+    """
+    parts = _PAGE_DELIMITER.split(text or "")
+    # parts = [preamble, "1", body1, "2", body2, ...]; a markdown fence
+    # around the whole answer is fine, post-processing strips fences per page.
+    if parts[0].strip() not in ("", "```", "```latex"):
+        raise PageSplitError("Unexpected text before the first page delimiter")
+    numbers = [int(number) for number in parts[1::2]]
+    if numbers != list(range(1, count + 1)):
+        raise PageSplitError(f"Expected pages 1-{count}, got {numbers}")
+    bodies = [body.strip() for body in parts[2::2]]
+    if not all(bodies):
+        raise PageSplitError("Empty page in batched response")
+    return bodies
+
+
+def convert_images_to_latex(
+    images: Sequence[bytes],
+    context: str = "general",
+    profile: Optional[GenerationProfile] = None,
+    model: Optional[str] = None,
+) -> List[str]:
+    """
+    Convert several pages in one generate_content call, one result per page.
+    Raises PageSplitError when the response cannot be split back into pages;
+    callers fall back to convert_image_to_latex per page.
+    """
+    if len(images) == 1:
+        return [convert_image_to_latex(images[0], context=context, profile=profile, model=model)]
+
+    contents = []
+    for number, image_bytes in enumerate(images, start=1):
+        contents.append(types.Part.from_text(text=f"PAGE {number}"))
+        contents.append(_image_part(image_bytes))
+
+    model = model or get_model_name()
+    client = get_client()
+    started = time.perf_counter()
+    response = get_rate_governor().call(
+        client.models.generate_content,
+        model=model,
+        contents=contents,
+        config=get_batch_generation_config(context, profile, model),
+    )
+    _record_call("batch", len(images), started, response, model)
+    return split_batch_output(response.text, len(images))
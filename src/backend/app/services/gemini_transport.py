@@ -0,0 +1,368 @@
+import asyncio
+import base64
+import codecs
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+from app.services.metrics import metrics
+from app.utils.page_filter import hash_distance, perceptual_hash
+
+# How the Gemini client's HTTP requests are sent (see gemini.py::_http_options):
+# "passthrough" straight to the API (or GEMINI_BASE_URL); "record" the same,
+# saving every successful response to GEMINI_CASSETTE_DIR; "replay" answered
+# from GEMINI_CASSETTE_DIR without touching the network.
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "passthrough")
+TRANSPORT_MODES = ("passthrough", "record", "replay")
+GEMINI_CASSETTE_DIR = os.getenv("GEMINI_CASSETTE_DIR")
+# Simulated latency on replay: "recorded" waits as long as the recording took
+# (streamed chunks keep their spacing), a number waits that many seconds per
+# response, empty replays at once.
+GEMINI_REPLAY_LATENCY = os.getenv("GEMINI_REPLAY_LATENCY", "")
+# Requests are matched on their path and JSON body (prompt, config, page
+# images), never the API key or headers. When preprocessing changes, pages no
+# longer match byte for byte; replay then takes the recording of the same
+# prompt and config whose images are within this many difference-hash bits.
+GEMINI_REPLAY_MAX_HASH_DISTANCE = int(os.getenv("GEMINI_REPLAY_MAX_HASH_DISTANCE", "24"))
+
+CASSETTE_VERSION = 1
+# Response headers worth keeping; the rest (dates, cookies, server ids) are
+# noise in a cassette.
+RECORDED_HEADERS = ("content-type",)
+
+
+def _images(node, found: List[str]) -> None:
+    # Inline image data, wherever the SDK put it and however it spelled it.
+    if isinstance(node, dict):
+        if "data" in node and ("mimeType" in node or "mime_type" in node):
+            found.append(node["data"])
+            return
+        for value in node.values():
+            _images(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _images(value, found)
+
+
+def _without_images(node):
+    if isinstance(node, dict):
+        if "data" in node and ("mimeType" in node or "mime_type" in node):
+            return {**node, "data": None}
+        return {key: _without_images(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_without_images(value) for value in node]
+    return node
+
+
+def _digest(target: str, body) -> str:
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{target}\0{canonical}".encode("utf-8")).hexdigest()
+
+
+def _image_hash(data: str) -> Optional[int]:
+    try:
+        # The SDK sends inline data URL-safe base64 encoded.
+        img = Image.open(io.BytesIO(base64.urlsafe_b64decode(data)))
+        img.draft("L", (256, 256))
+        return perceptual_hash(img)
+    except (OSError, ValueError):
+        return None
+
+
+def request_fingerprint(request: httpx.Request) -> Tuple[str, str, List[str]]:
+    """
+    (fingerprint, shape, images) of a Gemini request: `shape` is the
+    fingerprint with every image left out, so recordings of the same prompt
+    can be compared image by image.
+    """
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.url.params.items()) if key != "key")
+    target = f"{request.method} {request.url.path}?{query}"
+    try:
+        body = json.loads(request.content or b"null")
+    except ValueError:
+        body = request.content.decode("utf-8", "replace")
+    images: List[str] = []
+    _images(body, images)
+    return _digest(target, body), _digest(target, _without_images(body)), images
+
+
+class Cassette:
+    """
+    A directory of recorded responses, one JSON file per request fingerprint:
+    status, headers, and the body as the chunks it arrived in, each with its
+    offset from the start of the request.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if entry.get("version") == CASSETTE_VERSION:
+                self._entries[entry["fingerprint"]] = entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def save(self, entry: dict) -> None:
+        path = self.directory / f"{entry['fingerprint']}.json"
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(entry, handle, indent=1)
+            os.replace(tmp_name, path)
+        except OSError:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._entries[entry["fingerprint"]] = entry
+
+    def find(self, fingerprint: str, shape: str, images: List[str]) -> Tuple[Optional[dict], str]:
+        """The recording for a request and how it matched: exact, nearest or miss."""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                return entry, "exact"
+            candidates = [
+                entry
+                for entry in self._entries.values()
+                if entry["shape"] == shape and len(entry["image_hashes"]) == len(images)
+            ]
+        if not candidates or not images:
+            return None, "miss"
+        hashes = [_image_hash(data) for data in images]
+        if None in hashes:
+            return None, "miss"
+        best, best_distance = None, GEMINI_REPLAY_MAX_HASH_DISTANCE + 1
+        for entry in candidates:
+            if not all(entry["image_hashes"]):
+                continue
+            distance = max(
+                hash_distance(ours, int(theirs, 16)) for ours, theirs in zip(hashes, entry["image_hashes"])
+            )
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        return (best, "nearest") if best is not None else (None, "miss")
+
+
+def _replay_delays(entry: dict) -> Tuple[float, List[float]]:
+    """Seconds to wait before the headers and before each chunk, per GEMINI_REPLAY_LATENCY."""
+    chunks = entry["chunks"]
+    if GEMINI_REPLAY_LATENCY == "recorded":
+        offsets = [chunk["offset_s"] for chunk in chunks]
+        previous = [entry["headers_s"]] + offsets[:-1]
+        return entry["headers_s"], [max(0.0, offset - before) for offset, before in zip(offsets, previous)]
+    fixed = float(GEMINI_REPLAY_LATENCY or 0)
+    return fixed, [0.0] * len(chunks)
+
+
+def _miss_response(request: httpx.Request) -> httpx.Response:
+    message = f"No recorded Gemini response for {request.url.path} in {GEMINI_CASSETTE_DIR}"
+    return httpx.Response(
+        404,
+        json={"error": {"code": 404, "message": message, "status": "NOT_FOUND"}},
+        request=request,
+    )
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, chunks: List[bytes], delays: List[float]):
+        self.chunks = chunks
+        self.delays = delays
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk, delay in zip(self.chunks, self.delays):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    async def __aiter__(self):
+        for chunk, delay in zip(self.chunks, self.delays):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+class _RecordingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Passes a response body through, and saves it once it has been read in full."""
+
+    def __init__(self, transport: "GeminiTransport", stream, entry: dict, started: float):
+        self.transport = transport
+        self.stream = stream
+        self.entry = entry
+        self.started = started
+        self.complete = False
+        # (offset_s, raw bytes); decoded in _save, since a chunk boundary
+        # can fall inside a multibyte character.
+        self.chunks: List[Tuple[float, bytes]] = []
+
+    def _chunk(self, chunk: bytes) -> None:
+        self.chunks.append((round(time.perf_counter() - self.started, 4), chunk))
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.stream:
+            self._chunk(chunk)
+            yield chunk
+        self.complete = True
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self._chunk(chunk)
+            yield chunk
+        self.complete = True
+
+    def close(self) -> None:
+        self.stream.close()
+        self._save()
+
+    async def aclose(self) -> None:
+        await self.stream.aclose()
+        self._save()
+
+    def _save(self) -> None:
+        # A body abandoned halfway (cancelled call, broken connection) is not recorded.
+        if not self.complete:
+            return
+        # A character split across chunks is recorded whole, in the later one.
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for index, (offset_s, chunk) in enumerate(self.chunks):
+            text = decoder.decode(chunk, final=index == len(self.chunks) - 1)
+            self.entry["chunks"].append({"offset_s": offset_s, "text": text})
+        self.transport.cassette.save(self.entry)
+        metrics.increment("gemini_cassette", result="recorded")
+
+
+class GeminiTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    httpx transport (sync and async) for the record and replay modes;
+    record mode sends requests on with the usual connection pool.
+    """
+
+    def __init__(self, mode: str, cassette: Cassette, limits: Optional[httpx.Limits] = None):
+        self.mode = mode
+        self.cassette = cassette
+        limits = limits or httpx.Limits()
+        self._sync = httpx.HTTPTransport(limits=limits) if mode == "record" else None
+        self._async = httpx.AsyncHTTPTransport(limits=limits) if mode == "record" else None
+
+    def _record_entry(self, request: httpx.Request, response: httpx.Response, started: float) -> dict:
+        fingerprint, shape, images = request_fingerprint(request)
+        hashes = [_image_hash(data) for data in images]
+        return {
+            "version": CASSETTE_VERSION,
+            "fingerprint": fingerprint,
+            "shape": shape,
+            "image_hashes": [format(value, "x") if value is not None else "" for value in hashes],
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "headers_s": round(time.perf_counter() - started, 4),
+            "chunks": [],
+        }
+
+    @staticmethod
+    def _identity(request: httpx.Request) -> None:
+        # Recorded bodies stay readable text; decoding is left to the client.
+        request.headers["accept-encoding"] = "identity"
+
+    def _replayed(self, request: httpx.Request) -> Tuple[Optional[dict], float, List[float]]:
+        entry, match = self.cassette.find(*request_fingerprint(request))
+        metrics.increment("gemini_cassette", result=match)
+        if entry is None:
+            return None, 0.0, []
+        headers_delay, delays = _replay_delays(entry)
+        return entry, headers_delay, delays
+
+    @staticmethod
+    def _replay_response(request: httpx.Request, entry: dict, delays: List[float]) -> httpx.Response:
+        chunks = [chunk["text"].encode("utf-8") for chunk in entry["chunks"]]
+        return httpx.Response(
+            entry["status"],
+            headers=entry["headers"],
+            stream=_ReplayStream(chunks, delays),
+            request=request,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "replay":
+            entry, headers_delay, delays = self._replayed(request)
+            if entry is None:
+                return _miss_response(request)
+            if headers_delay:
+                time.sleep(headers_delay)
+            return self._replay_response(request, entry, delays)
+
+        self._identity(request)
+        started = time.perf_counter()
+        response = self._sync.handle_request(request)
+        if not 200 <= response.status_code < 300:
+            return response
+        stream = _RecordingStream(self, response.stream, self._record_entry(request, response, started), started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=stream,
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "replay":
+            entry, headers_delay, delays = self._replayed(request)
+            if entry is None:
+                return _miss_response(request)
+            if headers_delay:
+                await asyncio.sleep(headers_delay)
+            return self._replay_response(request, entry, delays)
+
+        self._identity(request)
+        started = time.perf_counter()
+        response = await self._async.handle_async_request(request)
+        if not 200 <= response.status_code < 300:
+            return response
+        stream = _RecordingStream(self, response.stream, self._record_entry(request, response, started), started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=stream,
+            extensions=response.extensions,
+            request=request,
+        )
+
+    def close(self) -> None:
+        if self._sync is not None:
+            self._sync.close()
+
+    async def aclose(self) -> None:
+        if self._async is not None:
+            await self._async.aclose()
+
+
+def get_transport_mode() -> str:
+    # Unknown values fall back to talking to the API directly.
+    return GEMINI_TRANSPORT if GEMINI_TRANSPORT in TRANSPORT_MODES else "passthrough"
+
+
+def build_transport(limits: Optional[httpx.Limits] = None) -> Optional[GeminiTransport]:
+    """The transport for GEMINI_TRANSPORT, or None to let the SDK use its own."""
+    mode = get_transport_mode()
+    if mode == "passthrough":
+        return None
+    if not GEMINI_CASSETTE_DIR:
+        raise RuntimeError(f"GEMINI_TRANSPORT={mode} needs GEMINI_CASSETTE_DIR")
+    return GeminiTransport(mode, Cassette(GEMINI_CASSETTE_DIR), limits)
@@ -1,4 +1,5 @@
 import re
+from typing import List, Optional
 
 DEFAULT_PREAMBLE = (
     "\\documentclass[12pt]{article}\n"
@@ -9,7 +10,14 @@ DEFAULT_PREAMBLE = (
     "\\begin{document}\n"
 )
 
+DOCUMENT_BEGIN = "\\begin{document}"
 DOCUMENT_END = "\\end{document}"
+DOCUMENT_CLASS = "\\documentclass"
+# Output starting with one of these is (part of) a preamble, even without
+# \\documentclass, e.g. from a model asked for the body only.
+PREAMBLE_STARTS = (DOCUMENT_CLASS, "\\usepackage", DOCUMENT_BEGIN)
+
+_TRAILING_FENCE = re.compile(r"\n?```\s*$")
 
 
 def post_process_latex(raw_latex: str) -> str:
@@ -18,6 +26,11 @@ def post_process_latex(raw_latex: str) -> str:
     - Strip markdown code fences.
     - Ensure a minimal preamble/document wrapper.
     - Normalize escaped newlines.
+
+    Bare bodies (body-only output) get the whole wrapper. Output with its
+    own \\begin{document} but no \\documentclass (a partial preamble) gets
+    the document class and default packages in front, so the model's
+    \\begin{document} still marks where the body starts.
     """
     if raw_latex is None:
         return ""
@@ -32,8 +45,12 @@ def post_process_latex(raw_latex: str) -> str:
     latex = latex.replace("\\\\n", "\n")
 
     # If no documentclass, wrap with a minimal preamble + document env.
-    if "\\documentclass" not in latex:
+    if "\\documentclass" not in latex and DOCUMENT_BEGIN not in latex:
         latex = DEFAULT_PREAMBLE + latex + "\n" + DOCUMENT_END
+    elif "\\documentclass" not in latex:
+        latex = DEFAULT_PREAMBLE[: -len(DOCUMENT_BEGIN + "\n")] + latex
+        if DOCUMENT_END not in latex:
+            latex = latex + "\n" + DOCUMENT_END
     elif DOCUMENT_END not in latex:
         # Ensure we close the document if the model forgot.
         latex = latex + "\n" + DOCUMENT_END
@@ -59,3 +76,154 @@ def wrap_latex_document(body: str) -> str:
     Wrap a LaTeX body in a single document preamble and environment.
     """
     return (DEFAULT_PREAMBLE + body + "\n" + DOCUMENT_END).strip()
+
+
+def _partial_suffix(text: str, marker: str) -> int:
+    # Length of the longest end of `text` that could be the start of `marker`.
+    for size in range(min(len(marker) - 1, len(text)), 0, -1):
+        if text.endswith(marker[:size]):
+            return size
+    return 0
+
+
+def _strip_leading_fence(text: str, final: bool) -> Optional[str]:
+    # Incremental form of the leading-fence regex in post_process_latex;
+    # None until enough text has arrived to decide.
+    if not text.startswith("```"):
+        return None if "```latex".startswith(text) and not final else text
+    rest = text[3:]
+    if rest.startswith("latex"):
+        rest = rest[5:]
+    elif "latex".startswith(rest) and not final:
+        return None
+    content = rest.lstrip()
+    return None if not content and not final else content
+
+
+class LatexBodyStream:
+    """
+    Incremental extract_document_body for model output arriving in chunks.
+
+    feed() returns the body text that is final so far and holds back what a
+    later chunk could still change: a possible closing fence, \\end{document}
+    or escaped newline, trailing whitespace, and text after an
+    \\end{document} (dropped unless another one follows). finish() returns
+    the rest. The pieces joined equal extract_document_body(raw), so each
+    page is post-processed once, as it streams.
+
+    The one case that cannot be decided on the fly is chatter before
+    \\documentclass or \\begin{document}: the pieces then include it, and at
+    finish() `body` is re-extracted from the whole text and `revised` is set.
+    """
+
+    def __init__(self):
+        self.revised = False
+        self._raw: List[str] = []
+        self._parts: List[str] = []
+        # Raw text not yet normalized: the undecided start, trailing backslashes.
+        self._pending = ""
+        # Normalized text not yet emitted.
+        self._text = ""
+        # lead -> mode -> preamble -> body, or lead -> mode -> bare.
+        self._state = "lead"
+        self._closed = False
+        self._body: Optional[str] = None
+
+    @property
+    def body(self) -> str:
+        return self._body if self._body is not None else "".join(self._parts)
+
+    def feed(self, chunk: str) -> str:
+        self._raw.append(chunk)
+        return self._process(chunk, final=False)
+
+    def finish(self) -> str:
+        tail = self._process("", final=True)
+        raw = "".join(self._raw)
+        if self._state == "bare" and (DOCUMENT_CLASS in raw or DOCUMENT_BEGIN in raw):
+            self._body = extract_document_body(raw)
+            self.revised = True
+        return tail
+
+    def _process(self, chunk: str, final: bool) -> str:
+        self._pending += chunk
+        if self._state == "lead":
+            content = _strip_leading_fence(self._pending.lstrip(), final)
+            if content is None:
+                return ""
+            self._pending = content
+            self._state = "mode"
+
+        if final:
+            ready, self._pending = self._pending, ""
+        else:
+            # "\\\\n" can straddle chunks; keep trailing backslashes for later.
+            keep = len(self._pending) - len(self._pending.rstrip("\\"))
+            ready = self._pending[: len(self._pending) - keep]
+            self._pending = self._pending[len(ready):]
+        self._text += ready.replace("\\\\n", "\n")
+
+        if self._state == "mode":
+            if self._text.startswith(PREAMBLE_STARTS):
+                self._state = "preamble"
+            elif any(start.startswith(self._text) for start in PREAMBLE_STARTS) and not final:
+                return ""
+            else:
+                self._state = "bare"
+
+        if self._state == "preamble":
+            begin = self._text.find(DOCUMENT_BEGIN)
+            if begin == -1:
+                if not final:
+                    return ""
+                # No body: extract_document_body returns the whole document,
+                # or the whole text when it has no \\documentclass either.
+                latex = _TRAILING_FENCE.sub("", self._text.strip())
+                if DOCUMENT_END not in latex and latex.startswith(DOCUMENT_CLASS):
+                    latex = latex + "\n" + DOCUMENT_END
+                return self._emit(latex.strip())
+            self._text = self._text[begin + len(DOCUMENT_BEGIN):]
+            self._state = "body"
+
+        if not self._parts:
+            self._text = self._text.lstrip()
+        if self._state == "bare":
+            return self._emit(self._open_text(final, marker=None))
+        return self._emit(self._body_text(final))
+
+    def _open_text(self, final: bool, marker: Optional[str]) -> str:
+        # Emit everything but a possible fence/marker start and trailing whitespace.
+        text = self._text
+        if final:
+            self._text = ""
+            return _TRAILING_FENCE.sub("", text).rstrip()
+        hold = _partial_suffix(text, marker) if marker else 0
+        cut = len(text[: len(text) - hold].rstrip(" \t\r\n`"))
+        self._text = text[cut:]
+        return text[:cut]
+
+    def _body_text(self, final: bool) -> str:
+        if not self._closed:
+            end = self._text.find(DOCUMENT_END)
+            if end == -1:
+                return self._open_text(final, marker=DOCUMENT_END)
+            out = self._text[:end].rstrip()
+            self._text = self._text[len(out):]
+            self._closed = True
+        else:
+            out = ""
+
+        # Held text starts at an \\end{document}; the body runs to the last one.
+        last = self._text.rfind(DOCUMENT_END)
+        if last > self._text.find(DOCUMENT_END):
+            more = self._text[:last].rstrip()
+            self._text = self._text[len(more):]
+            out += more
+        if final:
+            self._text = ""
+        return out
+
+    def _emit(self, text: str) -> str:
+        if text:
+            self._parts.append(text)
+        return text
@@ -0,0 +1,160 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Recent observations kept per timing series for percentiles.
+MAX_SAMPLES = 2048
+# Upper bounds (ms) of the histogram buckets every timing series is counted
+# into, over the process lifetime; the last bucket is unbounded.
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict) -> _Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _series_name(key: _Key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{label}={value}" for label, value in labels) + "}"
+
+
+def _percentile(ordered, fraction: float) -> float:
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Metrics:
+    """
+    In-process counters and timing summaries for the convert pipeline.
+
+    Series are identified by a name plus optional labels, e.g.
+    observe("gemini_request_ms", 812.0, mode="batch"). Served as JSON by
+    GET /api/metrics.
+
+    Timing percentiles cover the last `max_samples` observations; the
+    cumulative histogram of each timing series covers all of them.
+    """
+
+    def __init__(self, max_samples: int = MAX_SAMPLES, buckets_ms: Tuple[float, ...] = HISTOGRAM_BUCKETS_MS):
+        self.max_samples = max_samples
+        self.buckets_ms = tuple(sorted(buckets_ms))
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._timings: Dict[_Key, Deque[float]] = {}
+        self._timing_totals: Dict[_Key, Tuple[int, float]] = {}
+        self._histograms: Dict[_Key, List[int]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            samples = self._timings.get(key)
+            if samples is None:
+                samples = self._timings[key] = deque(maxlen=self.max_samples)
+            samples.append(value)
+            count, total = self._timing_totals.get(key, (0, 0.0))
+            self._timing_totals[key] = (count + 1, total + value)
+            buckets = self._histograms.get(key)
+            if buckets is None:
+                buckets = self._histograms[key] = [0] * (len(self.buckets_ms) + 1)
+            buckets[bisect.bisect_left(self.buckets_ms, value)] += 1
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {_series_name(key): value for key, value in self._counters.items()}
+            gauges = {_series_name(key): value for key, value in self._gauges.items()}
+            timings = {}
+            for key, samples in self._timings.items():
+                count, total = self._timing_totals[key]
+                ordered = sorted(samples)
+                timings[_series_name(key)] = {
+                    "count": count,
+                    "mean": round(total / count, 3),
+                    "p50": round(_percentile(ordered, 0.50), 3),
+                    "p95": round(_percentile(ordered, 0.95), 3),
+                    "max": round(ordered[-1], 3),
+                }
+            histograms = {
+                _series_name(key): self._histogram(key, buckets)
+                for key, buckets in self._histograms.items()
+            }
+        return {"counters": counters, "gauges": gauges, "timings": timings, "histograms": histograms}
+
+    def _histogram(self, key: _Key, buckets: List[int]) -> dict:
+        # Cumulative counts per upper bound ("le"), like a Prometheus histogram.
+        count, total = self._timing_totals[key]
+        cumulative = {}
+        running = 0
+        for bound, observed in zip(self.buckets_ms + (float("inf"),), buckets):
+            running += observed
+            cumulative["+Inf" if bound == float("inf") else f"{bound:g}"] = running
+        return {"count": count, "sum": round(total, 3), "buckets": cumulative}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+            self._timing_totals.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
+
+
+class StageTimer:
+    """
+    Wall-clock milliseconds per stage of one request, in the order the
+    stages first ran. Time spent in a stage twice is added up.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, ms: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def finish(self) -> Dict[str, float]:
+        """Stages rounded to 0.1 ms, plus "total" since the timer was created."""
+        self.stages["total"] = (time.perf_counter() - self.started) * 1000
+        return {stage: round(ms, 1) for stage, ms in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """The stages as a Server-Timing header value."""
+        return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.stages.items())
+
+    def record(self, name: str, target: Optional[Metrics] = None) -> None:
+        """Observe each stage into the timing series `name{stage=...}`."""
+        target = target or metrics
+        for stage, ms in self.stages.items():
+            target.observe(name, ms, stage=stage)
@@ -0,0 +1,423 @@
+import asyncio
+import functools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.metrics import metrics
+from app.utils.executors import GEMINI_MAX_CONCURRENCY
+
+# Requests per minute allowed per API key (Gemini 2.5 Flash, paid tier 1).
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "1000"))
+# Requests that may go out back to back before the per-minute rate applies.
+GEMINI_REQUEST_BURST = int(os.getenv("GEMINI_REQUEST_BURST", "20"))
+# Retries of a rate-limited or failed call, with jittered exponential backoff.
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE_S = float(os.getenv("GEMINI_BACKOFF_BASE_S", "0.5"))
+GEMINI_BACKOFF_MAX_S = float(os.getenv("GEMINI_BACKOFF_MAX_S", "20"))
+# How long a call may wait for a free slot before it fails as rate limited.
+GEMINI_QUEUE_TIMEOUT_S = float(os.getenv("GEMINI_QUEUE_TIMEOUT_S", "120"))
+
+# Responses that mean "slow down": they halve the concurrency limit.
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 503, 504}
+# The limit is halved at most once per window, so a wave of 429s from calls
+# that were already in flight counts as one signal.
+DECREASE_COOLDOWN_S = 1.0
+
+# The governor whose slot the current thread's call already holds (see
+# RateGovernor.admitted).
+_admitted = threading.local()
+
+
+class GeminiBusyError(RuntimeError):
+    """No request slot freed up within the queue timeout."""
+
+    code = 429
+
+
+class GeminiDeadlineError(TimeoutError):
+    """The caller's deadline passed while the call was still queued."""
+
+
+def error_status(exc: Exception) -> Optional[int]:
+    """HTTP status of a google-genai APIError (or GeminiBusyError), else None."""
+    code = getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() always takes a token and returns how
+    long to wait before using it, so callers queue in arrival order instead
+    of racing for tokens. A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate = rate_per_s
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on calls in flight: each success adds 1/limit (about +1 per
+    round trip of calls), each throttled call halves it, down to min_limit.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+        # Event-loop callers waiting in acquire_async, woken by release().
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _try_acquire(self) -> bool:
+        # Caller holds self._cond.
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._try_acquire():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    async def acquire_async(self, timeout: float) -> bool:
+        """acquire() for the event loop: waits on a future, not a thread."""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            with self._cond:
+                if self._try_acquire():
+                    return True
+                if remaining <= 0:
+                    return False
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._cond:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= DECREASE_COOLDOWN_S:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._notify()
+
+    def abandon(self) -> None:
+        """Give a slot back without counting the call as a success or a throttle."""
+        with self._cond:
+            self.in_flight -= 1
+            self._notify()
+
+    def _notify(self) -> None:
+        # Caller holds self._cond. Every waiter re-checks the limit.
+        self._cond.notify_all()
+        for loop, waiter in self._waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:
+                pass  # Its loop is closed; nobody is waiting any more.
+        self._waiters.clear()
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class RateGovernor:
+    """
+    Client-side rate governor for one Gemini API key.
+
+    Calls wait for a concurrency slot (AIMD, see AdaptiveConcurrency) and a
+    token from the per-key bucket, so bursts queue instead of hitting quota
+    errors. 429/5xx responses are retried with full-jitter exponential
+    backoff (never shorter than a Retry-After header); only a call that keeps
+    failing, or waits longer than queue_timeout_s for a slot, raises.
+
+    call() and stream() wait on the calling thread. call_async() waits on
+    the event loop, so with submit_io the I/O pool only ever runs the request
+    itself (see admitted()).
+
+    Each takes an optional absolute `deadline` (time.monotonic()): a call
+    still queued then raises GeminiDeadlineError, and a failed attempt is
+    not retried when its backoff would end past it. An attempt already in
+    flight is left to the request timeout.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+        burst: int = GEMINI_REQUEST_BURST,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        max_retries: int = GEMINI_MAX_RETRIES,
+        backoff_base_s: float = GEMINI_BACKOFF_BASE_S,
+        backoff_max_s: float = GEMINI_BACKOFF_MAX_S,
+        queue_timeout_s: float = GEMINI_QUEUE_TIMEOUT_S,
+    ):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.queue_timeout_s = queue_timeout_s
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.backoff_max_s))
+        return delay
+
+    def _busy(self) -> GeminiBusyError:
+        metrics.increment("gemini_queue_timeouts")
+        return GeminiBusyError(f"Gemini rate limit: no request slot within {self.queue_timeout_s:g}s")
+
+    def _queue_timeout(self, deadline: Optional[float]) -> float:
+        if deadline is None:
+            return self.queue_timeout_s
+        return min(self.queue_timeout_s, deadline - time.monotonic())
+
+    def _not_acquired(self, deadline: Optional[float]) -> Exception:
+        if deadline is not None and time.monotonic() >= deadline:
+            metrics.increment("gemini_deadline_expired")
+            return GeminiDeadlineError("Gemini deadline passed while waiting for a request slot")
+        return self._busy()
+
+    def _token_wait(self, deadline: Optional[float]) -> float:
+        # Called holding a slot; gives it back if the token comes too late.
+        wait = self.bucket.reserve()
+        if deadline is not None and time.monotonic() + wait >= deadline:
+            self.concurrency.abandon()
+            metrics.increment("gemini_deadline_expired")
+            raise GeminiDeadlineError("Gemini deadline passes before the next request token")
+        return wait
+
+    def _acquire(self, deadline: Optional[float] = None) -> None:
+        started = time.perf_counter()
+        if not self.concurrency.acquire(self._queue_timeout(deadline)):
+            raise self._not_acquired(deadline)
+        wait = self._token_wait(deadline)
+        if wait:
+            time.sleep(wait)
+        metrics.observe("gemini_queue_ms", (time.perf_counter() - started) * 1000)
+
+    async def _acquire_async(self, deadline: Optional[float] = None) -> None:
+        started = time.perf_counter()
+        if not await self.concurrency.acquire_async(self._queue_timeout(deadline)):
+            raise self._not_acquired(deadline)
+        wait = self._token_wait(deadline)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                self.concurrency.abandon()
+                raise
+        metrics.observe("gemini_queue_ms", (time.perf_counter() - started) * 1000)
+
+    def _holds_slot(self) -> bool:
+        return getattr(_admitted, "governor", None) is self
+
+    def admitted(self, func: Callable) -> Callable:
+        """
+        Wrap a blocking function for call_async(submit_io, ...): governed calls
+        it makes through this governor, on the thread that runs it, go
+        straight out, since the awaiting caller already holds their slot
+        and handles retries.
+        """
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            outer = getattr(_admitted, "governor", None)
+            _admitted.governor = self
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _admitted.governor = outer
+
+        return run
+
+    def _release(
+        self,
+        exc: Optional[Exception],
+        attempt: int,
+        retryable: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Optional[float]:
+        # Give the slot back and decide whether to retry: the backoff in
+        # seconds, or None when the error should propagate.
+        status = error_status(exc) if exc is not None else None
+        throttled = status in THROTTLE_STATUSES
+        self.concurrency.release(throttled)
+        metrics.set_gauge("gemini_concurrency_limit", round(self.concurrency.limit, 2))
+        if exc is None:
+            return None
+        if throttled:
+            metrics.increment("gemini_throttled", status=status)
+        if not retryable or status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt, _retry_after(exc))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            # Nobody would be waiting for the retry's answer.
+            metrics.increment("gemini_deadline_expired")
+            return None
+        metrics.increment("gemini_retries")
+        return delay
+
+    def call(self, func, *args, deadline: Optional[float] = None, **kwargs):
+        if self._holds_slot():
+            return func(*args, **kwargs)
+        attempt = 0
+        while True:
+            self._acquire(deadline)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                delay = self._release(exc, attempt, deadline=deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._release(None, attempt)
+            return result
+
+    def stream(self, func, *args, deadline: Optional[float] = None, **kwargs):
+        """
+        call() for a function returning an iterator (a streamed response).
+        The slot is held until the iterator is exhausted or closed; failures
+        are only retried before the first item has been handed out.
+        """
+        if self._holds_slot():
+            yield from func(*args, **kwargs)
+            return
+        attempt = 0
+        while True:
+            self._acquire(deadline)
+            released = yielded = False
+            try:
+                for item in func(*args, **kwargs):
+                    yielded = True
+                    yield item
+            except Exception as exc:
+                released = True
+                delay = self._release(exc, attempt, retryable=not yielded, deadline=deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                if not released:
+                    self._release(None, attempt)
+            return
+
+    async def call_async(
+        self,
+        func,
+        *args,
+        retryable: Optional[Callable[[], bool]] = None,
+        deadline: Optional[float] = None,
+    ):
+        """
+        call() for a coroutine function, or a function returning a
+        concurrent future (executors.submit_io); queueing, token waits and
+        backoff happen on the event loop. `retryable` is asked before a
+        failed attempt is retried (a streamed call that already produced
+        output cannot be).
+
+        A cancelled call gives its slot back at once, unless its request
+        goes on in a thread: then only once the thread is done with it.
+        """
+        attempt = 0
+        while True:
+            await self._acquire_async(deadline)
+            running: Optional[Future] = None
+            try:
+                call = func(*args)
+                if isinstance(call, Future):
+                    running, call = call, asyncio.wrap_future(call)
+                result = await call
+            except asyncio.CancelledError:
+                if running is None:
+                    self.concurrency.abandon()
+                else:
+                    # Runs at once if the request never started.
+                    running.add_done_callback(lambda _running: self.concurrency.abandon())
+                raise
+            except Exception as exc:
+                delay = self._release(
+                    exc, attempt, retryable=retryable is None or retryable(), deadline=deadline
+                )
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._release(None, attempt)
+            return result
+
+
+_GOVERNORS: Dict[str, RateGovernor] = {}
+_GOVERNORS_LOCK = threading.Lock()
+
+
+def get_governor(api_key: str) -> RateGovernor:
+    """Return the process-wide governor for an API key, creating it on first use."""
+    with _GOVERNORS_LOCK:
+        governor = _GOVERNORS.get(api_key)
+        if governor is None:
+            governor = _GOVERNORS[api_key] = RateGovernor()
+        return governor
+
+
+def reset_governors() -> None:
+    with _GOVERNORS_LOCK:
+        _GOVERNORS.clear()
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    One in-flight computation per key, shared by every caller that asks for
+    the same key while it runs.
+
+    claim() makes the first caller the leader; it must resolve() the
+    returned future. Later callers get the same future and wait() on it.
+    Futures are thread-safe, so callers on different event loops (or
+    threads) can share a computation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """Return (future, True) for the new leader, (future, False) for a follower."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def resolve(
+        self,
+        key: str,
+        future: Future,
+        result=None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """
+        Publish the leader's outcome and forget the key. A leader that was
+        cancelled resolves with result=None, so followers do the work themselves.
+        """
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def wait(self, future: Future, timeout: Optional[float] = None):
+        """
+        The leader's result. None if it was cancelled, or has not finished
+        within `timeout` seconds: either way the follower does the work itself.
+        """
+        # Shielded: a follower giving up must not cancel the leader's future.
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,149 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+# Rasterization, resizing and JPEG encoding (PIL releases the GIL for most of it).
+CONVERT_CPU_WORKERS = int(os.getenv("CONVERT_CPU_WORKERS", str(os.cpu_count() or 2)))
+# Gemini calls in flight across every request on this worker.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Short disk and database calls (conversion cache disk tier, upload spooling,
+# job rows), kept off io_executor so they never queue behind Gemini calls.
+CONVERT_STORAGE_WORKERS = int(os.getenv("CONVERT_STORAGE_WORKERS", "4"))
+# "thread": the image stages run on cpu_executor. "process": rasterization,
+# page filtering and preprocessing run in CONVERT_PROCESS_WORKERS worker
+# processes, so concurrent uploads are not serialized on the GIL; pages reach
+# them through shared memory (utils/shared_pages.py).
+CONVERT_CPU_BACKEND = os.getenv("CONVERT_CPU_BACKEND", "thread")
+CONVERT_PROCESS_WORKERS = int(os.getenv("CONVERT_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+
+cpu_executor = ThreadPoolExecutor(
+    max_workers=CONVERT_CPU_WORKERS,
+    thread_name_prefix="convert-cpu",
+)
+io_executor = ThreadPoolExecutor(
+    max_workers=GEMINI_MAX_CONCURRENCY,
+    thread_name_prefix="convert-io",
+)
+storage_executor = ThreadPoolExecutor(
+    max_workers=CONVERT_STORAGE_WORKERS,
+    thread_name_prefix="convert-storage",
+)
+
+# Started on first use; "spawn" because forking a process that runs threads
+# (these pools, the server) can copy held locks into the child.
+_process_executor: ProcessPoolExecutor | None = None
+_process_executor_lock = threading.Lock()
+
+
+def get_process_executor() -> ProcessPoolExecutor:
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is None:
+            _process_executor = ProcessPoolExecutor(
+                max_workers=CONVERT_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_executor
+
+
+def shutdown_process_executor() -> None:
+    global _process_executor
+    with _process_executor_lock:
+        executor, _process_executor = _process_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Run a CPU-bound callable on the shared CPU pool without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(func, *args, **kwargs))
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    Run a blocking network call (Gemini) on the shared I/O pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, partial(func, *args, **kwargs))
+
+
+def submit_io(func, *args, **kwargs) -> Future:
+    """
+    Start a blocking network call on the I/O pool and return its future, for
+    callers that must know when the thread is done with it even after they
+    stop waiting (RateGovernor.call_async).
+    """
+    return io_executor.submit(partial(func, *args, **kwargs))
+
+
+async def run_storage(func, *args, **kwargs):
+    """
+    Run a short blocking disk or database call on the storage pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(storage_executor, partial(func, *args, **kwargs))
+
+
+async def run_process(func, *args, **kwargs):
+    """
+    Run a CPU-bound callable in the worker process pool. `func` and its
+    arguments are pickled, so pass shared memory handles, not page data.
+    """
+    return await _run_in_process(None, func, args, kwargs)
+
+
+async def run_cpu_owned(release, func, *args, **kwargs):
+    """
+    run_cpu for a callable whose result must be freed (shared memory
+    blocks): if the caller is cancelled before the result arrives,
+    `release(result)` runs once it does.
+    """
+    return await _owned(cpu_executor.submit(partial(func, *args, **kwargs)), release)
+
+
+async def run_process_owned(release, func, *args, **kwargs):
+    """run_process with run_cpu_owned's handling of an abandoned result."""
+    return await _run_in_process(release, func, args, kwargs)
+
+
+async def _run_in_process(release, func, args, kwargs):
+    executor = get_process_executor()
+    try:
+        return await _owned(executor.submit(partial(func, *args, **kwargs)), release)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the next call starts a new pool.
+        global _process_executor
+        with _process_executor_lock:
+            if _process_executor is executor:
+                _process_executor = None
+        raise
+
+
+async def _owned(future: Future, release):
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        if release is not None:
+            # A call that had not started is cancelled with us; one that had
+            # hands its result to `release` when it finishes.
+            future.add_done_callback(partial(_release_result, release))
+        raise
+
+
+def _release_result(release, future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        release(future.result())
+
+
+async def warm_process_pool(task) -> None:
+    """Start every worker process now by running `task` once per worker."""
+    executor = get_process_executor()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(executor, task) for _ in range(CONVERT_PROCESS_WORKERS)))
@@ -1,26 +1,141 @@
-import base64
 import io
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 
 MAX_SIZE = 2048
 JPEG_QUALITY = 90
 CONTRAST_FACTOR = 1.5
 
+# Target size of one encoded page; 0 keeps the fixed RGB / JPEG_QUALITY encoding.
+PAGE_BYTE_BUDGET = int(os.getenv("CONVERT_PAGE_BYTE_BUDGET", "300000"))
+# How far encode_image may go to meet the budget.
+MIN_JPEG_QUALITY = 40
+MIN_ENCODE_SIZE = 768
+DOWNSCALE_STEP = 0.8
+
+# "pil": PIL filters, one page at a time. "numpy": contrast and sharpen fused
+# into one array pass over a grayscale stack of pages (preprocess_page_batch).
+PREPROCESS_ENGINE = os.getenv("CONVERT_PREPROCESS_ENGINE", "pil")
+
+
+@dataclass
+class EncodedImage:
+    data: bytes
+    mode: str
+    width: int
+    height: int
+    quality: int
+
+    def params(self) -> dict:
+        """Encoding choices, as reported per page in convert responses."""
+        return {
+            "mode": self.mode,
+            "width": self.width,
+            "height": self.height,
+            "quality": self.quality,
+            "bytes": len(self.data),
+        }
+
+
+def _is_grayscale(img: Image.Image) -> bool:
+    if img.mode in ("L", "1"):
+        return True
+    # Judge from a thumbnail; scanner noise can tint a few pixels.
+    thumb = np.asarray(img.convert("RGB").reduce(8), dtype=np.int16)
+    spread = thumb.max(axis=2) - thumb.min(axis=2)
+    return float((spread > 16).mean()) < 0.001
+
+
+def _jpeg(img: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _encoded(img: Image.Image, data: bytes, quality: int) -> EncodedImage:
+    return EncodedImage(data, img.mode, img.width, img.height, quality)
+
+
+def encode_image(img: Image.Image, byte_budget: Optional[int] = None) -> EncodedImage:
+    """
+    Encode a preprocessed page as JPEG within `byte_budget` bytes (defaults to
+    PAGE_BYTE_BUDGET; 0 means fixed RGB at JPEG_QUALITY).
+
+    Grayscale pages are stored as single-channel JPEG. Then the highest
+    quality (JPEG_QUALITY down to MIN_JPEG_QUALITY) that fits is used, and if
+    none does the page is shrunk by DOWNSCALE_STEP and searched again, down to
+    MIN_ENCODE_SIZE on the long side. If even that does not fit, the smallest
+    attempt is returned.
+    """
+    budget = PAGE_BYTE_BUDGET if byte_budget is None else byte_budget
+    if not budget:
+        img = img if img.mode == "RGB" else img.convert("RGB")
+        return _encoded(img, _jpeg(img, JPEG_QUALITY), JPEG_QUALITY)
+
+    img = img.convert("L" if _is_grayscale(img) else "RGB")
+    while True:
+        data = _jpeg(img, JPEG_QUALITY)
+        if len(data) <= budget:
+            return _encoded(img, data, JPEG_QUALITY)
+
+        # JPEG size grows with quality: binary search the best fit below it.
+        best = None
+        low, high = MIN_JPEG_QUALITY, JPEG_QUALITY - 1
+        while low <= high:
+            quality = (low + high) // 2
+            data = _jpeg(img, quality)
+            if len(data) <= budget:
+                best = _encoded(img, data, quality)
+                low = quality + 1
+            else:
+                high = quality - 1
+        if best is not None:
+            return best
+
+        w, h = img.size
+        if max(w, h) * DOWNSCALE_STEP < MIN_ENCODE_SIZE:
+            return _encoded(img, _jpeg(img, MIN_JPEG_QUALITY), MIN_JPEG_QUALITY)
+        img = img.resize(
+            (int(w * DOWNSCALE_STEP), int(h * DOWNSCALE_STEP)),
+            Image.LANCZOS
+        )
 
-def preprocess_image(image_bytes: bytes) -> str:
+
+def preprocess_image(image_bytes: bytes, engine: Optional[str] = None) -> EncodedImage:
+    """
+    Decode an uploaded image file and normalize it for Gemini Vision with
+    `engine` (defaults to PREPROCESS_ENGINE). See preprocess_pil_image.
+    """
+
+    img = Image.open(io.BytesIO(image_bytes))
+    if (engine or PREPROCESS_ENGINE) == "numpy":
+        return preprocess_page_batch([img])[0]
+    return preprocess_pil_image(img)
+
+
+def preprocess_pil_image(img) -> EncodedImage:
     """
     GOAL: Normalize an image for Gemini Vision:
     - RGB only
     - Resize if too large
     - Increase contrast
     - Sharpen strokes
-    - Encode as base64 JPEG
+    - Encode as JPEG within the page byte budget (encode_image)
+
+    Takes a PIL image, or an array PIL can wrap (H x W or H x W x 3 uint8),
+    so already-decoded pages (e.g. rendered PDF pages) skip a PNG round trip.
 
     Returns:
-        base64-encoded JPEG string
+        EncodedImage: JPEG bytes (base64 is left to whichever transport needs
+        it) plus the mode, size and quality chosen for them
     """
 
-    img = Image.open(io.BytesIO(image_bytes))
+    if not isinstance(img, Image.Image):
+        img = Image.fromarray(img)
 
     # Ensure RGB (strip alpha)
     if img.mode != "RGB":
@@ -41,9 +156,108 @@ def preprocess_image(image_bytes: bytes) -> str:
     # Sharpen edges
     img = img.filter(ImageFilter.SHARPEN)
 
-    # Encode to base64 JPEG
-    buffer = io.BytesIO()
-    img.save(buffer, format="JPEG", quality=JPEG_QUALITY)
-    buffer.seek(0)
+    return encode_image(img)
+
+
+def _normalize_mode(img) -> Image.Image:
+    if not isinstance(img, Image.Image):
+        img = Image.fromarray(img)
+    if img.mode in ("L", "RGB"):
+        return img
+    return img.convert("RGB")
+
+
+def _grayscale_array(img: Image.Image) -> np.ndarray:
+    if img.mode == "L":
+        return np.asarray(img)
+    # Same fixed-point ITU-R 601-2 weights PIL uses for convert("L").
+    rgb = np.asarray(img, dtype=np.uint32)
+    luma = rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000
+    return (luma >> 16).astype(np.uint8)
+
+
+def _contrast_luts(hist: np.ndarray, factors: Sequence[float]) -> np.ndarray:
+    """
+    One 256-entry lookup table per page (rows of `hist`, the page histograms)
+    that applies each contrast factor in turn, exactly like chained
+    ImageEnhance.Contrast calls: every step blends towards the rounded mean of
+    the previous step's output, which is read off the histogram instead of
+    the pixels.
+    """
+    levels = np.arange(256, dtype=np.float32)
+    luts = np.tile(np.arange(256, dtype=np.intp), (hist.shape[0], 1))
+    hist = hist.astype(np.float64)
+    for factor in factors:
+        mean = np.floor((hist * levels).sum(axis=1) / hist.sum(axis=1) + 0.5).astype(np.float32)
+        step = mean[:, None] + np.float32(factor) * (levels - mean[:, None])
+        step = np.clip(step, 0, 255).astype(np.intp)
+        luts = np.take_along_axis(step, luts, axis=1)
+        # Histogram of this step's output, for the next step's mean.
+        hist = np.stack(
+            [np.bincount(row, weights=counts, minlength=256) for row, counts in zip(step, hist)]
+        )
+    return luts.astype(np.int16)
+
+
+def _sharpen(stack: np.ndarray) -> np.ndarray:
+    """
+    ImageFilter.SHARPEN over the last two axes of an int16 stack (border
+    pixels are copied, results rounded half up), in integer arithmetic.
+    """
+    # Kernel: 32 at the centre, -2 around it, divided by 16; as a 3x3 box sum
+    # that is (34 * centre - 2 * box + 8) >> 4.
+    box = stack[..., :, :-2] + stack[..., :, 1:-1]
+    box += stack[..., :, 2:]
+    box = box[..., :-2, :] + box[..., 1:-1, :] + box[..., 2:, :]
+    sharpened = stack[..., 1:-1, 1:-1] * np.int16(34)
+    box *= 2
+    sharpened -= box
+    sharpened += 8
+    sharpened >>= 4
+    np.clip(sharpened, 0, 255, out=sharpened)
+
+    out = stack.astype(np.uint8)
+    out[..., 1:-1, 1:-1] = sharpened
+    return out
+
+
+def preprocess_page_batch(images, pre_contrast: Optional[float] = None) -> List[EncodedImage]:
+    """
+    Vectorized preprocess_pil_image for a batch of pages, returned in input order.
+
+    Pages are reduced to grayscale and resized like the PIL path; pages of the
+    same size are then stacked and go through one fused pass: both contrast
+    boosts (`pre_contrast`, e.g. the PDF render boost, then CONTRAST_FACTOR)
+    as a single lookup table per page, then SHARPEN. For grayscale pages that
+    need no resize the output matches `preprocess_pil_image` after an
+    ImageEnhance.Contrast(pre_contrast) pixel for pixel.
+    """
+    pages = []
+    for img in images:
+        img = _normalize_mode(img)
+        w, h = img.size
+        if max(w, h) > MAX_SIZE:
+            scale = MAX_SIZE / max(w, h)
+            img = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+        pages.append(_grayscale_array(img))
+
+    factors = [CONTRAST_FACTOR] if pre_contrast is None else [pre_contrast, CONTRAST_FACTOR]
+    encoded: List[Optional[EncodedImage]] = [None] * len(pages)
+    by_shape = {}
+    for index, page in enumerate(pages):
+        by_shape.setdefault(page.shape, []).append(index)
+
+    for indices in by_shape.values():
+        hist = np.array([Image.fromarray(pages[index]).histogram() for index in indices])
+        luts = _contrast_luts(hist, factors)
+        # Both contrast boosts in one lookup, straight into the int16 stack
+        # the sharpen pass works in.
+        stack = np.empty((len(indices),) + pages[indices[0]].shape, dtype=np.int16)
+        for row, index in enumerate(indices):
+            np.take(luts[row], pages[index], out=stack[row])
+        stack = _sharpen(stack)
+
+        for index, page in zip(indices, stack):
+            encoded[index] = encode_image(Image.fromarray(page))
 
-    return base64.b64encode(buffer.read()).decode("utf-8")
+    return encoded
@@ -0,0 +1,99 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from app.utils.page_filter import ink_mask, to_grayscale
+
+# Simple pages go to GEMINI_FAST_MODEL, the rest to GEMINI_MODEL.
+MODEL_ROUTING_ENABLED = os.getenv("CONVERT_MODEL_ROUTING_ENABLED", "1").lower() in {"1", "true", "yes"}
+# A page is simple only when it is under all three limits.
+ROUTE_MAX_INK_RATIO = float(os.getenv("CONVERT_ROUTE_MAX_INK_RATIO", "0.03"))
+ROUTE_MAX_STROKES = int(os.getenv("CONVERT_ROUTE_MAX_STROKES", "400"))
+ROUTE_MAX_LINES = int(os.getenv("CONVERT_ROUTE_MAX_LINES", "8"))
+
+# Pages are measured at about this width: enough to keep pen strokes apart,
+# small enough that measuring a page takes a few milliseconds.
+MEASURE_WIDTH = 512
+# A row of the measured page belongs to a line of writing when at least this
+# fraction of it is ink; lines closer than LINE_GAP rows are merged, and
+# runs shorter than MIN_LINE_HEIGHT rows (specks, underlines) are ignored.
+LINE_INK_RATIO = 0.01
+LINE_GAP = 3
+MIN_LINE_HEIGHT = 4
+
+
+def _measured(img) -> Image.Image:
+    if isinstance(img, (bytes, bytearray)):
+        img = Image.open(io.BytesIO(img))
+        # JPEG pages decode straight at a fraction of their size.
+        img.draft("L", (MEASURE_WIDTH, MEASURE_WIDTH * img.height // max(img.width, 1)))
+    gray = to_grayscale(img)
+    factor = gray.width // MEASURE_WIDTH
+    return gray.reduce(factor) if factor > 1 else gray
+
+
+def _stroke_count(ink: np.ndarray) -> int:
+    """
+    Estimated number of pen strokes: ink runs (per row) with no ink directly
+    above them, i.e. the top of each connected stroke. Strokes that fork
+    upwards (a "u", a "v") count once per branch, which is fine for ranking
+    pages; it needs no labelling pass.
+    """
+    rows, width = ink.shape
+    padded = np.zeros((rows, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = ink
+    edges = np.diff(padded, axis=1)
+    run_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    # Ink in the row above, per run: prefix sums over that row, 8-connected.
+    above = np.zeros((rows, width + 1), dtype=np.int32)
+    np.cumsum(ink[:-1], axis=1, out=above[1:, 1:])
+    left = np.maximum(starts - 1, 0)
+    right = np.minimum(ends + 1, width)
+    touching = above[run_rows, right] - above[run_rows, left]
+    return int((touching == 0).sum())
+
+
+def _line_count(ink: np.ndarray) -> int:
+    """Lines of writing, from the rows of the page that carry ink."""
+    inked = np.concatenate(([0], (ink.mean(axis=1) >= LINE_INK_RATIO).astype(np.int8), [0]))
+    edges = np.diff(inked)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(starts):
+        return 0
+    # Merge runs split by a gap of fewer than LINE_GAP rows.
+    new_line = np.concatenate(([True], starts[1:] - ends[:-1] >= LINE_GAP))
+    line_starts = starts[new_line]
+    line_ends = ends[np.concatenate((new_line[1:], [True]))]
+    return int((line_ends - line_starts >= MIN_LINE_HEIGHT).sum())
+
+
+def page_complexity(img) -> dict:
+    """
+    Cheap statistics of a page image (a PIL image, an array or encoded bytes):
+    ink_ratio (fraction of the page that is ink), strokes (estimated pen
+    strokes) and lines (estimated lines of writing).
+    """
+    ink = ink_mask(np.asarray(_measured(img)))
+    return {
+        "ink_ratio": round(float(ink.mean()), 4),
+        "strokes": _stroke_count(ink),
+        "lines": _line_count(ink),
+    }
+
+
+def is_simple_page(complexity: dict) -> bool:
+    return (
+        complexity["ink_ratio"] <= ROUTE_MAX_INK_RATIO
+        and complexity["strokes"] <= ROUTE_MAX_STROKES
+        and complexity["lines"] <= ROUTE_MAX_LINES
+    )
+
+
+def route_page(img) -> dict:
+    """The page's complexity and its route: "fast" or "default"."""
+    complexity = page_complexity(img)
+    return {**complexity, "route": "fast" if is_simple_page(complexity) else "default"}
@@ -0,0 +1,168 @@
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+PAGE_FILTER_ENABLED = os.getenv("CONVERT_PAGE_FILTER_ENABLED", "0").lower() in {"1", "true", "yes"}
+# A page is blank when it has fewer ink pixels than this (measured at
+# COMPARE_WIDTH, specks removed). Two pages are duplicates when no more than
+# this much ink differs between them.
+BLANK_MIN_INK_PIXELS = int(os.getenv("CONVERT_BLANK_MIN_INK_PIXELS", "64"))
+# Pages whose ink hashes differ in more than this many of HASH_SIZE**2 bits
+# are never compared pixel by pixel.
+DUPLICATE_HASH_DISTANCE = int(os.getenv("CONVERT_DUPLICATE_HASH_DISTANCE", "24"))
+
+# Pixels this much darker than the paper count as ink; faint lines and
+# bleed-through from the other side of the sheet stay below it.
+INK_CONTRAST = 60
+HASH_SIZE = 16
+# Ink is measured on pages reduced to about this width, so the thresholds do
+# not depend on the render DPI.
+COMPARE_WIDTH = 1024
+# An ink pixel with fewer ink pixels than this in its 3x3 neighbourhood
+# (itself included) is a speck of noise or dust, not a stroke.
+SPECK_NEIGHBOURS = 3
+# Duplicates may be offset by up to this many pixels (at COMPARE_WIDTH) in
+# each direction, and each stroke may move by one more pixel.
+DUPLICATE_MAX_SHIFT = 2
+
+
+def to_grayscale(img) -> Image.Image:
+    """An "L" image from a PIL image of any mode or a numpy array."""
+    if not isinstance(img, Image.Image):
+        img = Image.fromarray(img)
+    return img if img.mode == "L" else img.convert("L")
+
+
+def paper_tone(pixels: np.ndarray) -> float:
+    """
+    Brightness of the paper: the 90th percentile, so scans on grey or
+    yellowed paper work too.
+    """
+    return float(np.percentile(pixels, 90))
+
+
+def ink_mask(pixels: np.ndarray) -> np.ndarray:
+    """True where grayscale pixels are at least INK_CONTRAST darker than the paper."""
+    return pixels < paper_tone(pixels) - INK_CONTRAST
+
+
+def _neighbours(mask: np.ndarray) -> np.ndarray:
+    """Number of True pixels in each pixel's 3x3 neighbourhood."""
+    padded = np.pad(mask, 1).astype(np.uint8)
+    height, width = mask.shape
+    return sum(padded[dy : dy + height, dx : dx + width] for dy in range(3) for dx in range(3))
+
+
+def _without_specks(mask: np.ndarray) -> np.ndarray:
+    return mask & (_neighbours(mask) >= SPECK_NEIGHBOURS)
+
+
+def _dilate(mask: np.ndarray) -> np.ndarray:
+    return _neighbours(mask) > 0
+
+
+def page_ink(img) -> np.ndarray:
+    """Ink pixels of a page reduced to about COMPARE_WIDTH, specks removed."""
+    gray = to_grayscale(img)
+    factor = gray.width // COMPARE_WIDTH
+    if factor > 1:
+        gray = gray.reduce(factor)
+    return _without_specks(ink_mask(np.asarray(gray)))
+
+
+def _ink_hash(ink: np.ndarray) -> int:
+    # Difference hash of ink density, so blank paper hashes to stable zero
+    # bits instead of bits decided by scanner noise.
+    height, width = ink.shape
+    rows = np.linspace(0, height, HASH_SIZE + 1).astype(int)
+    cols = np.linspace(0, width, HASH_SIZE + 2).astype(int)
+    density = np.add.reduceat(np.add.reduceat(ink.astype(np.int32), rows[:-1], axis=0), cols[:-1], axis=1)
+    bits = (density[:, 1:] > density[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _same_ink(a: np.ndarray, b: np.ndarray) -> bool:
+    """
+    Whether two page_ink masks differ by less than BLANK_MIN_INK_PIXELS, at
+    the offset (up to DUPLICATE_MAX_SHIFT) where they line up best.
+    """
+    if a.shape != b.shape:
+        return False
+    near_a = _dilate(a)
+    near_b = _dilate(b)
+    # Ink further than DUPLICATE_MAX_SHIFT + 1 pixels from any ink on the
+    # other page is unmatched at every offset: one pass rules most distinct
+    # pages out before trying the offsets.
+    far_a, far_b = near_a, near_b
+    for _ in range(DUPLICATE_MAX_SHIFT):
+        far_a, far_b = _dilate(far_a), _dilate(far_b)
+    if _without_specks((a & ~far_b) | (b & ~far_a)).sum() >= BLANK_MIN_INK_PIXELS:
+        return False
+    for dy in range(-DUPLICATE_MAX_SHIFT, DUPLICATE_MAX_SHIFT + 1):
+        for dx in range(-DUPLICATE_MAX_SHIFT, DUPLICATE_MAX_SHIFT + 1):
+            moved = np.roll(b, (dy, dx), axis=(0, 1))
+            unmatched = (a & ~np.roll(near_b, (dy, dx), axis=(0, 1))) | (moved & ~near_a)
+            if _without_specks(unmatched).sum() < BLANK_MIN_INK_PIXELS:
+                return True
+    return False
+
+
+def perceptual_hash(img) -> int:
+    """
+    Difference hash: HASH_SIZE**2 bits, one per horizontally adjacent pair of
+    cells in a (HASH_SIZE + 1) x HASH_SIZE box-filtered thumbnail, set when
+    brightness increases. Robust to rescans (noise, exposure, small shifts).
+    """
+    thumb = np.asarray(
+        to_grayscale(img).resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX),
+        dtype=np.int16,
+    )
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def find_skippable_pages(
+    images: Sequence,
+    page_numbers: Sequence[int],
+) -> List[Optional[dict]]:
+    """
+    For each page, None if it should be converted, or why it can be skipped:
+    {"reason": "blank", "ink_pixels": ...} or {"reason": "duplicate", "duplicate_of": page}.
+
+    Pages are only compared against earlier pages that are kept, so the first
+    copy of a duplicated page is the one converted. A duplicate needs an ink
+    hash within DUPLICATE_HASH_DISTANCE, and less than BLANK_MIN_INK_PIXELS
+    of ink that differs: a second copy of the same page (re-encoded, exposed
+    differently, shifted by a pixel or two), not the same layout with other
+    writing in it. Rotated rescans are kept and converted again.
+    """
+    skipped: List[Optional[dict]] = []
+    kept = []
+    for img, page in zip(images, page_numbers):
+        ink = page_ink(img)
+        ink_pixels = int(ink.sum())
+        if ink_pixels < BLANK_MIN_INK_PIXELS:
+            skipped.append({"reason": "blank", "ink_pixels": ink_pixels})
+            continue
+
+        page_hash = _ink_hash(ink)
+        original = None
+        for kept_page, kept_hash, kept_ink in kept:
+            if hash_distance(page_hash, kept_hash) > DUPLICATE_HASH_DISTANCE:
+                continue
+            if _same_ink(ink, kept_ink):
+                original = kept_page
+                break
+        if original is not None:
+            skipped.append({"reason": "duplicate", "duplicate_of": original})
+            continue
+
+        kept.append((page, page_hash, ink))
+        skipped.append(None)
+    return skipped
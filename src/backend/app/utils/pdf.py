@@ -1,32 +1,147 @@
-from pdf2image import convert_from_path
+import re
+
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image, ImageEnhance
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Light contrast boost for handwriting, applied to every rendered page.
+PDF_CONTRAST_FACTOR = 1.4
+
+_PAGE_SIZE_KEY = re.compile(r"^Page\s+(\d+) size$")
+_PAGE_SIZE_VALUE = re.compile(r"^([\d.]+) x ([\d.]+)")
+
+
+def parse_page_ranges(spec: str, limit: Optional[int] = None) -> List[int]:
+    """
+    Parse a 1-based page selection like "2-4,7" into sorted, unique page numbers.
+    Raises ValueError on bad syntax, or when more than `limit` pages are selected.
+    """
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        try:
+            start = int(first)
+            end = int(last) if sep else start
+        except ValueError:
+            raise ValueError(f"Invalid page range '{part}'")
+        if start < 1 or end < start:
+            raise ValueError(f"Invalid page range '{part}'")
+        # Check the range size first so "1-999999999" never gets materialized.
+        if limit is not None and end - start + 1 > limit:
+            raise ValueError(f"Select at most {limit} pages")
+        pages.update(range(start, end + 1))
+        if limit is not None and len(pages) > limit:
+            raise ValueError(f"Select at most {limit} pages")
+
+    if not pages:
+        raise ValueError("No pages selected")
+    return sorted(pages)
+
+
+def _page_sizes(pdf_path: str, last_page: int) -> Tuple[int, Dict[int, Tuple[float, float]]]:
+    """
+    Return (page count, {page: (width_pts, height_pts)}) for pages 1..last_page
+    from a single pdfinfo call. pdfinfo clamps last_page to the page count and
+    prints "Page    N size" per page ("Page size" on older poppler for one page).
+    """
+    info = pdfinfo_from_path(pdf_path, first_page=1, last_page=last_page)
+    sizes = {}
+    for key, value in info.items():
+        if key == "Page size":
+            page = 1
+        else:
+            match = _PAGE_SIZE_KEY.match(key)
+            if not match:
+                continue
+            page = int(match.group(1))
+        dims = _PAGE_SIZE_VALUE.match(str(value))
+        if dims:
+            sizes[page] = (float(dims.group(1)), float(dims.group(2)))
+    return info["Pages"], sizes
+
+
+def render_dpi(page_size: Optional[Tuple[float, float]], dpi: int, max_size: Optional[int]) -> int:
+    """
+    DPI at which a page's longest side comes out at `max_size` pixels, capped at `dpi`.
+    """
+    if max_size is None or page_size is None or max(page_size) <= 0:
+        return dpi
+    return max(1, min(dpi, int(max_size * 72 / max(page_size))))
+
+
+def _render_runs(pages: Sequence[int], dpis: Dict[int, int]) -> List[Tuple[int, int, int]]:
+    # Group consecutive pages rendered at the same DPI into one poppler call.
+    runs = []
+    for page in pages:
+        dpi = dpis[page]
+        if runs and page == runs[-1][1] + 1 and dpi == runs[-1][2]:
+            runs[-1] = (runs[-1][0], page, dpi)
+        else:
+            runs.append((page, page, dpi))
+    return runs
 
 
 def pdf_to_images(
     pdf_path: str,
     dpi: int = 300,
-    max_pages: int = 5
+    max_pages: int = 5,
+    pages: Optional[Sequence[int]] = None,
+    max_size: Optional[int] = None,
+    contrast: Optional[float] = PDF_CONTRAST_FACTOR,
 ) -> List[Image.Image]:
     """
     Convert a handwritten notes PDF into
     vision-optimized PIL images (one per page).
+
+    Only the pages that are kept are rasterized: the first `max_pages` pages,
+    or the first `max_pages` of `pages` (1-based) that exist in the document.
+    With `max_size`, each page is rendered at the DPI that makes its longest
+    side `max_size` pixels (from the page box, never above `dpi`), so it does
+    not need to be downscaled afterwards. `contrast=None` returns the pages
+    unboosted, for callers that fold the boost into their own preprocessing.
     """
 
-    # Convert PDF pages to images
-    images = convert_from_path(
-        pdf_path,
-        dpi=dpi,
-        fmt="png",
-        grayscale=True
-    )
+    if pages is None and max_size is None:
+        runs = [(1, max_pages, dpi)]
+    else:
+        wanted = sorted(set(pages)) if pages is not None else list(range(1, max_pages + 1))
+        wanted = [p for p in wanted if p >= 1]
+        if not wanted:
+            return []
+        page_count, sizes = _page_sizes(pdf_path, wanted[-1])
+        wanted = [p for p in wanted if p <= page_count][:max_pages]
+        runs = _render_runs(
+            wanted,
+            {p: render_dpi(sizes.get(p), dpi, max_size) for p in wanted},
+        )
+
+    # Convert PDF pages to images, one poppler call per run of pages. Raw
+    # PPM/PGM output skips poppler's PNG encode and PIL's PNG decode.
+    images = []
+    for first_page, last_page, run_dpi in runs:
+        images.extend(
+            convert_from_path(
+                pdf_path,
+                dpi=run_dpi,
+                fmt="ppm",
+                grayscale=True,
+                first_page=first_page,
+                last_page=last_page,
+            )
+        )
+
+    if contrast is None:
+        return images[:max_pages]
 
     ## process them by turning up the contrast a bit, which helps Gemini Vision read handwriting better.
     processed = []
     for img in images[:max_pages]:
         # Light contrast boost for handwriting
         enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.4)
+        img = enhancer.enhance(contrast)
         processed.append(img)
 
     return processed
@@ -0,0 +1,132 @@
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import List, Sequence, Union
+
+from PIL import Image
+
+# Page images and uploads cross into worker processes (executors.py,
+# CONVERT_CPU_BACKEND=process) through shared memory blocks; only these small
+# handles are pickled. The process that creates a block closes its handle,
+# and the event loop side calls release() once every worker is done with it
+# (or, for a request cancelled while the blocks were being created, as soon
+# as they arrive: executors.run_process_owned).
+
+
+@dataclass(frozen=True)
+class SharedPage:
+    """A page image's pixels in a shared memory block."""
+
+    name: str
+    mode: str
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class SharedBytes:
+    """An uploaded file's bytes in a shared memory block."""
+
+    name: str
+    size: int
+
+
+def _create(size: int) -> shared_memory.SharedMemory:
+    # Zero-size blocks are not allowed.
+    return shared_memory.SharedMemory(create=True, size=max(1, size))
+
+
+def share_image(img: Image.Image) -> SharedPage:
+    data = img.tobytes()
+    block = _create(len(data))
+    try:
+        block.buf[: len(data)] = data
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    return SharedPage(block.name, img.mode, img.width, img.height)
+
+
+def share_bytes(data: bytes) -> SharedBytes:
+    block = _create(len(data))
+    try:
+        block.buf[: len(data)] = data
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    return SharedBytes(block.name, len(data))
+
+
+def load_image(page: SharedPage) -> Image.Image:
+    """A PIL image with its own copy of the shared pixels."""
+    block = shared_memory.SharedMemory(name=page.name)
+    try:
+        return Image.frombytes(page.mode, (page.width, page.height), block.buf)
+    finally:
+        block.close()
+
+
+def load_bytes(shared: SharedBytes) -> bytes:
+    block = shared_memory.SharedMemory(name=shared.name)
+    try:
+        return bytes(block.buf[: shared.size])
+    finally:
+        block.close()
+
+
+def release(shared: Sequence[Union[SharedPage, SharedBytes]]) -> None:
+    """Free the blocks; safe to call twice."""
+    for item in shared:
+        try:
+            block = shared_memory.SharedMemory(name=item.name)
+        except FileNotFoundError:
+            continue
+        block.close()
+        block.unlink()
+
+
+# Run in a worker process: each takes the function to apply, so the worker
+# only imports the image modules it needs, and returns (result, ms) where ms
+# excludes the time spent queued for a free worker.
+
+
+def render_shared(render, *args, **kwargs) -> List[SharedPage]:
+    """render(*args, **kwargs) -> page images, shared instead of returned."""
+    shared: List[SharedPage] = []
+    try:
+        for img in render(*args, **kwargs):
+            shared.append(share_image(img))
+    except BaseException:
+        release(shared)
+        raise
+    return shared
+
+
+def call_on_image(func, page: SharedPage, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(load_image(page), *args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def call_on_images(func, pages: Sequence[SharedPage], *args, **kwargs):
+    started = time.perf_counter()
+    result = func([load_image(page) for page in pages], *args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def call_on_bytes(func, shared: SharedBytes, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(load_bytes(shared), *args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def warm_up() -> None:
+    # Run once per worker at startup, so the first upload does not pay for
+    # process start and these imports.
+    import app.utils.image  # noqa: F401
+    import app.utils.page_filter  # noqa: F401
+    import app.utils.pdf  # noqa: F401
@@ -0,0 +1,86 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Sequence, Union
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+MAX_FILE_SIZE_BYTES = 10 * 1024 * 1024
+# Uploads are read and spooled this many bytes at a time.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Multipart boundaries, part headers and small form fields around the file.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+PDF_MAGIC = b"%PDF"
+
+
+def too_large_detail(max_bytes: int = MAX_FILE_SIZE_BYTES) -> str:
+    return f"File too large (max {max_bytes // (1024 * 1024)}MB)"
+
+
+@dataclass
+class Upload:
+    """
+    A validated upload: images are held in memory, PDFs are spooled to a
+    temporary file that close() removes.
+    """
+
+    category: str
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """What prepare_pages takes: the image bytes or the PDF's path."""
+        return self.path if self.path is not None else self.data
+
+    def close(self) -> None:
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies over `max_body_bytes` on the upload routes before
+    they are parsed: at once when Content-Length says so, otherwise as soon
+    as the body read so far crosses the limit (chunked uploads).
+    """
+
+    def __init__(self, app, max_body_bytes: int, paths: Sequence[str] = ("/api/convert",)):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.paths = tuple(paths)
+        self.detail = too_large_detail(max_body_bytes - MULTIPART_OVERHEAD_BYTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit():
+            if int(content_length) > self.max_body_bytes:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"success": False, "error": self.detail},
+                )
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so
+                    # this becomes a 413 through the app's exception handler.
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,57 @@
+import functools
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SRC_BACKEND = ROOT / "src" / "backend"
+for path in (SRC_BACKEND, ROOT / "tests"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from app.services.cache import ConversionCache  # noqa: E402
+from support.pages import pdf_upload, render_fake_pages  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_conversion_cache(monkeypatch, tmp_path):
+    # Every test starts cold so cached pages from one test never leak into another.
+    cache = ConversionCache(memory_entries=64, disk_dir=tmp_path / "convert-cache")
+    monkeypatch.setattr("app.services.convert_pipeline.conversion_cache", cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def model_routing_disabled(monkeypatch):
+    # Fake pages are simple drawings and would all be routed to the fast
+    # model; tests of the routing stage turn it back on.
+    monkeypatch.setattr("app.services.convert_pipeline.MODEL_ROUTING_ENABLED", False)
+
+
+@pytest.fixture()
+def fake_pdf(monkeypatch):
+    """
+    Make PDF rendering return fake pages instead of calling poppler:
+    fake_pdf(count, size=..., lines=..., extra_lines=...) (support/pages.py).
+    """
+
+    def use(count: int = 2, **options):
+        render = functools.partial(render_fake_pages, count=count, **options)
+        monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", render)
+        return render
+
+    return use
+
+
+@pytest.fixture()
+def post_pdf():
+    """post_pdf(client=None, path="/api/convert", **query params) with a fake PDF upload."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    def post(client=None, path: str = "/api/convert", **params):
+        return (client or TestClient(app)).post(path, params=params, files=pdf_upload())
+
+    return post
@@ -0,0 +1,48 @@
+import asyncio
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.services import convert_pipeline, gemini  # noqa: E402
+
+
+def _fake_pdf_pages(*_args, **_kwargs):
+    # Five busy pages so each JPEG is large enough for copies to stand out.
+    rng = random.Random(0)
+    pages = []
+    for _ in range(5):
+        img = Image.new("L", (1200, 1600), color=255)
+        draw = ImageDraw.Draw(img)
+        for _ in range(600):
+            x, y = rng.randrange(1200), rng.randrange(1600)
+            draw.line((x, y, x + rng.randrange(-60, 60), y + rng.randrange(-20, 20)), fill=0, width=3)
+        pages.append(img)
+    return pages
+
+
+def test_page_bytes_reach_gemini_without_copies(monkeypatch):
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", _fake_pdf_pages)
+    prepared = asyncio.run(convert_pipeline.prepare_pages(b"%PDF-1.4 fake", "pdf"))
+    jpeg_total = sum(len(page.image) for page in prepared)
+
+    assert len(prepared) == 5
+    assert all(isinstance(page.image, bytes) for page in prepared)
+
+    gemini._image_part(b"warm-up")
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        parts = [gemini._image_part(page.image) for page in prepared]
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # A base64 str per page plus its decoded copy would be > 2x jpeg_total.
+    assert peak - baseline < jpeg_total * 0.1
+    assert all(part.inline_data.data is page.image for part, page in zip(parts, prepared))
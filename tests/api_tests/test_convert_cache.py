@@ -0,0 +1,141 @@
+import io
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.services.cache import ConversionCache, conversion_cache_key  # noqa: E402
+
+RAW = "\\documentclass{article}\n\\begin{document}\ncached page\n\\end{document}"
+
+
+def _png_upload():
+    img = Image.new("RGB", (320, 240), color="white")
+    ImageDraw.Draw(img).line((20, 40, 300, 60), fill="black", width=4)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _CountingGemini:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, *_args, **_kwargs):
+        self.calls += 1
+        return RAW
+
+
+def _post_image(client, data, context="general"):
+    return client.post(
+        f"/api/convert?context={context}",
+        files={"file": ("page.png", io.BytesIO(data), "image/png")},
+    )
+
+
+def test_reupload_is_served_from_cache(monkeypatch):
+    fake = _CountingGemini()
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake)
+    client = TestClient(app)
+    data = _png_upload()
+
+    first = _post_image(client, data)
+    second = _post_image(client, data)
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert [(p["page"], p["cache"]) for p in first.json()["pages"]] == [(1, "miss")]
+    assert [(p["page"], p["cache"]) for p in second.json()["pages"]] == [(1, "hit")]
+    assert second.json()["latex"] == first.json()["latex"]
+    assert fake.calls == 1
+
+
+def test_context_is_part_of_the_cache_key(monkeypatch):
+    fake = _CountingGemini()
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake)
+    client = TestClient(app)
+    data = _png_upload()
+
+    _post_image(client, data, context="math")
+    resp = _post_image(client, data, context="physics")
+
+    assert [(p["page"], p["cache"]) for p in resp.json()["pages"]] == [(1, "miss")]
+    assert fake.calls == 2
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    cache = ConversionCache(memory_entries=1, disk_dir=tmp_path)
+    cache.set("a", "first")
+    cache.set("b", "second")
+
+    assert "a" not in cache._memory
+    assert cache.get("a") == "first"
+
+    reopened = ConversionCache(memory_entries=1, disk_dir=tmp_path)
+    assert reopened.get("b") == "second"
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ConversionCache(memory_entries=0, disk_dir=tmp_path, disk_max_bytes=25)
+    cache.set("old", "x" * 10)
+    cache.set("mid", "y" * 10)
+    os.utime(tmp_path / "old.tex", (1, 1))
+    os.utime(tmp_path / "mid.tex", (2, 2))
+
+    cache.set("new", "z" * 10)
+
+    assert cache.get("old") is None
+    assert cache.get("mid") == "y" * 10
+    assert cache.get("new") == "z" * 10
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.tex")) <= 25
+
+
+
+def test_disk_tier_write_failure_is_not_an_error(tmp_path):
+    cache = ConversionCache(memory_entries=1, disk_dir=tmp_path / "cache")
+    (tmp_path / "cache").rmdir()
+
+    cache.set("a", "first")
+
+    assert cache.get("a") == "first"
+    assert cache._disk_bytes == 0
+
+def test_cache_key_covers_model_and_prompt_version():
+    base = conversion_cache_key(b"page", "general", "gemini-2.5-flash", "1")
+
+    assert base == conversion_cache_key(b"page", "general", "gemini-2.5-flash", "1")
+    assert base != conversion_cache_key(b"page", "general", "gemini-2.5-pro", "1")
+    assert base != conversion_cache_key(b"page", "general", "gemini-2.5-flash", "2")
+    assert base != conversion_cache_key(b"other", "general", "gemini-2.5-flash", "1")
+
+
+def test_cache_hit_does_not_wait_for_gemini_calls(monkeypatch):
+    from app.utils.executors import io_executor
+
+    fake = _CountingGemini()
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake)
+    client = TestClient(app)
+    data = _png_upload()
+    _post_image(client, data)
+
+    # Every I/O thread is busy, as with GEMINI_MAX_CONCURRENCY calls in flight.
+    release = threading.Event()
+    busy = [io_executor.submit(release.wait, 10) for _ in range(io_executor._max_workers)]
+    try:
+        started = time.perf_counter()
+        resp = _post_image(client, data)
+        elapsed = time.perf_counter() - started
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
+
+    assert [(p["page"], p["cache"]) for p in resp.json()["pages"]] == [(1, "hit")]
+    assert elapsed < 2
@@ -0,0 +1,191 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from app.services.single_flight import SingleFlight  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+LATEX = "\\documentclass{article}\n\\begin{document}\nShared\n\\end{document}"
+
+
+def _page(width=200):
+    img = Image.new("L", (width, 200), color=255)
+    ImageDraw.Draw(img).line((10, 30, 150, 60), fill=0, width=4)
+    return img
+
+
+class _SlowGemini:
+    """Counts calls and holds each one until `followers` pages have attached to it."""
+
+    def __init__(self, followers, error=None):
+        self.followers = followers
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, image_bytes, context="general"):
+        with self.lock:
+            self.calls += 1
+        deadline = time.monotonic() + 5
+        while metrics.counter("convert_coalesced_pages") < self.followers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return LATEX
+
+
+def _post_concurrently(count, files, **client_options):
+    responses = [None] * count
+
+    def post(index):
+        responses[index] = TestClient(app, **client_options).post("/api/convert", files=files())
+
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def test_identical_concurrent_uploads_share_one_gemini_call_per_page(monkeypatch):
+    metrics.reset()
+    gemini = _SlowGemini(followers=4)
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_page(200), _page(201)])
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", gemini)
+
+    responses = _post_concurrently(3, pdf_upload)
+
+    assert [resp.status_code for resp in responses] == [200] * 3
+    assert gemini.calls == 2
+    assert metrics.counter("convert_coalesced_pages") == 4
+    caches = sorted(page["cache"] for resp in responses for page in resp.json()["pages"])
+    assert caches == ["coalesced"] * 4 + ["miss"] * 2
+    assert len({resp.json()["latex"] for resp in responses}) == 1
+    assert len(convert_pipeline.inflight_pages) == 0
+
+
+def test_duplicate_pages_within_one_upload_are_converted_once(monkeypatch):
+    metrics.reset()
+    gemini = _SlowGemini(followers=2)
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_page()] * 3)
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", gemini)
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    assert gemini.calls == 1
+    assert [page["cache"] for page in resp.json()["pages"]].count("coalesced") == 2
+
+
+def test_leader_failure_is_shared_with_followers(monkeypatch):
+    metrics.reset()
+    gemini = _SlowGemini(followers=1, error=RuntimeError("Gemini exploded"))
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_page()])
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", gemini)
+
+    responses = _post_concurrently(2, pdf_upload)
+
+    assert gemini.calls == 1
+    assert [resp.status_code for resp in responses] == [responses[0].status_code] * 2
+    assert responses[0].status_code != 200
+    assert len(convert_pipeline.inflight_pages) == 0
+
+
+def test_followers_of_a_timed_out_leader_convert_the_page_themselves(monkeypatch):
+    # The leader may have had a shorter deadline than its followers.
+    metrics.reset()
+    gemini = _SlowGemini(followers=1, error=TimeoutError("leader deadline"))
+
+    def _gemini(*args, **kwargs):
+        if gemini.calls == 0:
+            return gemini(*args, **kwargs)
+        gemini.calls += 1
+        return LATEX
+
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_page()])
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", _gemini)
+
+    responses = _post_concurrently(2, pdf_upload)
+
+    assert gemini.calls == 2
+    assert sorted(resp.status_code for resp in responses) == [200, 504]
+    assert len(convert_pipeline.inflight_pages) == 0
+
+
+def test_followers_of_a_cancelled_leader_get_none():
+    flights = SingleFlight()
+    future, leader = flights.claim("page")
+    same, follower = flights.claim("page")
+
+    flights.resolve("page", future, None)
+
+    assert leader and not follower and same is future
+    assert future.result() is None
+    # The key is free again, so the next caller leads a fresh computation.
+    assert flights.claim("page")[1]
+
+
+def test_leader_cache_write_failure_still_releases_its_followers(monkeypatch, isolated_conversion_cache):
+    metrics.reset()
+    gemini = _SlowGemini(followers=1)
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_page()])
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", gemini)
+
+    def _disk_full(*_args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(isolated_conversion_cache, "set", _disk_full)
+
+    responses = _post_concurrently(2, pdf_upload, raise_server_exceptions=False)
+
+    assert gemini.calls == 1
+    # The leader fails writing the cache; its follower already has the page.
+    assert sorted(resp.status_code for resp in responses) == [200, 500]
+    assert len(convert_pipeline.inflight_pages) == 0
+
+
+def test_cancelled_leader_releases_its_pages(monkeypatch, fake_pdf):
+    started, release = threading.Event(), threading.Event()
+
+    def _gemini(*_args, **_kwargs):
+        started.set()
+        release.wait(5)
+        return LATEX
+
+    fake_pdf(2)
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", _gemini)
+
+    async def scenario():
+        pages = await convert_pipeline.prepare_pages(b"%PDF-1.4 fake", "pdf")
+        task = asyncio.create_task(convert_pipeline.convert_pages(pages, "general"))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+
+    assert len(convert_pipeline.inflight_pages) == 0
+
+
+def test_follower_stops_waiting_after_its_timeout():
+    flights = SingleFlight()
+    future, _leader = flights.claim("page")
+
+    assert asyncio.run(flights.wait(future, timeout=0.01)) is None
+    # Only the follower gave up; the leader's computation is untouched.
+    assert not future.done()
@@ -0,0 +1,83 @@
+import io
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+
+GEMINI_DELAY_S = 0.2
+
+
+class _FakeGemini:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, image_bytes, context="general"):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Fake page i is 200 + i pixels wide.
+            width = Image.open(io.BytesIO(image_bytes)).size[0]
+            # Finish later pages first to prove results are reassembled in order.
+            time.sleep(GEMINI_DELAY_S - 0.02 * (width - 200))
+            page = width - 200 + 1
+            return (
+                "\\documentclass{article}\n\\begin{document}\n"
+                f"Page {page}\n\\end{{document}}"
+            )
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_convert_pdf_pages_run_concurrently_in_page_order(monkeypatch, fake_pdf, post_pdf):
+    fake = _FakeGemini()
+    fake_pdf(5, lines=8)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake)
+
+    client = TestClient(app)
+    started = time.perf_counter()
+    resp = post_pdf(client)
+    elapsed = time.perf_counter() - started
+
+    assert resp.status_code == 200
+    latex = resp.json()["latex"]
+    positions = [latex.index(f"Page {n}") for n in range(1, 6)]
+    assert positions == sorted(positions)
+    assert fake.max_in_flight > 1
+    assert elapsed < 5 * GEMINI_DELAY_S
+
+
+def test_convert_respects_per_request_concurrency_cap(monkeypatch, fake_pdf, post_pdf):
+    fake = _FakeGemini()
+    fake_pdf(5, lines=8)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake)
+    monkeypatch.setattr("app.services.convert_pipeline.CONVERT_PAGE_CONCURRENCY", 2)
+
+    resp = post_pdf()
+
+    assert resp.status_code == 200
+    assert fake.max_in_flight == 2
+
+
+def test_convert_page_rate_limit_maps_to_429(monkeypatch, fake_pdf, post_pdf):
+    def _rate_limited(*_args, **_kwargs):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    fake_pdf(3, lines=8)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _rate_limited)
+
+    resp = post_pdf()
+
+    assert resp.status_code == 429
+    assert resp.json() == {"success": False, "error": "Gemini rate limit"}
@@ -0,0 +1,77 @@
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+
+BLOCKING_STAGE_S = 0.3
+MAX_LOOP_LAG_S = 0.1
+
+
+def _slow_pdf_to_images(*_args, **_kwargs):
+    # Stand-in for poppler: blocks the calling thread like the real rasterizer.
+    time.sleep(BLOCKING_STAGE_S)
+    pages = []
+    for i in range(3):
+        img = Image.new("L", (300, 300), color=255)
+        ImageDraw.Draw(img).line((10, 20 + i * 30, 280, 40 + i * 30), fill=0, width=4)
+        pages.append(img)
+    return pages
+
+
+def _slow_convert_image_to_latex(*_args, **_kwargs):
+    # Stand-in for the synchronous Gemini SDK call.
+    time.sleep(BLOCKING_STAGE_S)
+    return "\\documentclass{article}\n\\begin{document}\nok\n\\end{document}"
+
+
+async def _measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - before - interval)
+    return worst
+
+
+async def _convert_while_probing():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(_measure_loop_lag(stop))
+
+        convert_task = asyncio.create_task(
+            client.post(
+                "/api/convert",
+                files={"file": ("notes.pdf", io.BytesIO(b"%PDF-1.4 fake"), "application/pdf")},
+            )
+        )
+        await asyncio.sleep(0.05)
+
+        health_started = time.perf_counter()
+        health = await client.get("/api/health")
+        health_latency = time.perf_counter() - health_started
+
+        convert_resp = await convert_task
+        stop.set()
+        return convert_resp, health, health_latency, await lag_task
+
+
+def test_convert_does_not_block_event_loop(monkeypatch):
+    monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", _slow_pdf_to_images)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _slow_convert_image_to_latex)
+
+    convert_resp, health, health_latency, worst_lag = asyncio.run(_convert_while_probing())
+
+    assert convert_resp.status_code == 200
+    assert health.status_code == 200
+    assert health_latency < BLOCKING_STAGE_S
+    assert worst_lag < MAX_LOOP_LAG_S
@@ -0,0 +1,262 @@
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.db import crud, models  # noqa: E402
+from app.db.base import Base  # noqa: E402
+from app.db.deps import get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.conversion_jobs import ConversionJobQueue  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+RAW = "\\documentclass{article}\n\\begin{document}\nJob page\n\\end{document}"
+
+
+@pytest.fixture()
+def session_factory(tmp_path):
+    # A file database, so the job workers and request handlers (running in
+    # different threads) each get their own connection.
+    engine = create_engine(
+        f"sqlite+pysqlite:///{tmp_path / 'jobs.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(engine)
+    try:
+        yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+@pytest.fixture()
+def job_queue(monkeypatch, session_factory):
+    queue = ConversionJobQueue(session_factory=session_factory, workers=2)
+    monkeypatch.setattr("app.routes.convert.conversion_jobs", queue)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield queue
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def _with_client(queue, scenario):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        try:
+            return await scenario(client)
+        finally:
+            await queue.stop()
+
+
+def _submit(client):
+    return client.post(
+        "/api/convert/jobs?context=math",
+        files=pdf_upload(),
+    )
+
+
+def test_submit_returns_job_id_and_completes(monkeypatch, job_queue, fake_pdf):
+    def _slow_gemini(*_args, **_kwargs):
+        time.sleep(0.2)
+        return RAW
+
+    fake_pdf(2)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _slow_gemini)
+
+    async def scenario(client):
+        submitted = await _submit(client)
+        job_id = submitted.json()["job_id"]
+        early = await client.get(f"/api/convert/jobs/{job_id}")
+        await job_queue.join()
+        final = await client.get(f"/api/convert/jobs/{job_id}")
+        return submitted, early, final
+
+    submitted, early, final = asyncio.run(_with_client(job_queue, scenario))
+
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+    assert early.json()["status"] in {"queued", "running"}
+    assert early.json()["result"] is None
+
+    payload = final.json()
+    assert payload["status"] == "done"
+    assert payload["pages_total"] == 2
+    assert payload["pages_done"] == 2
+    assert payload["result"]["latex"].count("Job page") == 2
+    assert [p["page"] for p in payload["result"]["pages"]] == [1, 2]
+    assert payload["result"]["skipped_pages"] == []
+    assert payload["error"] is None
+
+
+def test_failed_job_reports_error(monkeypatch, job_queue, fake_pdf):
+    def _rate_limited(*_args, **_kwargs):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    fake_pdf(2)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _rate_limited)
+
+    async def scenario(client):
+        job_id = (await _submit(client)).json()["job_id"]
+        await job_queue.join()
+        return await client.get(f"/api/convert/jobs/{job_id}")
+
+    payload = asyncio.run(_with_client(job_queue, scenario)).json()
+
+    assert payload["status"] == "failed"
+    assert payload["error"] == {"status": 429, "message": "Gemini rate limit"}
+
+
+def test_unknown_job_returns_404(job_queue):
+    async def scenario(client):
+        return await client.get("/api/convert/jobs/does-not-exist")
+
+    resp = asyncio.run(_with_client(job_queue, scenario))
+
+    assert resp.status_code == 404
+
+
+def _running_job(session_factory, updated_ago_s: float) -> str:
+    db = session_factory()
+    job = crud.create_conversion_job(db, b"%PDF-1.4 fake", "pdf", "general", "notes.pdf")
+    crud.update_conversion_job(db, job, status="running", pages_done=1)
+    db.query(models.ConversionJob).filter(models.ConversionJob.id == job.id).update(
+        {"updated_at": datetime.utcnow() - timedelta(seconds=updated_ago_s)}
+    )
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def test_jobs_left_running_resume_after_restart(monkeypatch, session_factory, fake_pdf):
+    fake_pdf(2)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", lambda *_a, **_k: RAW)
+
+    # A worker that died half-way through, longer ago than the lease.
+    job_id = _running_job(session_factory, updated_ago_s=600)
+
+    async def restart():
+        queue = ConversionJobQueue(session_factory=session_factory, workers=1)
+        await queue.start()
+        await queue.join()
+        await queue.stop()
+
+    asyncio.run(restart())
+
+    db = session_factory()
+    resumed = db.get(models.ConversionJob, job_id)
+    assert resumed.status == "done"
+    assert resumed.pages_done == 2
+    assert resumed.input_data is None
+    db.close()
+
+
+def test_jobs_running_elsewhere_are_left_alone(monkeypatch, session_factory, fake_pdf):
+    fake_pdf(2)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", lambda *_a, **_k: RAW)
+    # Another server process is converting this one and its lease is fresh.
+    job_id = _running_job(session_factory, updated_ago_s=5)
+
+    async def start_second_process():
+        queue = ConversionJobQueue(session_factory=session_factory, workers=1, lease_s=120)
+        await queue.start()
+        await queue.join()
+        await queue.stop()
+
+    asyncio.run(start_second_process())
+
+    db = session_factory()
+    job = db.get(models.ConversionJob, job_id)
+    assert (job.status, job.pages_done) == ("running", 1)
+    assert job.input_data is not None
+    db.close()
+
+
+def test_running_jobs_refresh_their_lease(monkeypatch, session_factory, fake_pdf):
+    def _slow_gemini(*_args, **_kwargs):
+        time.sleep(0.4)
+        return RAW
+
+    fake_pdf(2)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _slow_gemini)
+    monkeypatch.setattr("app.services.convert_pipeline.CONVERT_PAGE_CONCURRENCY", 1)
+    db = session_factory()
+    job_id = crud.create_conversion_job(db, b"%PDF-1.4 fake", "pdf", "general", "notes.pdf").id
+    db.close()
+
+    async def run_with_a_second_worker():
+        # The second queue sweeps for stale jobs every 0.2 s; the first
+        # refreshes its lease every 0.1 s, so the job is never taken over.
+        first = ConversionJobQueue(session_factory=session_factory, workers=1, lease_s=0.4)
+        second = ConversionJobQueue(session_factory=session_factory, workers=1, lease_s=0.2)
+        await first.start()
+        await second.start()
+        await first.join()
+        await asyncio.sleep(0.3)
+        await second.join()
+        await first.stop()
+        await second.stop()
+
+    claims = []
+    claim = crud.claim_conversion_job
+
+    def counting_claim(db, job_id):
+        claimed = claim(db, job_id)
+        claims.append(claimed)
+        return claimed
+
+    monkeypatch.setattr(crud, "claim_conversion_job", counting_claim)
+    asyncio.run(run_with_a_second_worker())
+
+    db = session_factory()
+    assert db.get(models.ConversionJob, job_id).status == "done"
+    assert claims.count(True) == 1
+    db.close()
+
+
+def test_a_job_is_claimed_once(session_factory):
+    db = session_factory()
+    job_id = crud.create_conversion_job(db, b"%PDF-1.4 fake", "pdf", "general", "notes.pdf").id
+    db.close()
+    first = ConversionJobQueue(session_factory=session_factory)
+    second = ConversionJobQueue(session_factory=session_factory)
+
+    assert first._claim(job_id) is not None
+    assert second._claim(job_id) is None
+
+
+def test_crashed_job_drops_its_upload(monkeypatch, job_queue):
+    def _broken_render(*_args, **_kwargs):
+        raise RuntimeError("renderer crashed")
+
+    monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", _broken_render)
+
+    async def scenario(client):
+        job_id = (await _submit(client)).json()["job_id"]
+        await job_queue.join()
+        return job_id, await client.get(f"/api/convert/jobs/{job_id}")
+
+    job_id, resp = asyncio.run(_with_client(job_queue, scenario))
+
+    assert resp.json()["error"] == {"status": 500, "message": "Internal server error"}
+    db = job_queue.session_factory()
+    assert db.get(models.ConversionJob, job_id).input_data is None
+    db.close()
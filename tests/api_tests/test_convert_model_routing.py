@@ -0,0 +1,141 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline, gemini, rate_limit  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from app.services.rate_limit import RateGovernor  # noqa: E402
+from app.utils import page_complexity  # noqa: E402
+from support.fake_gemini import run_fake_gemini  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+FAST_MODEL = "fast-model"
+DEFAULT_MODEL = "default-model"
+
+
+def _simple_page():
+    # Three short lines of writing.
+    img = Image.new("L", (1448, 2048), color=255)
+    draw = ImageDraw.Draw(img)
+    for line in range(3):
+        draw.text((120, 200 + line * 120), "A short line of notes", fill=0, font_size=48)
+    return img
+
+
+def _dense_page():
+    # A full page: thirty lines of small marks.
+    img = Image.new("L", (1448, 2048), color=255)
+    draw = ImageDraw.Draw(img)
+    for line in range(30):
+        y = 80 + line * 62
+        for x in range(80, 1360, 34):
+            draw.line((x, y, x + 14, y + 30), fill=0, width=4)
+            draw.line((x + 14, y, x + 22, y + 30), fill=0, width=4)
+    return img
+
+
+@pytest.fixture()
+def routed_gemini(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(convert_pipeline, "MODEL_ROUTING_ENABLED", True)
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_simple_page(), _dense_page()])
+    monkeypatch.setitem(rate_limit._GOVERNORS, "test-key", RateGovernor(max_retries=0))
+    monkeypatch.setenv("GEMINI_MODEL", DEFAULT_MODEL)
+    monkeypatch.setenv("GEMINI_FAST_MODEL", FAST_MODEL)
+    with run_fake_gemini() as server:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+        gemini.close_client()
+        try:
+            yield server
+        finally:
+            gemini.close_client()
+
+
+def test_complexity_separates_simple_and_dense_pages():
+    simple = page_complexity.page_complexity(_simple_page())
+    dense = page_complexity.page_complexity(_dense_page())
+
+    assert simple["lines"] == 3
+    assert dense["lines"] == 30
+    assert simple["strokes"] < dense["strokes"]
+    assert simple["ink_ratio"] < dense["ink_ratio"]
+    assert page_complexity.is_simple_page(simple)
+    assert not page_complexity.is_simple_page(dense)
+
+
+def test_blank_page_has_no_complexity():
+    blank = Image.new("L", (800, 1000), color=255)
+
+    assert page_complexity.page_complexity(blank) == {"ink_ratio": 0.0, "strokes": 0, "lines": 0}
+
+
+def test_encoded_pages_are_measured_like_images():
+    buf = io.BytesIO()
+    _simple_page().save(buf, format="JPEG", quality=90)
+
+    assert page_complexity.page_complexity(buf.getvalue())["lines"] == 3
+
+
+def test_simple_pages_go_to_the_fast_model(routed_gemini):
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    pages = resp.json()["pages"]
+    assert [page["model"] for page in pages] == [FAST_MODEL, DEFAULT_MODEL]
+    assert [page["complexity"]["route"] for page in pages] == ["fast", "default"]
+    assert sorted(request["model"] for request in routed_gemini.requests) == [DEFAULT_MODEL, FAST_MODEL]
+    assert "route" in resp.json()["timings_ms"]
+
+
+def test_routing_is_logged_and_measured_per_model(routed_gemini, caplog):
+    caplog.set_level("INFO")
+
+    TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert "Page 1 routed to the fast model" in caplog.text
+    assert "Page 2 routed to the default model" in caplog.text
+    assert f"model={FAST_MODEL}" in caplog.text
+    assert metrics.counter("convert_routed_pages", route="fast") == 1
+    assert metrics.counter("convert_routed_pages", route="default") == 1
+    timings = metrics.snapshot()["timings"]
+    assert timings[f"gemini_model_request_ms{{model={FAST_MODEL}}}"]["count"] == 1
+    assert timings[f"gemini_model_request_ms{{model={DEFAULT_MODEL}}}"]["count"] == 1
+
+
+def test_thresholds_are_configurable(monkeypatch, routed_gemini):
+    monkeypatch.setattr(page_complexity, "ROUTE_MAX_LINES", 2)
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert [page["model"] for page in resp.json()["pages"]] == [DEFAULT_MODEL, DEFAULT_MODEL]
+
+
+def test_batches_never_mix_models(monkeypatch, routed_gemini):
+    monkeypatch.setattr(convert_pipeline, "GEMINI_PAGE_BATCH_SIZE", 2)
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    # Two pages, two routes: one single-page request per model.
+    assert len(routed_gemini.requests) == 2
+    assert {request["model"] for request in routed_gemini.requests} == {DEFAULT_MODEL, FAST_MODEL}
+
+
+def test_routing_off_sends_every_page_to_the_default_model(monkeypatch, routed_gemini):
+    monkeypatch.setattr(convert_pipeline, "MODEL_ROUTING_ENABLED", False)
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert all(page["model"] == DEFAULT_MODEL for page in resp.json()["pages"])
+    assert all("complexity" not in page for page in resp.json()["pages"])
+    assert {request["model"] for request in routed_gemini.requests} == {DEFAULT_MODEL}
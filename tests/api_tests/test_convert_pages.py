@@ -0,0 +1,149 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.utils import pdf as pdf_utils  # noqa: E402
+from app.utils.pdf import parse_page_ranges  # noqa: E402
+
+
+def _page_image(width=200):
+    img = Image.new("L", (width, 200), color=255)
+    ImageDraw.Draw(img).line((10, 30, 180, 60), fill=0, width=4)
+    return img
+
+
+@pytest.mark.parametrize(
+    "spec, expected",
+    [
+        ("3", [3]),
+        ("2-4,7", [2, 3, 4, 7]),
+        (" 7, 2-3 ,3 ", [2, 3, 7]),
+        ("5-5", [5]),
+    ],
+)
+def test_parse_page_ranges(spec, expected):
+    assert parse_page_ranges(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["", "0", "4-2", "a-b", "1-", "-3", ","])
+def test_parse_page_ranges_rejects_bad_input(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec)
+
+
+def test_parse_page_ranges_enforces_limit_without_expanding_huge_ranges():
+    assert parse_page_ranges("1-5", limit=5) == [1, 2, 3, 4, 5]
+    with pytest.raises(ValueError):
+        parse_page_ranges("1-999999999", limit=5)
+    with pytest.raises(ValueError):
+        parse_page_ranges("1-3,8-10", limit=5)
+
+
+def test_pdf_to_images_only_rasterizes_selected_pages(monkeypatch):
+    calls = []
+
+    def fake_convert_from_path(_path, first_page, last_page, **_kwargs):
+        calls.append((first_page, last_page))
+        return [_page_image() for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(pdf_utils, "pdfinfo_from_path", lambda _path, **_kwargs: {"Pages": 60})
+    monkeypatch.setattr(pdf_utils, "convert_from_path", fake_convert_from_path)
+
+    images = pdf_utils.pdf_to_images("notes.pdf", pages=[2, 3, 4, 7, 61])
+
+    assert calls == [(2, 4), (7, 7)]
+    assert len(images) == 4
+
+
+def test_pdf_to_images_default_renders_only_max_pages(monkeypatch):
+    calls = []
+
+    def fake_convert_from_path(_path, first_page, last_page, **_kwargs):
+        calls.append((first_page, last_page))
+        return [_page_image() for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(pdf_utils, "convert_from_path", fake_convert_from_path)
+
+    images = pdf_utils.pdf_to_images("notes.pdf", max_pages=5)
+
+    assert calls == [(1, 5)]
+    assert len(images) == 5
+
+
+def test_convert_pages_query_selects_and_numbers_pages(monkeypatch):
+    received = {}
+
+    def fake_pdf_to_images(_path, max_pages, pages=None, **_kwargs):
+        received["pages"] = pages
+        return [_page_image(200 + i) for i in range(len(pages))]
+
+    monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", fake_pdf_to_images)
+    monkeypatch.setattr(
+        "app.services.convert_pipeline.convert_image_to_latex",
+        lambda *_a, **_k: "\\begin{document}\nbody\n\\end{document}",
+    )
+
+    resp = TestClient(app).post(
+        "/api/convert?pages=7,2-3",
+        files={"file": ("notes.pdf", io.BytesIO(b"%PDF-1.4 fake"), "application/pdf")},
+    )
+
+    assert resp.status_code == 200
+    assert received["pages"] == [2, 3, 7]
+    assert [p["page"] for p in resp.json()["pages"]] == [2, 3, 7]
+
+
+@pytest.mark.parametrize("pages", ["x", "3-1", "1-6"])
+def test_convert_rejects_invalid_page_selection(pages):
+    resp = TestClient(app).post(
+        f"/api/convert?pages={pages}",
+        files={"file": ("notes.pdf", io.BytesIO(b"%PDF-1.4 fake"), "application/pdf")},
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()["error"].startswith("Invalid pages:")
+
+
+def _pdfinfo_with_sizes(sizes):
+    def fake_pdfinfo(_path, first_page=None, last_page=None, **_kwargs):
+        info = {"Pages": len(sizes)}
+        for page in range(first_page, min(last_page, len(sizes)) + 1):
+            width, height = sizes[page - 1]
+            info[f"Page {page:4d} size"] = f"{width} x {height} pts"
+        return info
+
+    return fake_pdfinfo
+
+
+def test_pdf_to_images_renders_at_dpi_that_fits_max_size(monkeypatch):
+    calls = []
+
+    def fake_convert_from_path(_path, dpi, first_page, last_page, **_kwargs):
+        calls.append((first_page, last_page, dpi))
+        return [_page_image() for _ in range(first_page, last_page + 1)]
+
+    a4 = (595.276, 841.89)
+    letter_landscape = (792, 612)
+    monkeypatch.setattr(pdf_utils, "pdfinfo_from_path", _pdfinfo_with_sizes([a4, a4, letter_landscape]))
+    monkeypatch.setattr(pdf_utils, "convert_from_path", fake_convert_from_path)
+
+    images = pdf_utils.pdf_to_images("notes.pdf", max_pages=5, max_size=2048)
+
+    # A4 long side 841.89pt -> 2048px at 175 DPI; landscape letter 792pt -> 186 DPI.
+    assert calls == [(1, 2, 175), (3, 3, 186)]
+    assert len(images) == 3
+
+
+def test_render_dpi_never_exceeds_requested_dpi():
+    assert pdf_utils.render_dpi((200, 300), dpi=300, max_size=2048) == 300
+    assert pdf_utils.render_dpi((595.276, 841.89), dpi=300, max_size=2048) == 175
+    assert pdf_utils.render_dpi(None, dpi=300, max_size=2048) == 300
+    assert pdf_utils.render_dpi((595.276, 841.89), dpi=300, max_size=None) == 300
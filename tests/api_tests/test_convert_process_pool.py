@@ -0,0 +1,216 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app import main  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline  # noqa: E402
+from app.utils import executors, shared_pages  # noqa: E402
+from app.utils.image import preprocess_pil_image  # noqa: E402
+from support.pages import fake_pages, png_bytes  # noqa: E402
+
+# Worker processes are spawned, so fakes they run must be importable module
+# functions (pickled by reference), not closures.
+PAGES = {"size": (600, 800), "lines": 3, "extra_lines": 2}
+
+
+def _failing_render(*_args, **_kwargs):
+    raise RuntimeError("render failed")
+
+
+def _exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+@pytest.fixture()
+def process_backend(monkeypatch, fake_pdf):
+    fake_pdf(3, **PAGES)
+    monkeypatch.setattr(convert_pipeline, "CONVERT_CPU_BACKEND", "process")
+    monkeypatch.setattr(executors, "CONVERT_PROCESS_WORKERS", 2)
+    executors.shutdown_process_executor()
+    yield
+    executors.shutdown_process_executor()
+
+
+def _prepare(source, file_category):
+    return asyncio.run(convert_pipeline.prepare_pages(source, file_category))
+
+
+def test_shared_page_round_trip():
+    img = fake_pages(3, **PAGES)[0].convert("RGB")
+    page = shared_pages.share_image(img)
+    try:
+        assert shared_pages.load_image(page).tobytes() == img.tobytes()
+        assert (page.mode, page.width, page.height) == ("RGB", 600, 800)
+    finally:
+        shared_pages.release([page])
+    assert not _exists(page.name)
+    shared_pages.release([page])
+
+
+@pytest.mark.parametrize("engine", ["pil", "numpy"])
+def test_pdf_pages_match_the_thread_backend(monkeypatch, process_backend, engine):
+    monkeypatch.setattr(convert_pipeline, "PREPROCESS_ENGINE", engine)
+    monkeypatch.setattr(convert_pipeline, "PAGE_FILTER_ENABLED", True)
+    on_processes = _prepare(b"%PDF-1.4 fake", "pdf")
+    monkeypatch.setattr(convert_pipeline, "CONVERT_CPU_BACKEND", "thread")
+
+    on_threads = _prepare(b"%PDF-1.4 fake", "pdf")
+
+    assert [page.image for page in on_processes] == [page.image for page in on_threads]
+    assert [page.skip for page in on_processes] == [page.skip for page in on_threads]
+
+
+def test_image_upload_matches_the_thread_backend(process_backend):
+    img = fake_pages(3, **PAGES)[2]
+
+    prepared = _prepare(png_bytes(img), "image")
+
+    assert prepared[0].image == preprocess_pil_image(img).data
+
+
+def test_shared_blocks_are_released(monkeypatch, process_backend):
+    created = []
+    share_bytes = shared_pages.share_bytes
+    render_shared = shared_pages.render_shared
+
+    def tracked_share_bytes(data):
+        created.append(share_bytes(data))
+        return created[-1]
+
+    def tracked_render_shared(*args, **kwargs):
+        # Runs in the parent here, so the blocks it creates can be checked.
+        pages = render_shared(*args, **kwargs)
+        created.extend(pages)
+        return pages
+
+    monkeypatch.setattr(convert_pipeline, "share_bytes", tracked_share_bytes)
+    monkeypatch.setattr(convert_pipeline, "render_shared", tracked_render_shared)
+    monkeypatch.setattr(convert_pipeline, "run_process", executors.run_io)
+    monkeypatch.setattr(convert_pipeline, "run_process_owned", executors.run_cpu_owned)
+
+    _prepare(b"%PDF-1.4 fake", "pdf")
+    _prepare(png_bytes(fake_pages(3, **PAGES)[0]), "image")
+
+    assert len(created) == 4
+    assert not any(_exists(item.name) for item in created)
+
+
+
+def test_pages_rendered_for_a_cancelled_request_are_released(monkeypatch, process_backend):
+    created = []
+    started, finish = threading.Event(), threading.Event()
+    render_shared = shared_pages.render_shared
+
+    def slow_render_shared(*args, **kwargs):
+        started.set()
+        finish.wait(5)
+        pages = render_shared(*args, **kwargs)
+        created.extend(pages)
+        return pages
+
+    monkeypatch.setattr(convert_pipeline, "render_shared", slow_render_shared)
+    # In-process stand-in for the worker pool, so the blocks can be tracked.
+    monkeypatch.setattr(convert_pipeline, "run_process_owned", executors.run_cpu_owned)
+
+    async def scenario():
+        task = asyncio.create_task(convert_pipeline.prepare_pages(b"%PDF-1.4 fake", "pdf"))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    # The render finishes after its request went away.
+    finish.set()
+    deadline = time.monotonic() + 5
+    while (len(created) < 3 or any(_exists(item.name) for item in created)) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(created) == 3
+    assert not any(_exists(item.name) for item in created)
+
+
+def test_image_upload_is_shared_off_the_event_loop(monkeypatch, process_backend):
+    threads = []
+    share_bytes = shared_pages.share_bytes
+
+    def tracked_share_bytes(data):
+        threads.append(threading.current_thread())
+        return share_bytes(data)
+
+    monkeypatch.setattr(convert_pipeline, "share_bytes", tracked_share_bytes)
+
+    _prepare(png_bytes(fake_pages(1, **PAGES)[0]), "image")
+
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_render_failure_releases_rendered_pages(monkeypatch):
+    created = []
+    share_image = shared_pages.share_image
+
+    def tracked_share_image(img):
+        created.append(share_image(img))
+        return created[-1]
+
+    def render_then_fail():
+        yield from fake_pages(3, **PAGES)[:2]
+        raise RuntimeError("render failed")
+
+    monkeypatch.setattr(shared_pages, "share_image", tracked_share_image)
+
+    with pytest.raises(RuntimeError, match="render failed"):
+        shared_pages.render_shared(render_then_fail)
+    assert len(created) == 2
+    assert not any(_exists(item.name) for item in created)
+
+
+def test_render_errors_reach_the_caller(monkeypatch, process_backend):
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", _failing_render)
+
+    with pytest.raises(RuntimeError, match="render failed"):
+        _prepare(b"%PDF-1.4 fake", "pdf")
+
+
+def test_invalid_image_still_returns_422(process_backend):
+    resp = TestClient(app).post(
+        "/api/convert",
+        files={"file": ("notes.png", io.BytesIO(b"\x89PNG\r\n\x1a\n not an image"), "image/png")},
+    )
+
+    assert resp.status_code == 422
+
+
+def test_pool_size_is_configurable(monkeypatch, process_backend):
+    monkeypatch.setattr(executors, "CONVERT_PROCESS_WORKERS", 3)
+    executors.shutdown_process_executor()
+
+    assert executors.get_process_executor()._max_workers == 3
+
+
+def test_pool_is_warmed_at_startup(monkeypatch, process_backend):
+    monkeypatch.setattr(main, "CONVERT_CPU_BACKEND", "process")
+
+    asyncio.run(main._start_process_pool())
+
+    assert len(executors.get_process_executor()._processes) == 2
+
+
+def test_thread_backend_starts_no_processes(process_backend):
+    asyncio.run(main._start_process_pool())
+
+    assert executors._process_executor is None
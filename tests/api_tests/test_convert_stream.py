@@ -0,0 +1,88 @@
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+
+def _page_from_image(image_bytes):
+    # Fake page i is 200 + i pixels wide.
+    return Image.open(io.BytesIO(image_bytes)).size[0] - 200 + 1
+
+
+def _fake_gemini(image_bytes, context="general"):
+    page = _page_from_image(image_bytes)
+    # Page 3 is ready long before the others.
+    time.sleep(0.01 if page == 3 else 0.2)
+    return f"\\documentclass{{article}}\n\\begin{{document}}\nPage {page}\n\\end{{document}}"
+
+
+def _stream(client):
+    with client.stream(
+        "POST",
+        "/api/convert/stream",
+        files=pdf_upload(),
+    ) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in resp.iter_lines() if line]
+
+
+def test_stream_emits_pages_as_they_finish(monkeypatch, fake_pdf):
+    fake_pdf(3)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _fake_gemini)
+
+    events = _stream(TestClient(app))
+
+    assert [e["event"] for e in events] == ["start", "page", "page", "page", "done"]
+    assert events[0]["total_pages"] == 3
+
+    first_page = events[1]
+    assert first_page["page"] == 3
+    assert first_page["latex"] == "Page 3"
+    assert first_page["completed"] == 1
+    assert first_page["total_pages"] == 3
+    assert first_page["elapsed_ms"] >= 0
+
+    done = events[-1]
+    assert done["success"] is True
+    assert done["latex"].startswith("\\documentclass")
+    assert done["latex"].index("Page 1") < done["latex"].index("Page 2") < done["latex"].index("Page 3")
+    assert [p["page"] for p in done["pages"]] == [1, 2, 3]
+
+
+def test_stream_reports_gemini_failure_as_error_event(monkeypatch, fake_pdf):
+    def _unavailable(*_args, **_kwargs):
+        raise RuntimeError("503 ServiceUnavailable")
+
+    fake_pdf(2)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", _unavailable)
+
+    events = _stream(TestClient(app))
+
+    assert events[0]["event"] == "start"
+    assert events[-1] == {
+        "event": "error",
+        "success": False,
+        "status": 503,
+        "error": "Service unavailable",
+    }
+
+
+def test_stream_rejects_invalid_upload_before_streaming():
+    resp = TestClient(app).post(
+        "/api/convert/stream",
+        files={"file": ("notes.txt", io.BytesIO(b"hello"), "text/plain")},
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()["success"] is False
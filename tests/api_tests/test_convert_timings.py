@@ -0,0 +1,119 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline  # noqa: E402
+from app.services.metrics import Metrics, StageTimer, metrics  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+LATEX = "\\documentclass{article}\n\\begin{document}\nTimed\n\\end{document}"
+GEMINI_DELAY_S = 0.05
+REQUEST_STAGES = ["validate", "rasterize", "preprocess", "gemini", "assemble", "postprocess", "total"]
+
+
+def _slow_gemini(*_args, **_kwargs):
+    time.sleep(GEMINI_DELAY_S)
+    return LATEX
+
+
+def _server_timing(header):
+    entries = {}
+    for entry in header.split(","):
+        name, duration = entry.strip().split(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+def test_convert_reports_stage_timings_in_body_and_header(monkeypatch, fake_pdf):
+    metrics.reset()
+    fake_pdf(2)
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", _slow_gemini)
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    timings = resp.json()["timings_ms"]
+    assert list(timings) == REQUEST_STAGES
+    assert timings["gemini"] >= GEMINI_DELAY_S * 1000
+    assert timings["total"] >= sum(ms for stage, ms in timings.items() if stage not in ("total", "postprocess"))
+
+    header = _server_timing(resp.headers["server-timing"])
+    assert list(header) == REQUEST_STAGES
+    assert header["gemini"] == timings["gemini"]
+
+    for page in resp.json()["pages"]:
+        assert set(page["timings_ms"]) == {"preprocess", "gemini", "postprocess"}
+        assert page["timings_ms"]["preprocess"] > 0
+        assert page["timings_ms"]["gemini"] >= GEMINI_DELAY_S * 1000
+
+
+def test_stage_timings_feed_histograms(monkeypatch, fake_pdf):
+    metrics.reset()
+    fake_pdf(2)
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", _slow_gemini)
+    client = TestClient(app)
+
+    for _ in range(2):
+        assert client.post("/api/convert", files=pdf_upload()).status_code == 200
+
+    histograms = client.get("/api/metrics").json()["histograms"]
+    gemini = histograms["convert_stage_ms{stage=gemini}"]
+    assert gemini["count"] == 2
+    assert gemini["buckets"]["+Inf"] == 2
+    # The first request waited on Gemini; the second was served from the cache.
+    assert gemini["buckets"]["25"] == 1
+    assert gemini["buckets"]["50"] == 1
+    assert set(REQUEST_STAGES) <= {
+        name.split("stage=", 1)[1].rstrip("}") for name in histograms if name.startswith("convert_stage_ms")
+    }
+
+
+def test_cached_pages_report_no_gemini_time(monkeypatch, fake_pdf):
+    fake_pdf(2)
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", _slow_gemini)
+    client = TestClient(app)
+    client.post("/api/convert", files=pdf_upload())
+
+    resp = client.post("/api/convert", files=pdf_upload())
+
+    assert all(page["cache"] == "hit" for page in resp.json()["pages"])
+    assert all(page["timings_ms"]["gemini"] == 0 for page in resp.json()["pages"])
+
+
+def test_stream_done_event_carries_stage_timings(monkeypatch, fake_pdf):
+    fake_pdf(2)
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", _slow_gemini)
+
+    resp = TestClient(app).post("/api/convert/stream", files=pdf_upload())
+
+    events = [json.loads(line) for line in resp.text.splitlines() if line]
+    assert list(events[-1]["timings_ms"]) == REQUEST_STAGES
+    assert all("timings_ms" in event for event in events if event["event"] == "page")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Metrics(buckets_ms=(10, 100))
+    for value in (5, 10, 50, 500):
+        registry.observe("stage_ms", value)
+
+    histogram = registry.snapshot()["histograms"]["stage_ms"]
+
+    assert histogram == {"count": 4, "sum": 565, "buckets": {"10": 2, "100": 3, "+Inf": 4}}
+
+
+def test_stage_timer_adds_repeated_stages():
+    timer = StageTimer()
+    timer.add("gemini", 10)
+    timer.add("gemini", 5.5)
+
+    timings = timer.finish()
+
+    assert timings["gemini"] == 15.5
+    assert timer.server_timing().startswith("gemini;dur=15.5, total;dur=")
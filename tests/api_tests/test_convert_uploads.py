@@ -0,0 +1,203 @@
+import asyncio
+import io
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.utils.uploads import MAX_FILE_SIZE_BYTES  # noqa: E402
+
+LATEX = "\\begin{document}\nbody\n\\end{document}"
+
+
+def _page_image():
+    img = Image.new("L", (200, 200), color=255)
+    ImageDraw.Draw(img).line((10, 30, 180, 60), fill=0, width=4)
+    return img
+
+
+def _fake_pdf(path, size):
+    # "%PDF" magic followed by filler, written in 1 MiB blocks.
+    with open(path, "wb") as out:
+        out.write(b"%PDF-1.4\n")
+        remaining = size - 9
+        while remaining > 0:
+            block = min(remaining, 1024 * 1024)
+            out.write(b"0" * block)
+            remaining -= block
+    return path
+
+
+def _multipart(data: bytes, filename="notes.pdf", content_type="application/pdf"):
+    boundary = "uploadtestboundary"
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    return head + data + tail, f"multipart/form-data; boundary={boundary}"
+
+
+def _asgi_post(path, headers, body_chunks):
+    """Drive the app directly; returns (status, number of body chunks it read)."""
+    chunks = list(body_chunks)
+    read = 0
+    sent = []
+
+    async def receive():
+        nonlocal read
+        if read < len(chunks):
+            read += 1
+            return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    start = next(message for message in sent if message["type"] == "http.response.start")
+    return start["status"], read
+
+
+def test_oversized_content_length_is_rejected_before_reading_the_body():
+    body, content_type = _multipart(b"%PDF" + b"0" * 100)
+    headers = {"content-type": content_type, "content-length": str(MAX_FILE_SIZE_BYTES * 2)}
+
+    status, chunks_read = _asgi_post("/api/convert", headers, [body])
+
+    assert status == 413
+    assert chunks_read == 0
+
+
+def test_chunked_upload_is_aborted_once_it_crosses_the_limit():
+    # No Content-Length (chunked transfer): 16 MiB arriving 256 KiB at a time.
+    chunk = b"0" * (256 * 1024)
+    body_chunks = [b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n"
+                   b"Content-Type: application/pdf\r\n\r\n%PDF"] + [chunk] * 64
+    headers = {"content-type": "multipart/form-data; boundary=b"}
+
+    status, chunks_read = _asgi_post("/api/convert", headers, body_chunks)
+
+    assert status == 413
+    # Stopped just past 10 MiB instead of reading all 16.
+    assert chunks_read <= MAX_FILE_SIZE_BYTES // len(chunk) + 2
+
+
+def test_file_over_the_limit_is_rejected_by_size(monkeypatch):
+    monkeypatch.setattr("app.routes.convert.MAX_FILE_SIZE_BYTES", 1024)
+
+    resp = TestClient(app).post(
+        "/api/convert",
+        files={"file": ("notes.pdf", io.BytesIO(b"%PDF" + b"0" * 4096), "application/pdf")},
+    )
+
+    assert resp.status_code == 413
+
+
+def test_pdf_magic_is_checked_on_the_first_chunk():
+    resp = TestClient(app).post(
+        "/api/convert",
+        files={"file": ("notes.pdf", io.BytesIO(b"not a pdf" * 1000), "application/pdf")},
+    )
+
+    assert resp.status_code == 422
+    assert resp.json()["error"] == "Invalid PDF file"
+
+
+def test_pdf_is_spooled_to_disk_and_removed_afterwards(monkeypatch, tmp_path):
+    seen = {}
+
+    def fake_pdf_to_images(path, **_kwargs):
+        seen["path"] = path
+        seen["data"] = Path(path).read_bytes()
+        return [_page_image()]
+
+    monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", fake_pdf_to_images)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", lambda *_a, **_k: LATEX)
+    pdf = _fake_pdf(tmp_path / "big.pdf", 3 * 1024 * 1024 + 17)
+
+    with open(pdf, "rb") as fh:
+        resp = TestClient(app).post("/api/convert", files={"file": ("big.pdf", fh, "application/pdf")})
+
+    assert resp.status_code == 200
+    assert seen["data"] == pdf.read_bytes()
+    assert not os.path.exists(seen["path"])
+
+
+def test_stream_endpoint_removes_spooled_pdf(monkeypatch):
+    paths = []
+
+    def fake_pdf_to_images(path, **_kwargs):
+        paths.append(path)
+        return [_page_image()]
+
+    monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", fake_pdf_to_images)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", lambda *_a, **_k: LATEX)
+
+    resp = TestClient(app).post(
+        "/api/convert/stream",
+        files={"file": ("notes.pdf", io.BytesIO(b"%PDF-1.4 fake"), "application/pdf")},
+    )
+
+    assert resp.status_code == 200
+    assert paths and not os.path.exists(paths[0])
+
+
+def test_peak_memory_per_concurrent_upload_is_bounded(monkeypatch, tmp_path):
+    uploads = 3
+    size = 9 * 1024 * 1024
+    monkeypatch.setattr("app.services.convert_pipeline.pdf_to_images", lambda *_a, **_k: [_page_image()])
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", lambda *_a, **_k: LATEX)
+    pdfs = [_fake_pdf(tmp_path / f"notes-{i}.pdf", size) for i in range(uploads)]
+
+    async def _post_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            handles = [open(pdf, "rb") for pdf in pdfs]
+            try:
+                # httpx streams each file from disk, so the uploads never sit in test memory.
+                return await asyncio.gather(
+                    *(
+                        client.post("/api/convert", files={"file": (pdf.name, fh, "application/pdf")})
+                        for pdf, fh in zip(pdfs, handles)
+                    )
+                )
+            finally:
+                for fh in handles:
+                    fh.close()
+
+    asyncio.run(_post_all())  # warm-up: imports, client and app setup
+    tracemalloc.start()
+    try:
+        responses = asyncio.run(_post_all())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert [resp.status_code for resp in responses] == [200] * uploads
+    # Reading each upload whole held all 9 MiB of it (~28 MB peak for three);
+    # now it is a few chunks per upload.
+    assert peak < uploads * 4 * 1024 * 1024, peak
@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import gemini  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+from support.pages import jpeg_bytes  # noqa: E402
+
+
+@pytest.fixture()
+def fake_gemini(monkeypatch):
+    metrics.reset()
+    with run_fake_gemini() as server:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+        gemini.close_client()
+        try:
+            yield server
+        finally:
+            gemini.close_client()
+
+
+def test_split_batch_output():
+    text = "%%% PAGE 1 %%%\nfirst\n\n%%% PAGE 2 %%%\nsecond\n"
+
+    assert gemini.split_batch_output(text, 2) == ["first", "second"]
+    assert gemini.split_batch_output("```latex\n" + text + "```", 2) == ["first", "second\n```"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "%%% PAGE 1 %%%\nfirst",
+        "%%% PAGE 2 %%%\nsecond\n%%% PAGE 1 %%%\nfirst",
+        "Here are your pages:\n%%% PAGE 1 %%%\nfirst\n%%% PAGE 2 %%%\nsecond",
+        "%%% PAGE 1 %%%\n\n%%% PAGE 2 %%%\nsecond",
+    ],
+)
+def test_split_batch_output_rejects_malformed_responses(text):
+    with pytest.raises(gemini.PageSplitError):
+        gemini.split_batch_output(text, 2)
+
+
+def test_batch_request_sends_all_pages_with_delimiters(fake_gemini):
+    results = gemini.convert_images_to_latex([jpeg_bytes()] * 3, context="math")
+
+    assert results == [DEFAULT_LATEX] * 3
+    assert len(fake_gemini.requests) == 1
+    parts = fake_gemini.requests[0]["body"]["contents"][0]["parts"]
+    assert [part.get("text") for part in parts[::2]] == ["PAGE 1", "PAGE 2", "PAGE 3"]
+    assert "BATCH MODE" in fake_gemini.requests[0]["body"]["systemInstruction"]["parts"][0]["text"]
+    assert metrics.counter("gemini_pages", mode="batch") == 3
+
+
+def test_convert_batches_pages_and_keeps_order(monkeypatch, fake_gemini, fake_pdf, post_pdf):
+    fake_pdf(5)
+    monkeypatch.setattr("app.services.convert_pipeline.GEMINI_PAGE_BATCH_SIZE", 3)
+
+    resp = post_pdf()
+
+    assert resp.status_code == 200
+    assert [p["page"] for p in resp.json()["pages"]] == [1, 2, 3, 4, 5]
+    assert resp.json()["latex"].count("$E = mc^2$") == 5
+    # Pages 1-3 in one request, 4-5 in another.
+    assert len(fake_gemini.requests) == 2
+    assert metrics.counter("gemini_requests", mode="batch") == 2
+
+
+def test_unsplittable_batch_falls_back_to_page_calls(monkeypatch, fake_gemini, fake_pdf, post_pdf):
+    fake_gemini.split_batches = False
+    fake_pdf(5)
+    monkeypatch.setattr("app.services.convert_pipeline.GEMINI_PAGE_BATCH_SIZE", 5)
+
+    resp = post_pdf()
+
+    assert resp.status_code == 200
+    assert resp.json()["latex"].count("$E = mc^2$") == 5
+    assert len(fake_gemini.requests) == 1 + 5
+    assert metrics.counter("gemini_batch_fallbacks") == 1
+    assert metrics.counter("gemini_requests", mode="page") == 5
+
+
+def test_metrics_endpoint_reports_per_mode_timings(monkeypatch, fake_gemini, fake_pdf, post_pdf):
+    fake_pdf(5)
+    monkeypatch.setattr("app.services.convert_pipeline.GEMINI_PAGE_BATCH_SIZE", 5)
+    post_pdf()
+
+    payload = TestClient(app).get("/api/metrics").json()
+
+    assert payload["counters"]["gemini_pages{mode=batch}"] == 5
+    assert payload["counters"]["gemini_prompt_tokens{mode=batch}"] > 5 * 258
+    assert payload["timings"]["gemini_request_ms{mode=batch}"]["count"] == 1
+    assert "gemini_page_ms{mode=batch}" in payload["timings"]
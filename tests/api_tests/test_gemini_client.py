@@ -0,0 +1,64 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.services import gemini  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+from support.pages import jpeg_bytes  # noqa: E402
+
+
+@pytest.fixture()
+def fake_gemini(monkeypatch):
+    with run_fake_gemini() as server:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+        gemini.close_client()
+        try:
+            yield server
+        finally:
+            gemini.close_client()
+
+
+def test_client_is_shared_and_reuses_connections(fake_gemini):
+    image = jpeg_bytes()
+
+    results = [gemini.convert_image_to_latex(image, context="math") for _ in range(5)]
+
+    assert results == [DEFAULT_LATEX] * 5
+    assert gemini.get_client() is gemini.get_client()
+    assert len(fake_gemini.requests) == 5
+    assert fake_gemini.connections == 1
+
+
+def test_system_prompt_is_sent_per_context(fake_gemini):
+    gemini.convert_image_to_latex(jpeg_bytes(), context="chemistry")
+
+    body = fake_gemini.requests[-1]["body"]
+    instruction = body["systemInstruction"]["parts"][0]["text"]
+    assert gemini.CONTEXT_HINTS["chemistry"] in instruction
+    assert gemini.get_generation_config("unknown") is gemini.get_generation_config("general")
+
+
+def test_async_variant_uses_shared_client(fake_gemini):
+    image = jpeg_bytes()
+
+    async def _run():
+        return await asyncio.gather(
+            *(gemini.convert_image_to_latex_async(image) for _ in range(3))
+        )
+
+    assert asyncio.run(_run()) == [DEFAULT_LATEX] * 3
+    assert len(fake_gemini.requests) == 3
+
+
+def test_client_recreated_when_api_key_changes(fake_gemini, monkeypatch):
+    first = gemini.get_client()
+    monkeypatch.setenv("GEMINI_API_KEY", "rotated-key")
+
+    assert gemini.get_client() is not first
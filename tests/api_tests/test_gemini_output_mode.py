@@ -0,0 +1,107 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline, gemini  # noqa: E402
+from app.services.latex import extract_document_body, wrap_latex_document  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+
+BODY = extract_document_body(DEFAULT_LATEX)
+
+
+@pytest.fixture()
+def fake_gemini(monkeypatch, fake_pdf):
+    metrics.reset()
+    fake_pdf(2)
+    with run_fake_gemini(body_text=BODY) as server:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+        gemini.close_client()
+        try:
+            yield server
+        finally:
+            gemini.close_client()
+
+
+def _instruction(request):
+    return request["body"]["systemInstruction"]["parts"][0]["text"]
+
+
+def test_body_prompt_drops_the_preamble_rules():
+    body_prompt = gemini.get_system_prompt("math", mode="body")
+    document_prompt = gemini.get_system_prompt("math", mode="document")
+
+    assert "\\usepackage[utf8]{inputenc}" in document_prompt
+    assert "\\usepackage[utf8]{inputenc}" not in body_prompt
+    assert "Do NOT output \\documentclass" in body_prompt
+    assert body_prompt.endswith(gemini.CONTEXT_HINTS["math"])
+
+
+def test_body_prompt_keeps_every_other_rule():
+    # BODY_SYSTEM_PROMPT is written out in full; only the output line and
+    # the preamble rule may differ from SYSTEM_PROMPT.
+    def rules(prompt):
+        lines = prompt.split("RULES:")[1].splitlines()
+        return [line for line in lines if line[:2] != "2." and not line.startswith("   ")]
+
+    assert rules(gemini.BODY_SYSTEM_PROMPT) == rules(gemini.SYSTEM_PROMPT)
+    assert gemini.BODY_SYSTEM_PROMPT.split("OUTPUT:")[0] == gemini.SYSTEM_PROMPT.split("OUTPUT:")[0]
+
+
+@pytest.mark.parametrize("mode", ["body", "document"])
+def test_both_modes_produce_the_same_document(monkeypatch, fake_gemini, mode, post_pdf):
+    monkeypatch.setattr(gemini, "GEMINI_OUTPUT_MODE", mode)
+
+    resp = post_pdf()
+
+    assert resp.status_code == 200
+    assert resp.json()["latex"] == wrap_latex_document(BODY + "\n\n" + BODY)
+    asked_for_body = "document body only" in _instruction(fake_gemini.requests[0])
+    assert asked_for_body == (mode == "body")
+
+
+def test_body_mode_uses_fewer_output_tokens(monkeypatch, fake_gemini, post_pdf):
+    tokens = {}
+    for mode in ("document", "body"):
+        monkeypatch.setattr(gemini, "GEMINI_OUTPUT_MODE", mode)
+        metrics.reset()
+        assert post_pdf().status_code == 200
+        tokens[mode] = metrics.counter("gemini_output_tokens", mode="page")
+
+    assert tokens["body"] < tokens["document"]
+
+
+def test_body_mode_tolerates_a_model_that_still_emits_a_preamble(monkeypatch, fake_pdf, post_pdf):
+    monkeypatch.setattr(gemini, "GEMINI_OUTPUT_MODE", "body")
+    fake_pdf(2)
+    answers = iter([
+        DEFAULT_LATEX,
+        "\\usepackage{amsmath}\n\\begin{document}\n" + BODY + "\n\\end{document}",
+    ])
+    monkeypatch.setattr(convert_pipeline, "convert_image_to_latex", lambda *_a, **_k: next(answers))
+
+    resp = post_pdf()
+
+    assert resp.status_code == 200
+    assert [page["cache"] for page in resp.json()["pages"]] == ["miss", "miss"]
+    assert resp.json()["latex"] == wrap_latex_document(BODY + "\n\n" + BODY)
+
+
+def test_output_modes_do_not_share_cache_entries(monkeypatch, fake_gemini, post_pdf):
+    client = TestClient(app)
+    monkeypatch.setattr(gemini, "GEMINI_OUTPUT_MODE", "document")
+    post_pdf(client)
+
+    monkeypatch.setattr(gemini, "GEMINI_OUTPUT_MODE", "body")
+    resp = post_pdf(client)
+
+    assert gemini.get_prompt_version() != gemini.PROMPT_VERSION
+    assert [page["cache"] for page in resp.json()["pages"]] == ["miss", "miss"]
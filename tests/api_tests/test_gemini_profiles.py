@@ -0,0 +1,143 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import gemini, rate_limit  # noqa: E402
+from app.services.rate_limit import RateGovernor  # noqa: E402
+from support.fake_gemini import run_fake_gemini  # noqa: E402
+
+
+@pytest.fixture()
+def fake_gemini(monkeypatch, request, fake_pdf):
+    fake_pdf(1)
+    monkeypatch.setitem(rate_limit._GOVERNORS, "test-key", RateGovernor(max_retries=0))
+    latency_s = getattr(request, "param", 0.0)
+    with run_fake_gemini(latency_s=latency_s) as server:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+        gemini.close_client()
+        try:
+            yield server
+        finally:
+            gemini.close_client()
+
+
+def _generation_config(server, index=-1):
+    return server.requests[index]["body"]["generationConfig"]
+
+
+def _thinking_budget(config):
+    # The SDK sends the nested ThinkingConfig with its field names as-is.
+    thinking = config["thinkingConfig"]
+    return thinking.get("thinkingBudget", thinking.get("thinking_budget"))
+
+
+def test_every_context_has_a_profile():
+    assert set(gemini.GENERATION_PROFILES) == set(gemini.CONTEXT_HINTS)
+    assert gemini.get_generation_profile("unknown") is gemini.GENERATION_PROFILES["general"]
+
+
+def test_context_profile_is_sent_and_reported(fake_gemini, post_pdf):
+    resp = post_pdf(context="math")
+
+    assert resp.status_code == 200
+    profile = gemini.GENERATION_PROFILES["math"]
+    assert resp.json()["generation"] == {
+        "profile": "math",
+        "thinking_budget": profile.thinking_budget,
+        "max_output_tokens": profile.max_output_tokens,
+        "temperature": profile.temperature,
+        "deadline_s": profile.deadline_s,
+        "overridden": [],
+    }
+    config = _generation_config(fake_gemini)
+    assert _thinking_budget(config) == profile.thinking_budget
+    assert config["maxOutputTokens"] == profile.max_output_tokens
+    assert config["temperature"] == profile.temperature
+
+
+def test_request_overrides_the_profile(fake_gemini, post_pdf):
+    resp = post_pdf(context="math", thinking_budget=0, temperature=0.7)
+
+    assert resp.status_code == 200
+    generation = resp.json()["generation"]
+    assert generation["profile"] == "math"
+    assert generation["overridden"] == ["temperature", "thinking_budget"]
+    assert generation["max_output_tokens"] == gemini.GENERATION_PROFILES["math"].max_output_tokens
+    config = _generation_config(fake_gemini)
+    assert _thinking_budget(config) == 0
+    assert config["temperature"] == 0.7
+    # The system prompt is still the context's.
+    instruction = fake_gemini.requests[-1]["body"]["systemInstruction"]["parts"][0]["text"]
+    assert gemini.CONTEXT_HINTS["math"] in instruction
+
+
+@pytest.mark.parametrize(
+    ("model", "budget", "sent"),
+    [
+        ("gemini-2.5-flash", 0, 0),
+        ("gemini-2.5-flash", 32768, 24576),
+        ("gemini-2.5-flash-lite", 100, 512),
+        ("gemini-2.5-flash-lite", 0, 0),
+        ("gemini-2.5-pro", 0, 128),
+        ("models/gemini-2.5-pro", 32768, 32768),
+        ("gemini-2.5-pro", -1, -1),
+        ("gemini-3-pro-preview", 0, 0),
+    ],
+)
+def test_thinking_budget_is_fitted_to_the_model(model, budget, sent):
+    assert gemini.thinking_budget_for(model, budget) == sent
+
+
+def test_thinking_cannot_be_turned_off_on_pro(fake_gemini, post_pdf, monkeypatch):
+    # The general profile turns thinking off, which gemini-2.5-pro rejects.
+    monkeypatch.setenv("GEMINI_MODEL", "gemini-2.5-pro")
+
+    resp = post_pdf()
+    pro_max = post_pdf(thinking_budget=32768)
+
+    assert resp.status_code == 200
+    assert pro_max.status_code == 200
+    assert fake_gemini.requests[0]["model"] == "gemini-2.5-pro"
+    assert _thinking_budget(_generation_config(fake_gemini, 0)) == 128
+    assert _thinking_budget(_generation_config(fake_gemini, 1)) == 32768
+    assert resp.json()["generation"]["thinking_budget"] == 0
+
+
+def test_generation_settings_are_part_of_the_cache_key(fake_gemini, post_pdf):
+    client = TestClient(app)
+    post_pdf(client, temperature=0.5)
+
+    same = post_pdf(client, temperature=0.5)
+    # Only the deadline differs, which does not change the output.
+    longer_deadline = post_pdf(client, temperature=0.5, deadline_s=120)
+    other = post_pdf(client, temperature=0.9)
+
+    assert same.json()["pages"][0]["cache"] == "hit"
+    assert longer_deadline.json()["pages"][0]["cache"] == "hit"
+    assert other.json()["pages"][0]["cache"] == "miss"
+
+
+@pytest.mark.parametrize("fake_gemini", [1.0], indirect=True)
+def test_deadline_fails_the_request_with_504(fake_gemini, post_pdf):
+    started = time.perf_counter()
+
+    resp = post_pdf(deadline_s=0.2)
+
+    assert resp.status_code == 504
+    assert resp.json()["error"] == "Gemini deadline exceeded"
+    assert time.perf_counter() - started < 1.0
+
+
+def test_out_of_range_override_is_rejected(post_pdf):
+    resp = post_pdf(thinking_budget=100000)
+
+    assert resp.status_code == 422
@@ -0,0 +1,298 @@
+import asyncio
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from google.genai import errors
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline, gemini, rate_limit  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from app.services.rate_limit import AdaptiveConcurrency, RateGovernor, TokenBucket  # noqa: E402
+from app.utils.executors import GEMINI_MAX_CONCURRENCY, run_io, submit_io  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+from support.pages import jpeg_bytes, pdf_upload  # noqa: E402
+
+
+@pytest.fixture()
+def governor(monkeypatch):
+    # Short backoff so retries finish in milliseconds.
+    governor = RateGovernor(max_concurrency=8, max_retries=3, backoff_base_s=0.01, backoff_max_s=0.05)
+    monkeypatch.setitem(rate_limit._GOVERNORS, "test-key", governor)
+    return governor
+
+
+@pytest.fixture()
+def fake_gemini_factory(monkeypatch, governor):
+    # Each test starts the fake with its own error injection settings.
+    metrics.reset()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    with ExitStack() as stack:
+
+        def _start(**kwargs):
+            server = stack.enter_context(run_fake_gemini(**kwargs))
+            monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+            gemini.close_client()
+            return server
+
+        try:
+            yield _start
+        finally:
+            gemini.close_client()
+
+
+def test_token_bucket_queues_reservations_at_the_rate():
+    bucket = TokenBucket(rate_per_s=50, burst=2)
+
+    waits = [bucket.reserve() for _ in range(7)]
+
+    assert waits[:2] == [0.0, 0.0]
+    # Each reservation past the burst waits one more 1/rate interval.
+    assert waits[2] == pytest.approx(0.02, abs=0.005)
+    assert waits[-1] == pytest.approx(0.10, abs=0.005)
+    assert TokenBucket(rate_per_s=0, burst=1).reserve() == 0.0
+
+
+def test_adaptive_concurrency_is_aimd(monkeypatch):
+    monkeypatch.setattr(rate_limit, "DECREASE_COOLDOWN_S", 60.0)
+    limit = AdaptiveConcurrency(max_limit=8)
+
+    for _ in range(2):
+        assert limit.acquire(timeout=0)
+    limit.release(throttled=True)
+    assert limit.limit == 4
+    # A second 429 from a call that was already in flight does not halve again.
+    limit.release(throttled=True)
+    assert limit.limit == 4
+
+    # Additive increase: 1/limit per success, about +1 after `limit` successes.
+    for _ in range(4):
+        limit.acquire(timeout=0)
+        limit.release()
+    assert 4.8 < limit.limit < 5
+
+    for _ in range(4):
+        assert limit.acquire(timeout=0)
+    assert not limit.acquire(timeout=0.01)
+
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    governor = RateGovernor(backoff_base_s=0.5, backoff_max_s=4)
+
+    delays = [governor.backoff(2) for _ in range(200)]
+
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 100
+    assert governor.backoff(10) <= 4
+    assert governor.backoff(0, retry_after=3) >= 3
+
+
+def test_governor_is_shared_per_api_key():
+    assert rate_limit.get_governor("key-a") is rate_limit.get_governor("key-a")
+    assert rate_limit.get_governor("key-a") is not rate_limit.get_governor("key-b")
+
+
+def test_injected_429s_are_retried(fake_gemini_factory):
+    server = fake_gemini_factory(fail_first=2)
+
+    assert gemini.convert_image_to_latex(jpeg_bytes()) == DEFAULT_LATEX
+
+    assert len(server.requests) == 3
+    assert metrics.counter("gemini_retries") == 2
+    assert metrics.counter("gemini_throttled", status=429) == 2
+
+
+def test_async_variant_retries_too(fake_gemini_factory):
+    server = fake_gemini_factory(fail_first=1, error_status=503)
+
+    assert asyncio.run(gemini.convert_image_to_latex_async(jpeg_bytes())) == DEFAULT_LATEX
+
+    assert len(server.requests) == 2
+    assert metrics.counter("gemini_throttled", status=503) == 1
+
+
+def test_non_retryable_errors_fail_fast(fake_gemini_factory):
+    server = fake_gemini_factory(error_rate=1.0, error_status=400)
+
+    with pytest.raises(errors.ClientError):
+        gemini.convert_image_to_latex(jpeg_bytes())
+
+    assert len(server.requests) == 1
+
+
+def test_persistent_429_maps_to_rate_limit_response(monkeypatch, fake_gemini_factory, fake_pdf):
+    server = fake_gemini_factory(error_rate=1.0)
+    fake_pdf(1)
+
+    resp = TestClient(app).post(
+        "/api/convert",
+        files=pdf_upload(),
+    )
+
+    assert resp.status_code == 429
+    assert resp.json()["error"] == "Gemini rate limit"
+    # First attempt plus max_retries.
+    assert len(server.requests) == 4
+
+
+def test_burst_over_quota_queues_instead_of_failing(monkeypatch, governor, fake_gemini_factory):
+    # The fake rejects anything beyond 2 requests in flight; 16 callers arrive at once.
+    monkeypatch.setattr(rate_limit, "DECREASE_COOLDOWN_S", 0.05)
+    governor.max_retries = 50
+    server = fake_gemini_factory(capacity=2, latency_s=0.05)
+    image = jpeg_bytes()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: gemini.convert_image_to_latex(image), range(16)))
+
+    assert results == [DEFAULT_LATEX] * 16
+    assert server.errors > 0
+    assert server.max_in_flight <= 2
+    # AIMD backed off from the configured 8 after the 429s.
+    assert governor.concurrency.limit < 8
+    assert metrics.snapshot()["gauges"]["gemini_concurrency_limit"] < 8
+
+
+def test_queue_timeout_raises_rate_limit(governor):
+    governor.queue_timeout_s = 0.01
+    for _ in range(8):
+        governor.concurrency.acquire(timeout=0)
+
+    started = time.perf_counter()
+    with pytest.raises(rate_limit.GeminiBusyError) as info:
+        governor.call(lambda: "never")
+
+    assert info.value.code == 429
+    assert time.perf_counter() - started < 1
+
+
+def test_queued_pipeline_calls_wait_on_the_event_loop(monkeypatch, governor):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    for _ in range(8):
+        governor.concurrency.acquire(timeout=0)
+
+    async def scenario():
+        queued = [
+            asyncio.create_task(convert_pipeline._governed(lambda: "done", deadline_s=5))
+            for _ in range(2 * GEMINI_MAX_CONCURRENCY)
+        ]
+        await asyncio.sleep(0.05)
+        # More calls are queued than the I/O pool has threads, yet it is free.
+        assert await asyncio.wait_for(run_io(lambda: "free"), 1) == "free"
+        for _ in range(8):
+            governor.concurrency.release()
+        return await asyncio.gather(*queued)
+
+    assert asyncio.run(scenario()) == ["done"] * 2 * GEMINI_MAX_CONCURRENCY
+    assert governor.concurrency.in_flight == 0
+
+
+def test_cancelled_async_call_gives_its_slot_back(governor):
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(governor.call_async(hang))
+        await started.wait()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    assert governor.concurrency.in_flight == 0
+
+
+def test_cancelled_threaded_call_keeps_its_slot_until_the_thread_is_done(governor):
+    started, release = threading.Event(), threading.Event()
+
+    def request():
+        started.set()
+        release.wait(5)
+        return "late"
+
+    async def scenario():
+        task = asyncio.create_task(governor.call_async(submit_io, request))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(scenario())
+        # The HTTP request is still going out on its I/O thread.
+        assert governor.concurrency.in_flight == 1
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while governor.concurrency.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert governor.concurrency.in_flight == 0
+
+
+class _Throttled(Exception):
+    code = 429
+
+
+def test_no_retry_is_started_past_the_deadline(governor):
+    metrics.reset()
+    governor.backoff = lambda *_args: 1.0
+    attempts = []
+
+    def _throttled():
+        attempts.append(time.monotonic())
+        raise _Throttled("429 RESOURCE_EXHAUSTED")
+
+    started = time.perf_counter()
+    with pytest.raises(_Throttled):
+        governor.call(_throttled, deadline=time.monotonic() + 0.2)
+
+    # Backing off would end past the deadline, so the call gives up at once.
+    assert len(attempts) == 1
+    assert time.perf_counter() - started < 0.5
+    assert metrics.counter("gemini_retries") == 0
+    assert governor.concurrency.in_flight == 0
+
+
+def test_queued_call_stops_waiting_at_the_deadline(governor):
+    for _ in range(8):
+        governor.concurrency.acquire(timeout=0)
+
+    async def queued():
+        return await governor.call_async(
+            run_io, lambda: "never", deadline=time.monotonic() + 0.05
+        )
+
+    started = time.perf_counter()
+    with pytest.raises(rate_limit.GeminiDeadlineError):
+        asyncio.run(queued())
+
+    # Well before the 120 s queue timeout, and mapped to a 504 by the pipeline.
+    assert time.perf_counter() - started < 1
+    assert convert_pipeline._gemini_error(rate_limit.GeminiDeadlineError()).status_code == 504
+
+
+def test_deadline_stops_retries_after_the_request_times_out(monkeypatch, governor, fake_gemini_factory, fake_pdf):
+    # Every attempt is throttled; without the deadline the governor would
+    # keep retrying after the request already answered 504.
+    governor.max_retries = 20
+    governor.backoff = lambda *_args: 0.15
+    server = fake_gemini_factory(error_rate=1.0)
+    fake_pdf(1)
+
+    resp = TestClient(app).post("/api/convert", params={"deadline_s": 0.4}, files=pdf_upload())
+    sent = len(server.requests)
+    time.sleep(0.5)
+
+    assert resp.status_code in (429, 504)
+    assert len(server.requests) == sent <= 3
@@ -0,0 +1,150 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline, gemini, rate_limit  # noqa: E402
+from app.services.latex import LatexBodyStream, extract_document_body  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from app.services.rate_limit import RateGovernor  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+RAW_OUTPUTS = [
+    "\\documentclass{article}\n\\begin{document}\nHello $x$\n\\end{document}",
+    "```latex\n\\documentclass{article}\n\\usepackage{amsmath}\n\\begin{document}\n\n  A \\\\n B\n\n\\end{document}\n```",
+    "```\n\\section{Bare}\nbody with ``quotes`` inside\n```  \n",
+    "\\documentclass{article}\n\\begin{document}\nA\n\\end{document}\nB\n\\end{document}\ntrailing",
+    "\\documentclass{article}\n\\begin{document}\nthe model forgot to close",
+    "\\documentclass{article}\nno body at all",
+    "escaped \\\\\\n newline and \\end{document} in a bare body",
+    "   \n\n",
+    "",
+    # Partial preambles, as from a model asked for the body only.
+    "\\usepackage{amsmath}\n\\begin{document}\nX $y$\n\\end{document}",
+    "\\begin{document}\nY\n\\end{document}\n```",
+    "```latex\n\\usepackage{amsmath}\nno begin at all",
+]
+
+
+def _feed(raw, size):
+    stream = LatexBodyStream()
+    pieces = [stream.feed(raw[start:start + size]) for start in range(0, len(raw), size)]
+    pieces.append(stream.finish())
+    return stream, pieces
+
+
+@pytest.mark.parametrize("raw", RAW_OUTPUTS)
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_body_stream_matches_extract_document_body(raw, size):
+    stream, pieces = _feed(raw, size)
+
+    assert "".join(pieces) == extract_document_body(raw)
+    assert stream.body == extract_document_body(raw)
+    assert not stream.revised
+
+
+def test_body_stream_holds_back_what_a_later_chunk_can_change():
+    stream = LatexBodyStream()
+
+    assert stream.feed("```latex\n\\documentclass{article}\n\\begin{doc") == ""
+    assert stream.feed("ument}\n  First line \\end{doc") == "First line"
+    assert stream.feed("ument}\n```") == ""
+    assert stream.finish() == ""
+    assert stream.body == "First line"
+
+
+def test_body_stream_revises_body_after_chatter_before_documentclass():
+    raw = "Sure, here it is:\n\\documentclass{article}\n\\begin{document}\nZ\n\\end{document}"
+
+    stream, _pieces = _feed(raw, 5)
+
+    assert stream.revised
+    assert stream.body == extract_document_body(raw) == "Z"
+
+
+def test_body_stream_revises_body_after_chatter_before_begin_document():
+    raw = "Here is the body:\n\\begin{document}\nZ\n\\end{document}"
+
+    stream, _pieces = _feed(raw, 4)
+
+    assert stream.revised
+    assert stream.body == extract_document_body(raw) == "Z"
+
+
+@pytest.fixture()
+def fake_gemini(monkeypatch):
+    metrics.reset()
+    monkeypatch.setitem(rate_limit._GOVERNORS, "test-key", RateGovernor(backoff_base_s=0.01))
+    with run_fake_gemini(stream_chunk_chars=8, fail_first=1) as server:
+        monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+        monkeypatch.setattr(gemini, "GEMINI_BASE_URL", server.base_url)
+        gemini.close_client()
+        try:
+            yield server
+        finally:
+            gemini.close_client()
+
+
+def test_stream_image_to_latex_yields_chunks(fake_gemini):
+    chunks = list(gemini.stream_image_to_latex(b"jpeg", context="math"))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == DEFAULT_LATEX
+    # The injected 429 came before any text, so the call was retried.
+    assert [request["path"].rsplit(":", 1)[-1] for request in fake_gemini.requests] == [
+        "streamGenerateContent?alt=sse"
+    ] * 2
+    assert metrics.counter("gemini_requests", mode="stream") == 1
+    assert metrics.snapshot()["timings"]["gemini_first_token_ms"]["count"] == 1
+
+
+def _stream(client):
+    with client.stream(
+        "POST",
+        "/api/convert/stream?tokens=true",
+        files=pdf_upload(),
+    ) as resp:
+        assert resp.status_code == 200
+        return [json.loads(line) for line in resp.iter_lines() if line]
+
+
+def test_convert_stream_emits_body_deltas_per_page(monkeypatch, fake_gemini, fake_pdf):
+    fake_pdf(3)
+    post_processed = []
+    monkeypatch.setattr(
+        convert_pipeline,
+        "extract_document_body",
+        lambda raw: post_processed.append(raw) or extract_document_body(raw),
+    )
+
+    events = _stream(TestClient(app))
+
+    assert events[0]["event"] == "start" and events[-1]["event"] == "done"
+    expected_body = extract_document_body(DEFAULT_LATEX)
+    for page in (1, 2, 3):
+        deltas = [e for e in events if e["event"] == "delta" and e["page"] == page]
+        page_index = next(i for i, e in enumerate(events) if e["event"] == "page" and e["page"] == page)
+        assert len(deltas) > 1
+        assert "".join(e["latex"] for e in deltas) == expected_body == events[page_index]["latex"]
+        assert all(events.index(delta) < page_index for delta in deltas)
+    # Streamed pages were post-processed while streaming, not again afterwards.
+    assert post_processed == []
+
+
+def test_cached_pages_skip_deltas(monkeypatch, fake_gemini, fake_pdf):
+    fake_pdf(3)
+    client = TestClient(app)
+    _stream(client)
+
+    events = _stream(client)
+
+    assert [e["event"] for e in events] == ["start", "page", "page", "page", "done"]
+    assert all(e["cache"] == "hit" for e in events if e["event"] == "page")
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline, gemini, gemini_transport, rate_limit  # noqa: E402
+from app.services.cache import ConversionCache  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from app.services.rate_limit import RateGovernor  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+from support.pages import pdf_upload  # noqa: E402
+
+# Nothing listens here: replayed requests must never reach the network.
+UNREACHABLE_URL = "http://127.0.0.1:9"
+
+
+@pytest.fixture()
+def cassette_dir(monkeypatch, tmp_path, fake_pdf):
+    metrics.reset()
+    # Every conversion reaches the transport.
+    monkeypatch.setattr(convert_pipeline, "conversion_cache", ConversionCache(memory_entries=0, disk_dir=None))
+    fake_pdf(2, size=(600, 800), lines=4, extra_lines=6)
+    monkeypatch.setitem(rate_limit._GOVERNORS, "test-key", RateGovernor(max_retries=0))
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_transport, "GEMINI_CASSETTE_DIR", str(tmp_path / "cassettes"))
+    yield tmp_path / "cassettes"
+    gemini.close_client()
+
+
+def _use(monkeypatch, mode, base_url=UNREACHABLE_URL):
+    monkeypatch.setattr(gemini_transport, "GEMINI_TRANSPORT", mode)
+    monkeypatch.setattr(gemini, "GEMINI_BASE_URL", base_url)
+    gemini.close_client()
+
+
+def _record(monkeypatch, cassette_dir, path="/api/convert", **fake_options):
+    with run_fake_gemini(**fake_options) as server:
+        _use(monkeypatch, "record", server.base_url)
+        resp = TestClient(app).post(path, files=pdf_upload())
+        gemini.close_client()
+    assert resp.status_code == 200
+    return resp, server
+
+
+def test_record_then_replay_offline(monkeypatch, cassette_dir):
+    recorded, server = _record(monkeypatch, cassette_dir)
+    assert len(list(cassette_dir.glob("*.json"))) == len(server.requests) == 2
+
+    _use(monkeypatch, "replay")
+    replayed = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert replayed.status_code == 200
+    assert replayed.json()["latex"] == recorded.json()["latex"]
+    assert metrics.counter("gemini_cassette", result="exact") == 2
+
+
+def test_cassettes_hold_no_credentials(monkeypatch, cassette_dir):
+    _record(monkeypatch, cassette_dir)
+
+    for path in cassette_dir.glob("*.json"):
+        text = path.read_text()
+        entry = json.loads(text)
+        assert "test-key" not in text
+        assert entry["path"].endswith(":generateContent")
+        assert len(entry["image_hashes"]) == 1
+
+
+def test_replay_miss_fails_the_conversion(monkeypatch, cassette_dir):
+    _use(monkeypatch, "replay")
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 500
+    assert "No recorded Gemini response" in resp.json()["error"]
+    assert metrics.counter("gemini_cassette", result="miss") >= 1
+
+
+def test_replay_matches_pages_preprocessed_differently(monkeypatch, cassette_dir):
+    _record(monkeypatch, cassette_dir)
+    # A smaller JPEG budget changes the bytes sent, not what is on the page.
+    monkeypatch.setattr("app.utils.image.PAGE_BYTE_BUDGET", 20000)
+    _use(monkeypatch, "replay")
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    assert metrics.counter("gemini_cassette", result="nearest") >= 1
+    assert metrics.counter("gemini_cassette", result="nearest") + metrics.counter("gemini_cassette", result="exact") == 2
+
+
+def test_nearest_match_can_be_turned_off(monkeypatch, cassette_dir):
+    _record(monkeypatch, cassette_dir)
+    monkeypatch.setattr("app.utils.image.PAGE_BYTE_BUDGET", 20000)
+    monkeypatch.setattr(gemini_transport, "GEMINI_REPLAY_MAX_HASH_DISTANCE", -1)
+    _use(monkeypatch, "replay")
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 500
+
+
+@pytest.mark.parametrize("latency", ["recorded", "0.3"])
+def test_replay_simulates_latency(monkeypatch, cassette_dir, latency):
+    _record(monkeypatch, cassette_dir, latency_s=0.3)
+    monkeypatch.setattr(gemini_transport, "GEMINI_REPLAY_LATENCY", latency)
+    _use(monkeypatch, "replay")
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    assert resp.json()["timings_ms"]["gemini"] >= 300
+
+
+def test_replay_without_latency_is_fast(monkeypatch, cassette_dir):
+    _record(monkeypatch, cassette_dir, latency_s=0.3)
+    _use(monkeypatch, "replay")
+    started = time.perf_counter()
+
+    resp = TestClient(app).post("/api/convert", files=pdf_upload())
+
+    assert resp.status_code == 200
+    assert time.perf_counter() - started < 0.3
+
+
+def test_streamed_responses_replay_chunk_by_chunk(monkeypatch, cassette_dir):
+    with run_fake_gemini(stream_chunk_chars=8) as server:
+        _use(monkeypatch, "record", server.base_url)
+        recorded = TestClient(app).post("/api/convert/stream", params={"tokens": "true"}, files=pdf_upload())
+        gemini.close_client()
+    entries = [json.loads(path.read_text()) for path in cassette_dir.glob("*.json")]
+    assert all(len(entry["chunks"]) > 1 for entry in entries)
+
+    _use(monkeypatch, "replay")
+    replayed = TestClient(app).post("/api/convert/stream", params={"tokens": "true"}, files=pdf_upload())
+
+    def deltas(resp):
+        events = [json.loads(line) for line in resp.text.splitlines() if line]
+        return sorted(event["page"] for event in events if event["event"] == "delta"), events[-1]["latex"]
+
+    assert deltas(replayed) == deltas(recorded)
+
+
+
+class _Chunks(list):
+    def close(self):
+        pass
+
+
+def test_recording_keeps_characters_split_across_chunks():
+    saved = []
+    transport = SimpleNamespace(cassette=SimpleNamespace(save=saved.append))
+    body = json.dumps({"text": "∫ x² dx — é"}, ensure_ascii=False).encode("utf-8")
+    # Three-byte chunks cut through most of the multibyte characters.
+    chunks = _Chunks(body[start:start + 3] for start in range(0, len(body), 3))
+    stream = gemini_transport._RecordingStream(transport, chunks, {"chunks": []}, time.perf_counter())
+
+    assert b"".join(stream) == body
+    stream.close()
+
+    recorded = saved[0]["chunks"]
+    assert len(recorded) == len(chunks)
+    assert "".join(chunk["text"] for chunk in recorded).encode("utf-8") == body
+
+def test_async_client_replays(monkeypatch, cassette_dir):
+    _record(monkeypatch, cassette_dir)
+    _use(monkeypatch, "replay")
+
+    async def convert():
+        prepared = await convert_pipeline.prepare_pages(b"%PDF-1.4 fake", "pdf")
+        return await gemini.convert_image_to_latex_async(prepared[0].image)
+
+    assert asyncio.run(convert()) == DEFAULT_LATEX
+
+
+def test_record_mode_needs_a_cassette_dir(monkeypatch):
+    monkeypatch.setattr(gemini_transport, "GEMINI_TRANSPORT", "record")
+    monkeypatch.setattr(gemini_transport, "GEMINI_CASSETTE_DIR", None)
+
+    with pytest.raises(RuntimeError, match="GEMINI_CASSETTE_DIR"):
+        gemini_transport.build_transport()
+
+
+def test_passthrough_keeps_the_sdk_transport(monkeypatch):
+    monkeypatch.setattr(gemini_transport, "GEMINI_TRANSPORT", "passthrough")
+
+    assert gemini_transport.build_transport() is None
+    assert "transport" not in gemini._http_options().client_args
@@ -0,0 +1,195 @@
+import asyncio
+import io
+import random
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw, ImageEnhance
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.services import convert_pipeline  # noqa: E402
+from app.utils.image import (  # noqa: E402
+    JPEG_QUALITY,
+    MAX_SIZE,
+    MIN_ENCODE_SIZE,
+    MIN_JPEG_QUALITY,
+    PAGE_BYTE_BUDGET,
+    EncodedImage,
+    encode_image,
+    preprocess_image,
+    preprocess_page_batch,
+    preprocess_pil_image,
+)
+from app.utils.pdf import PDF_CONTRAST_FACTOR  # noqa: E402
+
+
+def _page(mode="L", size=(600, 800)):
+    img = Image.new(mode, size, color="white")
+    ImageDraw.Draw(img).line((20, 40, 500, 300), fill="black", width=6)
+    return img
+
+
+def _jpeg_size(img, quality):
+    buf = io.BytesIO()
+    img.convert("L").save(buf, format="JPEG", quality=quality)
+    return len(buf.getvalue())
+
+
+def _png_bytes(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("mode, size", [("L", (600, 800)), ("RGB", (600, 800)), ("L", (MAX_SIZE + 500, 900))])
+def test_image_entry_point_matches_bytes_path(mode, size):
+    img = _page(mode, size)
+
+    assert preprocess_pil_image(img) == preprocess_image(_png_bytes(img))
+
+
+def test_image_entry_point_accepts_arrays():
+    np = pytest.importorskip("numpy")
+    img = _page()
+
+    assert preprocess_pil_image(np.asarray(img)) == preprocess_pil_image(img)
+
+
+def test_pdf_pages_are_not_png_encoded(monkeypatch):
+    saved_formats = []
+    original_save = Image.Image.save
+
+    def tracking_save(self, fp, format=None, **params):
+        saved_formats.append(format)
+        return original_save(self, fp, format=format, **params)
+
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", lambda *_a, **_k: [_page(), _page()])
+    monkeypatch.setattr(Image.Image, "save", tracking_save)
+
+    prepared = asyncio.run(convert_pipeline.prepare_pages(b"%PDF-1.4 fake", "pdf"))
+
+    assert len(prepared) == 2
+    assert saved_formats == ["JPEG", "JPEG"]
+
+
+def test_numpy_batch_matches_pil_path_for_pdf_pages():
+    pages = [_page(size=(600, 800)), _page(size=(500, 500)), _page(size=(600, 800))]
+    pages[1] = pages[1].rotate(30, fillcolor=255)
+
+    batch = preprocess_page_batch(pages, pre_contrast=PDF_CONTRAST_FACTOR)
+    expected = [
+        preprocess_pil_image(ImageEnhance.Contrast(page).enhance(PDF_CONTRAST_FACTOR))
+        for page in pages
+    ]
+
+    assert batch == expected
+
+
+def test_numpy_engine_reduces_color_uploads_to_grayscale():
+    img = Image.new("RGB", (300, 200), color=(250, 240, 220))
+    ImageDraw.Draw(img).line((10, 20, 280, 150), fill=(20, 40, 200), width=5)
+
+    assert preprocess_image(_png_bytes(img), engine="numpy") == preprocess_pil_image(img.convert("L"))
+
+
+def test_pipeline_batches_pdf_pages_with_numpy_engine(monkeypatch):
+    calls = {}
+
+    def fake_pdf_to_images(*_args, contrast, **_kwargs):
+        calls["contrast"] = contrast
+        return [_page(), _page()]
+
+    def fake_batch(images, pre_contrast=None):
+        calls["batch"] = (len(images), pre_contrast)
+        return [EncodedImage(b"jpeg", "L", 200, 200, 90)] * len(images)
+
+    monkeypatch.setattr(convert_pipeline, "PREPROCESS_ENGINE", "numpy")
+    monkeypatch.setattr(convert_pipeline, "pdf_to_images", fake_pdf_to_images)
+    monkeypatch.setattr(convert_pipeline, "preprocess_page_batch", fake_batch)
+
+    prepared = asyncio.run(convert_pipeline.prepare_pages(b"%PDF-1.4 fake", "pdf"))
+
+    assert [page.image for page in prepared] == [b"jpeg", b"jpeg"]
+    assert calls == {"contrast": None, "batch": (2, PDF_CONTRAST_FACTOR)}
+
+
+def _busy_page(mode="L", size=(1448, 2048), seed=0):
+    rng = random.Random(seed)
+    img = Image.new(mode, size, color="white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(1500):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.line((x, y, x + rng.randrange(-60, 60), y + rng.randrange(-20, 20)), fill="black", width=3)
+    return img
+
+
+def test_encoder_uses_grayscale_and_full_quality_when_it_fits():
+    encoded = encode_image(_page("RGB"), byte_budget=300_000)
+
+    assert encoded.params() == {
+        "mode": "L",
+        "width": 600,
+        "height": 800,
+        "quality": JPEG_QUALITY,
+        "bytes": len(encoded.data),
+    }
+    assert Image.open(io.BytesIO(encoded.data)).mode == "L"
+
+
+def test_encoder_keeps_color_pages_in_rgb():
+    img = _page("RGB")
+    ImageDraw.Draw(img).rectangle((100, 100, 400, 500), fill=(200, 30, 30))
+
+    assert encode_image(img, byte_budget=300_000).mode == "RGB"
+
+
+def test_encoder_lowers_quality_then_resolution_to_meet_budget():
+    page = _busy_page()
+    full = encode_image(page, byte_budget=10_000_000)
+
+    by_quality = encode_image(page, byte_budget=int(len(full.data) * 0.7))
+    assert len(by_quality.data) <= len(full.data) * 0.7
+    assert by_quality.quality < JPEG_QUALITY
+    assert (by_quality.width, by_quality.height) == (1448, 2048)
+
+    floor = _jpeg_size(page, MIN_JPEG_QUALITY)
+    by_size = encode_image(page, byte_budget=int(floor * 0.6))
+    assert len(by_size.data) <= floor * 0.6
+    assert by_size.height < 2048
+
+
+def test_encoder_stops_at_min_size_when_budget_is_unreachable():
+    encoded = encode_image(_busy_page(), byte_budget=1000)
+
+    assert encoded.quality == MIN_JPEG_QUALITY
+    assert max(encoded.width, encoded.height) >= MIN_ENCODE_SIZE
+
+
+def test_zero_budget_keeps_fixed_rgb_encoding():
+    encoded = encode_image(_page(), byte_budget=0)
+
+    assert (encoded.mode, encoded.quality) == ("RGB", JPEG_QUALITY)
+
+
+def test_convert_response_reports_page_encoding(monkeypatch):
+    monkeypatch.setattr(
+        convert_pipeline,
+        "convert_image_to_latex",
+        lambda *_a, **_k: "\\begin{document}\nbody\n\\end{document}",
+    )
+
+    resp = TestClient(app).post(
+        "/api/convert",
+        files={"file": ("page.png", io.BytesIO(_png_bytes(_page())), "image/png")},
+    )
+
+    encoding = resp.json()["pages"][0]["encoding"]
+    assert encoding["mode"] == "L"
+    assert (encoding["width"], encoding["height"]) == (600, 800)
+    assert encoding["quality"] == JPEG_QUALITY
+    assert 0 < encoding["bytes"] <= PAGE_BYTE_BUDGET
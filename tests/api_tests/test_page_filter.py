@@ -0,0 +1,199 @@
+import io
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.main import app  # noqa: E402
+from app.utils.page_filter import BLANK_MIN_INK_PIXELS, find_skippable_pages, page_ink  # noqa: E402
+from support.pages import fake_pages  # noqa: E402
+
+SCANS = ROOT / "tests" / "image_tests" / "out"
+# pdf_to_images renders a letter page at this size.
+RENDERED = (1583, 2048)
+PAPER = 245
+
+
+def _notes_page(seed, size=(600, 800)):
+    # Lined paper with rows of pen strokes, different per seed.
+    rng = random.Random(seed)
+    img = Image.new("L", size, color=PAPER)
+    draw = ImageDraw.Draw(img)
+    for row in range(60, size[1] - 40, 30):
+        draw.line((30, row, size[0] - 30, row), fill=200, width=1)
+        x = 40
+        while x < size[0] - 60 and rng.random() > 0.04:
+            width = rng.randrange(5, 20)
+            draw.line((x, row - 12 + rng.randrange(5), x + width, row - rng.randrange(10)), fill=30, width=2)
+            x += width + rng.randrange(2, 8)
+    return img
+
+
+def _copy(img, seed):
+    # The same page again: re-encoded as JPEG, darker, noisy, a pixel off.
+    noise = np.random.default_rng(seed).normal(0, 6, img.size[::-1])
+    img = img.transform(img.size, Image.AFFINE, (1, 0, 1, 0, 1, -1), fillcolor=PAPER)
+    img = ImageEnhance.Brightness(img).enhance(0.93)
+    pixels = np.clip(np.asarray(img, dtype=np.float64) + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=85)
+    return Image.open(buf)
+
+
+def _rescan(img, seed):
+    # Same sheet scanned again: slightly rotated and shifted, darker, noisy.
+    noise = np.random.default_rng(seed).normal(0, 6, img.size[::-1])
+    img = img.rotate(0.7, fillcolor=PAPER).transform(
+        img.size, Image.AFFINE, (1, 0, 4, 0, 1, -3), fillcolor=PAPER
+    )
+    img = ImageEnhance.Brightness(img).enhance(0.93)
+    pixels = np.clip(np.asarray(img, dtype=np.float64) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def _handwritten_lines(page, top, bottom):
+    # A real scanned page rendered at RENDERED with only rows top..bottom
+    # (of its 3300) kept: a page with a couple of lines of notes on it.
+    scan = Image.open(SCANS / f"page_{page}.png").convert("L").resize(RENDERED, Image.BOX)
+    pixels = np.asarray(scan)
+    sparse = np.full_like(pixels, int(np.percentile(pixels, 90)))
+    top, bottom = (RENDERED[1] * row // 3300 for row in (top, bottom))
+    sparse[300 : 300 + bottom - top] = pixels[top:bottom]
+    return Image.fromarray(sparse)
+
+
+def _two_lines():
+    return [_handwritten_lines(3, 200, 520), _handwritten_lines(4, 150, 420), _handwritten_lines(5, 500, 720)]
+
+
+def _equation(text, y=300):
+    img = Image.new("L", RENDERED, color=255)
+    ImageDraw.Draw(img).text((100, y), text, fill=0, font=ImageFont.load_default(size=60))
+    return img
+
+
+def _blank_back(seed):
+    # Back of a sheet: paper grain and faint bleed-through, no real ink.
+    img = Image.new("L", (600, 800), color=PAPER)
+    ImageDraw.Draw(img).line((50, 100, 500, 120), fill=215, width=2)
+    noise = np.random.default_rng(seed).normal(0, 4, (800, 600))
+    return Image.fromarray(np.clip(np.asarray(img) + noise, 0, 255).astype(np.uint8))
+
+
+def _sparse_page(y):
+    # A single equation line; distinct pages differ only in where it sits.
+    img = Image.new("L", (600, 800), color=255)
+    ImageDraw.Draw(img).line((60, y, 400, y + 10), fill=0, width=4)
+    return img
+
+
+def test_page_ink_separates_blank_backs_from_sparse_notes():
+    assert page_ink(_blank_back(0)).sum() < BLANK_MIN_INK_PIXELS
+    for page in _two_lines() + [_equation("f(x) = x^2 + 3x - 4")]:
+        assert page_ink(page).sum() > 10 * BLANK_MIN_INK_PIXELS
+
+
+def test_blank_and_copied_pages_are_skipped():
+    note = _notes_page(1)
+    pages = [note, _blank_back(2), _copy(note, 3), _notes_page(4)]
+
+    skips = find_skippable_pages(pages, [1, 2, 3, 4])
+
+    assert skips[0] is None
+    assert skips[1] == {"reason": "blank", "ink_pixels": 0}
+    assert skips[2] == {"reason": "duplicate", "duplicate_of": 1}
+    assert skips[3] is None
+
+
+def test_copies_of_sparse_pages_are_skipped():
+    pages = _two_lines()
+    copies = [_copy(page, seed) for seed, page in enumerate(pages)]
+
+    skips = find_skippable_pages(pages + copies, range(1, 7))
+
+    assert skips == [None] * 3 + [{"reason": "duplicate", "duplicate_of": page} for page in (1, 2, 3)]
+
+
+def test_sparse_pages_are_kept():
+    pages = _two_lines() + [_equation("f(x) = x^2 + 3x - 4"), _equation("g(x) = x^2 - 3x + 4")]
+
+    assert find_skippable_pages(pages, range(1, 6)) == [None] * 5
+
+
+def test_pages_with_the_same_layout_are_kept():
+    # Same size, lines in the same places, a little longer on each page.
+    def ruled(page, lines):
+        img = Image.new("L", (1448, 2048), color=255)
+        draw = ImageDraw.Draw(img)
+        step = 1988 // lines
+        for row in range(lines):
+            y = 30 + row * step
+            draw.line((10, y, 1086 + 10 * page + 5 * row, y + step // 2), fill=0, width=4)
+        return img
+
+    for lines in range(3, 9):
+        assert find_skippable_pages([ruled(page, lines) for page in range(4)], range(1, 5)) == [None] * 4
+    assert find_skippable_pages(fake_pages(4, (1448, 2048), lines=8), range(1, 5)) == [None] * 4
+
+
+def test_distinct_and_rescanned_pages_are_kept():
+    dense = [_notes_page(seed) for seed in range(5)]
+    sparse = [_sparse_page(y) for y in (100, 300, 500, 700)]
+    note = _notes_page(6)
+
+    assert find_skippable_pages(dense, range(1, 6)) == [None] * 5
+    assert find_skippable_pages(sparse, range(1, 5)) == [None] * 4
+    # A rotated rescan cannot be told from a page with other writing on it
+    # without risking real pages, so it is converted again.
+    assert find_skippable_pages([note, _rescan(note, 7)], [1, 2]) == [None, None]
+
+
+def test_convert_reports_skipped_pages(monkeypatch):
+    note = _notes_page(5)
+    calls = []
+
+    def fake_gemini(image_bytes, context="general"):
+        calls.append(image_bytes)
+        return f"\\begin{{document}}\nPage {len(calls)}\n\\end{{document}}"
+
+    monkeypatch.setattr("app.services.convert_pipeline.PAGE_FILTER_ENABLED", True)
+    monkeypatch.setattr(
+        "app.services.convert_pipeline.pdf_to_images",
+        lambda *_a, **_k: [note, _blank_back(6), _copy(note, 7), _notes_page(8)],
+    )
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake_gemini)
+
+    resp = TestClient(app).post(
+        "/api/convert",
+        files={"file": ("notes.pdf", io.BytesIO(b"%PDF-1.4 fake"), "application/pdf")},
+    )
+
+    payload = resp.json()
+    assert resp.status_code == 200
+    assert len(calls) == 2
+    assert [p["page"] for p in payload["pages"]] == [1, 4]
+    assert [(s["page"], s["reason"]) for s in payload["skipped_pages"]] == [(2, "blank"), (3, "duplicate")]
+    assert payload["skipped_pages"][1]["duplicate_of"] == 1
+
+
+def test_convert_keeps_distinct_sparse_pages(monkeypatch, fake_pdf, post_pdf):
+    calls = []
+
+    def fake_gemini(image_bytes, context="general"):
+        calls.append(image_bytes)
+        return f"\\begin{{document}}\nPage {len(calls)}\n\\end{{document}}"
+
+    monkeypatch.setattr("app.services.convert_pipeline.PAGE_FILTER_ENABLED", True)
+    monkeypatch.setattr("app.services.convert_pipeline.convert_image_to_latex", fake_gemini)
+    fake_pdf(4, size=(1448, 2048), lines=3)
+
+    payload = post_pdf().json()
+
+    assert len(calls) == 4
+    assert payload["skipped_pages"] == []
@@ -0,0 +1,285 @@
+"""
+Load test for POST /api/convert, fully offline.
+
+Starts the app under uvicorn in a separate process, pointed at the local fake
+Gemini server (configurable latency, error rate and output size) with Clerk
+replaced by tests/support/fake_clerk.py, then sends concurrent PDF and image
+uploads built from tests/api_tests/Hand_written_notes. Prints (and optionally
+writes) JSON with p50/p95/p99 latency, throughput and the server's peak RSS;
+pass an earlier result as --baseline to add the relative change.
+
+The conversion cache is off and the Gemini request-rate bucket disabled by
+default, so every request does the full pipeline; uploads repeat, so some
+pages still share an in-flight Gemini call (convert_coalesced_pages in
+server_counters). Requires poppler
+(pdftoppm/pdfinfo) for the PDF uploads and to render the image uploads.
+
+    python tests/benchmarks/bench_convert_load.py --requests 200 --concurrency 16
+    python tests/benchmarks/bench_convert_load.py --gemini-latency 1.5 --error-rate 0.05 \\
+        --output load.json --baseline previous-load.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from support.fake_clerk import FAKE_CLERK_ENV  # noqa: E402
+from support.fake_gemini import DEFAULT_LATEX, run_fake_gemini  # noqa: E402
+
+NOTES_DIR = ROOT / "tests" / "api_tests" / "Hand_written_notes"
+# Compared against --baseline; for the latencies and RSS lower is better.
+COMPARED = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb")
+
+
+def _latex_of_size(chars):
+    """A canned Gemini answer padded to roughly `chars` characters."""
+    if chars <= len(DEFAULT_LATEX):
+        return DEFAULT_LATEX
+    line = "$\\int_0^1 x^2 \\, dx = \\frac{1}{3}$ and $\\sum_{n=1}^{\\infty} \\frac{1}{n^2} = \\frac{\\pi^2}{6}$\n"
+    head, tail = DEFAULT_LATEX.rsplit("\\end{document}", 1)
+    filler = line * ((chars - len(DEFAULT_LATEX)) // len(line) + 1)
+    return head + filler + "\\end{document}" + tail
+
+
+def _uploads(kinds):
+    """(kind, filename, bytes, content type) for each note: the PDF and its first page as JPEG."""
+    uploads = []
+    for pdf in sorted(NOTES_DIR.glob("*.pdf")):
+        if "pdf" in kinds:
+            uploads.append(("pdf", pdf.name, pdf.read_bytes(), "application/pdf"))
+        if "image" in kinds:
+            from app.utils.pdf import pdf_to_images
+
+            buf = io.BytesIO()
+            pdf_to_images(str(pdf), dpi=150, max_pages=1)[0].convert("RGB").save(buf, format="JPEG", quality=90)
+            uploads.append(("image", pdf.stem + ".jpg", buf.getvalue(), "image/jpeg"))
+    return uploads
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(port, env, stop, results):
+    # Runs in the server process: fake Clerk, then the app under uvicorn
+    # until `stop` is set. Reports RSS once started and at exit.
+    os.environ.update(env)
+    from support.fake_clerk import install_fake_clerk
+
+    install_fake_clerk()
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    )
+
+    def watch():
+        while not server.started and not stop.is_set():
+            time.sleep(0.05)
+        results.put({"startup_rss_mb": _peak_rss_mb()})
+        stop.wait()
+        server.should_exit = True
+
+    threading.Thread(target=watch, daemon=True).start()
+    server.run()
+    results.put({"peak_rss_mb": _peak_rss_mb()})
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in KiB on Linux.
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))], 1)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 1),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1], 1),
+    }
+
+
+async def _drive(base_url, uploads, total, concurrency, headers, context):
+    samples = []
+    next_index = 0
+
+    async def worker(client):
+        nonlocal next_index
+        while next_index < total:
+            kind, name, data, content_type = uploads[next_index % len(uploads)]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                resp = await client.post(
+                    "/api/convert",
+                    params={"context": context},
+                    files={"file": (name, data, content_type)},
+                )
+                status = resp.status_code
+                pages = len(resp.json().get("pages", [])) if status == 200 else 0
+            except httpx.HTTPError as exc:
+                status, pages = type(exc).__name__, 0
+            samples.append((kind, status, pages, (time.perf_counter() - started) * 1000))
+
+    limits = httpx.Limits(max_connections=concurrency)
+    timeout = httpx.Timeout(300.0)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return samples, time.perf_counter() - started
+
+
+def _wait_until_up(base_url, proc, timeout_s=60):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if not proc.is_alive():
+            raise SystemExit("server process exited during startup")
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit("server did not start")
+
+
+def _compare(result, baseline):
+    changes = {}
+    for name in COMPARED:
+        before, after = baseline.get(name), result.get(name)
+        if before and after is not None:
+            changes[name] = round((after - before) / before * 100, 1)
+    return {"change_pct": changes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=4, help="requests sent before measuring")
+    parser.add_argument("--kinds", default="pdf,image", help="upload kinds to mix: pdf, image")
+    parser.add_argument("--context", default="general")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="seconds per Gemini request")
+    parser.add_argument("--gemini-latency-per-image", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Gemini requests failed")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--output-chars", type=int, default=len(DEFAULT_LATEX), help="size of each Gemini answer")
+    parser.add_argument("--gemini-rpm", type=float, default=0, help="GEMINI_REQUESTS_PER_MINUTE (0 = unlimited)")
+    parser.add_argument("--cache", action="store_true", help="keep the conversion cache on")
+    parser.add_argument("--output", type=Path, help="also write the JSON result here")
+    parser.add_argument("--baseline", type=Path, help="earlier result to compare against")
+    args = parser.parse_args()
+
+    kinds = {kind.strip() for kind in args.kinds.split(",") if kind.strip()}
+    uploads = _uploads(kinds)
+    if not uploads:
+        raise SystemExit(f"no uploads for kinds {sorted(kinds)} in {NOTES_DIR}")
+
+    fake = run_fake_gemini(
+        latency_s=args.gemini_latency,
+        latency_per_image_s=args.gemini_latency_per_image,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        text=_latex_of_size(args.output_chars),
+    )
+    with fake as gemini_server, tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {
+            **FAKE_CLERK_ENV,
+            "GEMINI_API_KEY": "load-test-key",
+            "GEMINI_BASE_URL": gemini_server.base_url,
+            "GEMINI_REQUESTS_PER_MINUTE": str(args.gemini_rpm),
+            "CONVERT_CACHE_ENABLED": "1" if args.cache else "0",
+            "CONVERT_CACHE_DIR": str(Path(workdir) / "convert-cache"),
+            "DATABASE_URL": f"sqlite:///{Path(workdir) / 'load.db'}",
+        }
+        ctx = multiprocessing.get_context("spawn")
+        stop = ctx.Event()
+        results = ctx.Queue()
+        proc = ctx.Process(target=_serve, args=(port, env, stop, results))
+        proc.start()
+        try:
+            _wait_until_up(base_url, proc)
+            from support.fake_clerk import FAKE_CLERK_TOKEN
+
+            headers = {"Authorization": f"Bearer {FAKE_CLERK_TOKEN}"}
+            if args.warmup:
+                asyncio.run(_drive(base_url, uploads, args.warmup, min(args.warmup, args.concurrency), headers, args.context))
+            gemini_requests_before = len(gemini_server.requests)
+            samples, wall_s = asyncio.run(
+                _drive(base_url, uploads, args.requests, args.concurrency, headers, args.context)
+            )
+            server_metrics = httpx.get(f"{base_url}/api/metrics", timeout=5).json()
+        finally:
+            stop.set()
+            proc.join(30)
+            if proc.is_alive():
+                proc.terminate()
+        rss = {}
+        while not results.empty():
+            rss.update(results.get())
+        gemini_requests = len(gemini_server.requests) - gemini_requests_before
+
+    ok = [sample for sample in samples if sample[1] == 200]
+    result = {
+        "config": {
+            key: (str(value) if isinstance(value, Path) else value)
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        "requests": len(samples),
+        "ok": len(ok),
+        "statuses": {str(status): count for status, count in Counter(s[1] for s in samples).items()},
+        **{key: value for key, value in _percentiles([s[3] for s in ok]).items() if key != "count"},
+        "by_kind": {kind: _percentiles([s[3] for s in ok if s[0] == kind]) for kind in sorted(kinds)},
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(len(ok) / wall_s, 2),
+        "pages_per_s": round(sum(s[2] for s in ok) / wall_s, 2),
+        "gemini_requests": gemini_requests,
+        "startup_rss_mb": rss.get("startup_rss_mb"),
+        "peak_rss_mb": rss.get("peak_rss_mb"),
+        "server_counters": server_metrics.get("counters", {}),
+    }
+    if args.baseline:
+        result["baseline"] = _compare(result, json.loads(args.baseline.read_text()))
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
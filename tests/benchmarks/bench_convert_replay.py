@@ -0,0 +1,111 @@
+"""
+Convert pipeline stage timings against recorded Gemini answers, offline.
+
+Record once with a live key (real model output for every page of
+tests/api_tests/Hand_written_notes is saved as a cassette), then replay as
+often as needed without network or quota:
+
+    GEMINI_API_KEY=... python tests/benchmarks/bench_convert_replay.py --record
+    python tests/benchmarks/bench_convert_replay.py --repeat 5 --output after.json --baseline before.json
+
+Each PDF goes through prepare_pages and convert_pages in-process with the
+conversion cache off, so every page is rasterized, preprocessed, sent through
+the replay transport and post-processed. Gemini time is whatever
+--replay-latency simulates (none by default), which isolates the local
+stages. Pages whose preprocessed bytes changed since recording are matched to
+the nearest recorded page (cassette.nearest); cassette.miss means a page has
+no recording, so re-record. Requires poppler (pdftoppm/pdfinfo).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.services import convert_pipeline, gemini, gemini_transport  # noqa: E402
+from app.services.cache import ConversionCache  # noqa: E402
+from app.services.metrics import StageTimer, metrics  # noqa: E402
+
+NOTES_DIR = ROOT / "tests" / "api_tests" / "Hand_written_notes"
+CASSETTES = ROOT / "tests" / "benchmarks" / "cassettes" / "gemini"
+
+
+async def _convert(pdf: Path, context: str) -> dict:
+    timer = StageTimer()
+    prepared = await convert_pipeline.prepare_pages(str(pdf), "pdf", timer=timer)
+    with timer.stage("gemini"):
+        results = await convert_pipeline.convert_pages(prepared, context)
+    with timer.stage("assemble"):
+        convert_pipeline.assemble_document(results)
+    timer.add("postprocess", sum(result.timings["postprocess"] for result in results))
+    return {"pages": len(results), "timings_ms": timer.finish()}
+
+
+def _summary(runs):
+    stages = {}
+    for run in runs:
+        for stage, ms in run["timings_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    return {stage: round(statistics.median(values), 1) for stage, values in stages.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--record", action="store_true", help="call Gemini (needs GEMINI_API_KEY) and save answers")
+    parser.add_argument("--cassettes", type=Path, default=CASSETTES)
+    parser.add_argument("--repeat", type=int, default=3, help="replay passes per PDF")
+    parser.add_argument("--context", default="general")
+    parser.add_argument("--replay-latency", default="", help='"recorded", seconds per response, or empty for none')
+    parser.add_argument("--output", type=Path, help="also write the JSON result here")
+    parser.add_argument("--baseline", type=Path, help="earlier result to compare stage medians against")
+    args = parser.parse_args()
+
+    pdfs = sorted(NOTES_DIR.glob("*.pdf"))
+    if args.record and not os.getenv("GEMINI_API_KEY"):
+        raise SystemExit("--record needs GEMINI_API_KEY")
+    os.environ.setdefault("GEMINI_API_KEY", "replay-key")
+    gemini_transport.GEMINI_TRANSPORT = "record" if args.record else "replay"
+    gemini_transport.GEMINI_CASSETTE_DIR = str(args.cassettes)
+    gemini_transport.GEMINI_REPLAY_LATENCY = args.replay_latency
+    convert_pipeline.conversion_cache = ConversionCache(memory_entries=0, disk_dir=None)
+    gemini.close_client()
+
+    runs = {}
+    for pdf in pdfs:
+        for _ in range(1 if args.record else args.repeat):
+            runs.setdefault(pdf.name, []).append(asyncio.run(_convert(pdf, args.context)))
+    gemini.close_client()
+
+    result = {
+        "mode": "record" if args.record else "replay",
+        "cassettes": str(args.cassettes),
+        "cassette": {
+            match: metrics.counter("gemini_cassette", result=match)
+            for match in ("recorded", "exact", "nearest", "miss")
+        },
+        "pages": {name: pdf_runs[0]["pages"] for name, pdf_runs in runs.items()},
+        "stage_median_ms": {name: _summary(pdf_runs) for name, pdf_runs in runs.items()},
+        "overall_median_ms": _summary([run for pdf_runs in runs.values() for run in pdf_runs]),
+    }
+    if args.baseline:
+        before = json.loads(args.baseline.read_text())["overall_median_ms"]
+        result["change_pct"] = {
+            stage: round((ms - before[stage]) / before[stage] * 100, 1)
+            for stage, ms in result["overall_median_ms"].items()
+            if before.get(stage)
+        }
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
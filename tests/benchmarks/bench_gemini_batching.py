@@ -0,0 +1,91 @@
+"""
+Per-page vs batched Gemini requests: wall time, request count and token cost
+for converting one upload, at several GEMINI_PAGE_BATCH_SIZE values.
+
+Runs the convert pipeline against the local fake Gemini endpoint, which
+charges a fixed per-request latency plus a per-image latency.
+
+    python tests/benchmarks/bench_gemini_batching.py --pages 5 --batch-sizes 1,2,5
+    python tests/benchmarks/bench_gemini_batching.py --request-latency 0.8 --image-latency 0.3
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.services import convert_pipeline, gemini  # noqa: E402
+from app.services.cache import ConversionCache  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from support.fake_gemini import run_fake_gemini  # noqa: E402
+
+
+def _pages(count):
+    pages = []
+    for number in range(1, count + 1):
+        img = Image.new("L", (600, 800), color=255)
+        ImageDraw.Draw(img).text((40, 40), f"page {number}", fill=0)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=90)
+        pages.append(convert_pipeline.PreparedPage(page=number, image=buf.getvalue(), encoding={}))
+    return pages
+
+
+def _run(pages, batch_size, server):
+    convert_pipeline.GEMINI_PAGE_BATCH_SIZE = batch_size
+    mode = "batch" if batch_size > 1 else "page"
+    metrics.reset()
+    server.requests.clear()
+
+    started = time.perf_counter()
+    asyncio.run(convert_pipeline.convert_pages(pages, "math"))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "wall_ms": round(elapsed * 1000, 1),
+        "requests": len(server.requests),
+        "prompt_tokens": metrics.counter("gemini_prompt_tokens", mode=mode),
+        "output_tokens": metrics.counter("gemini_output_tokens", mode=mode),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--batch-sizes", default="1,2,5")
+    parser.add_argument("--request-latency", type=float, default=0.5)
+    parser.add_argument("--image-latency", type=float, default=0.15)
+    parser.add_argument("--concurrency", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+    convert_pipeline.conversion_cache = ConversionCache(memory_entries=0, disk_dir=None)
+    convert_pipeline.CONVERT_PAGE_CONCURRENCY = args.concurrency
+    pages = _pages(args.pages)
+
+    results = {}
+    with run_fake_gemini(
+        latency_s=args.request_latency,
+        latency_per_image_s=args.image_latency,
+    ) as server:
+        gemini.GEMINI_BASE_URL = server.base_url
+        gemini.close_client()
+        for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+            results[f"batch_size_{batch_size}"] = _run(pages, batch_size, server)
+        gemini.close_client()
+
+    print(json.dumps({"pages": args.pages, "concurrency": args.concurrency, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Per-call overhead of the Gemini client: one client per call vs the shared client.
+
+Runs against the local fake Gemini endpoint, so the numbers are pure client
+construction + connection setup + request overhead.
+
+    python tests/benchmarks/bench_gemini_client.py --calls 200
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from google import genai  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from app.services import gemini  # noqa: E402
+from support.fake_gemini import run_fake_gemini  # noqa: E402
+
+
+def _jpeg_bytes():
+    buf = io.BytesIO()
+    Image.new("RGB", (256, 256), color="white").save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _per_call_client(image_bytes, context="general"):
+    # The original implementation: new client, prompt and config on every page.
+    client = genai.Client(
+        api_key=os.environ["GEMINI_API_KEY"],
+        http_options=types.HttpOptions(base_url=gemini.GEMINI_BASE_URL),
+    )
+    response = client.models.generate_content(
+        model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+        contents=[
+            types.Part.from_bytes(
+                data=image_bytes,
+                mime_type="image/jpeg",
+            ),
+        ],
+        config=types.GenerateContentConfig(
+            system_instruction=gemini.get_system_prompt(context),
+        ),
+    )
+    return response.text
+
+
+def _measure(func, image, calls):
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        func(image, context="math")
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _summary(timings, connections):
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(statistics.median(timings), 3),
+        "connections": connections,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+    image = _jpeg_bytes()
+    results = {}
+
+    with run_fake_gemini() as server:
+        gemini.GEMINI_BASE_URL = server.base_url
+        gemini.close_client()
+
+        _measure(_per_call_client, image, 5)
+        server.connections = 0
+        results["per_call_client"] = _summary(
+            _measure(_per_call_client, image, args.calls), server.connections
+        )
+
+        _measure(gemini.convert_image_to_latex, image, 5)
+        server.connections = 0
+        results["shared_client"] = _summary(
+            _measure(gemini.convert_image_to_latex, image, args.calls), server.connections
+        )
+        gemini.close_client()
+
+    before = results["per_call_client"]["mean_ms"]
+    after = results["shared_client"]["mean_ms"]
+    results["saved_per_call_ms"] = round(before - after, 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Body-only vs full-document Gemini output: output tokens and latency per page.
+
+Replays a recorded Gemini answer (tests/api_tests/out/response.tex by
+default) from the local fake endpoint: the full document when the prompt asks
+for one, its body when the prompt asks for the body only. Generation time is
+modelled as a fixed per-request latency plus a per-output-token latency, so
+the saving comes only from the tokens not generated. Also checks that both
+modes assemble the same document.
+
+    python tests/benchmarks/bench_gemini_output_mode.py --pages 5
+    python tests/benchmarks/bench_gemini_output_mode.py --token-latency 0.008 --recorded my_page.tex
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+sys.path.insert(0, str(ROOT / "tests"))
+
+from app.services import convert_pipeline, gemini  # noqa: E402
+from app.services.cache import ConversionCache  # noqa: E402
+from app.services.latex import extract_document_body  # noqa: E402
+from app.services.metrics import metrics  # noqa: E402
+from support.fake_gemini import run_fake_gemini  # noqa: E402
+
+RECORDED = ROOT / "tests" / "api_tests" / "out" / "response.tex"
+
+
+def _pages(count):
+    pages = []
+    for number in range(1, count + 1):
+        img = Image.new("L", (600, 800), color=255)
+        ImageDraw.Draw(img).text((40, 40), f"page {number}", fill=0)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=90)
+        pages.append(convert_pipeline.PreparedPage(page=number, image=buf.getvalue(), encoding={}))
+    return pages
+
+
+def _run(pages, mode):
+    gemini.GEMINI_OUTPUT_MODE = mode
+    metrics.reset()
+    results = asyncio.run(convert_pipeline.convert_pages(pages, "math"))
+    page_ms = metrics.snapshot()["timings"]["gemini_page_ms{mode=page}"]
+    summary = {
+        "output_tokens_per_page": metrics.counter("gemini_output_tokens", mode="page") / len(pages),
+        "prompt_tokens_per_page": metrics.counter("gemini_prompt_tokens", mode="page") / len(pages),
+        "page_ms_mean": page_ms["mean"],
+        "page_ms_p50": page_ms["p50"],
+    }
+    return summary, convert_pipeline.assemble_document(results)[0]
+
+
+def _reduction(before, after):
+    return round((before - after) / before * 100, 1) if before else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--recorded", type=Path, default=RECORDED, help="a recorded full-document answer")
+    parser.add_argument("--request-latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.004, help="seconds per output token")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+    convert_pipeline.conversion_cache = ConversionCache(memory_entries=0, disk_dir=None)
+    convert_pipeline.GEMINI_PAGE_BATCH_SIZE = 1
+    document = args.recorded.read_text(encoding="utf-8")
+    pages = _pages(args.pages)
+
+    results = {}
+    with run_fake_gemini(
+        text=document,
+        body_text=extract_document_body(document),
+        latency_s=args.request_latency,
+        latency_per_output_token_s=args.token_latency,
+    ) as server:
+        gemini.GEMINI_BASE_URL = server.base_url
+        gemini.close_client()
+        results["document"], document_latex = _run(pages, "document")
+        results["body"], body_latex = _run(pages, "body")
+        gemini.close_client()
+
+    before, after = results["document"], results["body"]
+    print(
+        json.dumps(
+            {
+                "pages": args.pages,
+                "recorded": str(args.recorded),
+                **results,
+                "output_token_reduction_pct": _reduction(
+                    before["output_tokens_per_page"], after["output_tokens_per_page"]
+                ),
+                "page_latency_reduction_pct": _reduction(before["page_ms_mean"], after["page_ms_mean"]),
+                "saved_ms_per_page": round(before["page_ms_mean"] - after["page_ms_mean"], 1),
+                "same_document": document_latex == body_latex,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+PDF rasterization cost: fixed 300 DPI render + downscale vs rendering at the
+DPI that fits MAX_SIZE.
+
+Each mode runs in a fresh process so peak RSS is not shared between them.
+Requires poppler (pdftoppm/pdfinfo).
+
+    python tests/benchmarks/bench_pdf_render.py
+    python tests/benchmarks/bench_pdf_render.py path/to/other.pdf
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+NOTES_DIR = ROOT / "tests" / "api_tests" / "Hand_written_notes"
+MAX_PAGES = 5
+
+
+def _render_fixed_300dpi(pdf_path):
+    # The original pdf_to_images: whole document at 300 DPI, then keep 5 pages.
+    from pdf2image import convert_from_path
+    from PIL import ImageEnhance
+
+    images = convert_from_path(pdf_path, dpi=300, fmt="png", grayscale=True)
+    return [ImageEnhance.Contrast(img).enhance(1.4) for img in images[:MAX_PAGES]]
+
+
+def _render_fit_max_size(pdf_path):
+    from app.utils.image import MAX_SIZE
+    from app.utils.pdf import pdf_to_images
+
+    return pdf_to_images(pdf_path, max_pages=MAX_PAGES, max_size=MAX_SIZE)
+
+
+MODES = {
+    "fixed_300dpi": _render_fixed_300dpi,
+    "fit_max_size": _render_fit_max_size,
+}
+
+
+def _run_mode(mode, pdf_path, queue):
+    from app.utils.image import preprocess_image
+
+    started = time.perf_counter()
+    images = MODES[mode](pdf_path)
+    rendered = time.perf_counter()
+
+    for img in images:
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        preprocess_image(buf.getvalue())
+    finished = time.perf_counter()
+
+    queue.put(
+        {
+            "pages": len(images),
+            "rendered_size": list(images[0].size) if images else None,
+            "render_ms": round((rendered - started) * 1000, 1),
+            "preprocess_ms": round((finished - rendered) * 1000, 1),
+            "total_ms": round((finished - started) * 1000, 1),
+            # ru_maxrss is reported in KiB on Linux.
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+    )
+
+
+def _measure(mode, pdf_path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_mode, args=(mode, str(pdf_path), queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdfs", nargs="*", type=Path)
+    args = parser.parse_args()
+
+    pdfs = args.pdfs or sorted(NOTES_DIR.glob("*.pdf"))
+    report = {}
+    for pdf_path in pdfs:
+        report[pdf_path.name] = {mode: _measure(mode, pdf_path) for mode in MODES}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
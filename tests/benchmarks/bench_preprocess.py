@@ -0,0 +1,171 @@
+"""
+Per-page preprocessing cost of rendered PDF pages:
+
+- render_png vs render_ppm: the renderer's output format, as pdf_to_images
+  receives it from poppler (PNG encode + decode vs raw PGM write + parse).
+  With --pdf, also times convert_from_path on that file in both formats.
+- png_round_trip vs image_native: PNG encode + preprocess_image (the original
+  path) vs handing the page straight to preprocess_pil_image.
+- pil_engine vs numpy_batch: render contrast boost + preprocess_pil_image per
+  page vs preprocess_page_batch over the whole stack, with an output check.
+
+Uses synthetic grayscale pages at render size, so it needs no poppler
+unless --pdf is given.
+
+    python tests/benchmarks/bench_preprocess.py --pages 20
+    python tests/benchmarks/bench_preprocess.py --size 2480x3508
+    python tests/benchmarks/bench_preprocess.py --pdf tests/image_tests/test_notes.pdf
+"""
+
+import argparse
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.utils.image import preprocess_image, preprocess_page_batch, preprocess_pil_image  # noqa: E402
+from app.utils.pdf import PDF_CONTRAST_FACTOR  # noqa: E402
+
+
+def _synthetic_page(size, seed):
+    # Random pen strokes so PNG compression has realistic work to do.
+    rng = random.Random(seed)
+    img = Image.new("L", size, color=255)
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    for _ in range(400):
+        x, y = rng.randrange(w), rng.randrange(h)
+        draw.line((x, y, x + rng.randrange(-80, 80), y + rng.randrange(-30, 30)), fill=0, width=3)
+    return img
+
+
+def _renderer_output(fmt):
+    # pdftoppm writes each page in `fmt` and pdf2image parses it back.
+    def run(img):
+        buf = io.BytesIO()
+        img.save(buf, format=fmt)
+        Image.open(io.BytesIO(buf.getvalue())).load()
+
+    return run
+
+
+def _render_pdf(pdf_path, fmt, dpi):
+    from pdf2image import convert_from_path
+
+    started = time.perf_counter()
+    pages = convert_from_path(pdf_path, dpi=dpi, fmt=fmt, grayscale=True)
+    elapsed = time.perf_counter() - started
+    return {"pages": len(pages), "total_ms": round(elapsed * 1000, 1)}
+
+
+def _png_round_trip(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return preprocess_image(buf.getvalue())
+
+
+def _pil_engine(pages):
+    return [
+        preprocess_pil_image(ImageEnhance.Contrast(img).enhance(PDF_CONTRAST_FACTOR))
+        for img in pages
+    ]
+
+
+def _numpy_batch(pages):
+    return preprocess_page_batch(pages, pre_contrast=PDF_CONTRAST_FACTOR)
+
+
+def _throughput(func, pages):
+    started = time.perf_counter()
+    encoded = func(pages)
+    elapsed = time.perf_counter() - started
+    return encoded, {
+        "total_ms": round(elapsed * 1000, 1),
+        "pages_per_s": round(len(pages) / elapsed, 2),
+    }
+
+
+def _equivalence(left, right):
+    diffs = [
+        np.abs(
+            np.asarray(Image.open(io.BytesIO(a.data)), dtype=np.int16)
+            - np.asarray(Image.open(io.BytesIO(b.data)), dtype=np.int16)
+        ).max()
+        for a, b in zip(left, right)
+    ]
+    return {
+        "identical_pages": sum(a == b for a, b in zip(left, right)),
+        "max_pixel_diff": int(max(diffs)),
+    }
+
+
+def _timed(func, pages):
+    samples = []
+    for img in pages:
+        started = time.perf_counter()
+        func(img)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "mean_ms": round(statistics.mean(samples), 1),
+        "p50_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--size", default="1448x2048", help="rendered page size, WxH")
+    parser.add_argument("--pdf", help="also render this PDF with poppler in both formats")
+    parser.add_argument("--dpi", type=int, default=200, help="render DPI for --pdf")
+    args = parser.parse_args()
+
+    size = tuple(int(part) for part in args.size.split("x"))
+    pages = [_synthetic_page(size, seed) for seed in range(args.pages)]
+    # Warm up codecs.
+    _png_round_trip(pages[0])
+    preprocess_pil_image(pages[0])
+
+    render_png = _timed(_renderer_output("PNG"), pages)
+    render_ppm = _timed(_renderer_output("PPM"), pages)
+    png = _timed(_png_round_trip, pages)
+    direct = _timed(preprocess_pil_image, pages)
+    pil_out, pil_stats = _throughput(_pil_engine, pages)
+    numpy_out, numpy_stats = _throughput(_numpy_batch, pages)
+    report = {
+        "pages": args.pages,
+        "page_size": list(size),
+        "render_png": render_png,
+        "render_ppm": render_ppm,
+        "render_saved_per_page_ms": round(render_png["mean_ms"] - render_ppm["mean_ms"], 1),
+    }
+    if args.pdf:
+        report["poppler_png"] = _render_pdf(args.pdf, "png", args.dpi)
+        report["poppler_ppm"] = _render_pdf(args.pdf, "ppm", args.dpi)
+    print(
+        json.dumps(
+            {
+                **report,
+                "png_round_trip": png,
+                "image_native": direct,
+                "saved_per_page_ms": round(png["mean_ms"] - direct["mean_ms"], 1),
+                "pil_engine": pil_stats,
+                "numpy_batch": numpy_stats,
+                "equivalence": _equivalence(pil_out, numpy_out),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Image-stage throughput of concurrent PDF uploads, thread pool vs worker
+processes, as the process pool grows:
+
+- thread: CONVERT_CPU_BACKEND=thread (cpu_executor, CONVERT_CPU_WORKERS).
+- process_N: CONVERT_CPU_BACKEND=process with CONVERT_PROCESS_WORKERS=N, for
+  N = 1, 2, 4, ... up to --max-workers (default: cpu count).
+
+Each upload goes through prepare_pages (rasterize, filter, preprocess) with
+model routing off. Rendering is replaced by drawing synthetic pages at render
+size, so it needs no poppler but still costs CPU in the worker that renders.
+Results include pages/s and the speedup over a single worker process; on a
+machine with one core every configuration is expected to be flat.
+
+    python tests/benchmarks/bench_preprocess_scaling.py --uploads 16 --pages 5
+    python tests/benchmarks/bench_preprocess_scaling.py --engine numpy --max-workers 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "src" / "backend"))
+
+from app.services import convert_pipeline  # noqa: E402
+from app.utils import executors  # noqa: E402
+
+PAGE_SIZE = (1448, 2048)
+
+
+def _synthetic_pages(_source, max_pages=None, pages=None, **_kwargs):
+    # Stands in for pdf_to_images; runs wherever rasterization runs.
+    images = []
+    for seed in range(max_pages or 5):
+        rng = random.Random(seed)
+        img = Image.new("L", PAGE_SIZE, color=255)
+        draw = ImageDraw.Draw(img)
+        w, h = PAGE_SIZE
+        for _ in range(400):
+            x, y = rng.randrange(w), rng.randrange(h)
+            draw.line((x, y, x + rng.randrange(-80, 80), y + rng.randrange(-30, 30)), fill=0, width=3)
+        images.append(img)
+    return images
+
+
+async def _run(uploads: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(convert_pipeline.prepare_pages(b"%PDF-1.4 bench", "pdf") for _ in range(uploads)))
+    return time.perf_counter() - started
+
+
+def _measure(backend: str, workers: int, uploads: int, pages: int) -> dict:
+    convert_pipeline.CONVERT_CPU_BACKEND = backend
+    executors.CONVERT_PROCESS_WORKERS = workers
+    executors.shutdown_process_executor()
+    if backend == "process":
+        from app.utils.shared_pages import warm_up
+
+        asyncio.run(executors.warm_process_pool(warm_up))
+    # One upload first, so codecs and imports are warm everywhere.
+    asyncio.run(_run(1))
+    elapsed = asyncio.run(_run(uploads))
+    executors.shutdown_process_executor()
+    return {
+        "total_ms": round(elapsed * 1000, 1),
+        "pages_per_s": round(uploads * pages / elapsed, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=8, help="concurrent PDF uploads per run")
+    parser.add_argument("--pages", type=int, default=convert_pipeline.MAX_PDF_PAGES)
+    parser.add_argument("--engine", choices=("pil", "numpy"), default=convert_pipeline.PREPROCESS_ENGINE)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    convert_pipeline.pdf_to_images = _synthetic_pages
+    convert_pipeline.MAX_PDF_PAGES = args.pages
+    convert_pipeline.PREPROCESS_ENGINE = args.engine
+    convert_pipeline.MODEL_ROUTING_ENABLED = False
+
+    worker_counts = []
+    workers = 1
+    while workers < args.max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+    worker_counts.append(args.max_workers)
+
+    results = {"thread": _measure("thread", 1, args.uploads, args.pages)}
+    for workers in worker_counts:
+        results[f"process_{workers}"] = _measure("process", workers, args.uploads, args.pages)
+    single = results["process_1"]["pages_per_s"]
+    for name, stats in results.items():
+        stats["speedup_vs_process_1"] = round(stats["pages_per_s"] / single, 2)
+
+    print(
+        json.dumps(
+            {
+                "cpus": os.cpu_count(),
+                "uploads": args.uploads,
+                "pages_per_upload": args.pages,
+                "page_size": list(PAGE_SIZE),
+                "engine": args.engine,
+                "cpu_workers": executors.CONVERT_CPU_WORKERS,
+                "backends": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import base64
 import io
 from pathlib import Path
 import sys
@@ -32,8 +31,7 @@ for i, img in enumerate(images):
     # Run AI-optimized preprocessing and save the processed JPEG for inspection.
     buf = io.BytesIO()
     img.save(buf, format="PNG")
-    processed_b64 = preprocess_image(buf.getvalue())
-    processed_bytes = base64.b64decode(processed_b64)
+    processed_bytes = preprocess_image(buf.getvalue()).data
     processed_img = Image.open(io.BytesIO(processed_bytes))
     processed_path = out_dir / f"page_{i+1}.processed.jpg"
     processed_img.save(processed_path, format="JPEG")
@@ -1,4 +1,3 @@
-import base64
 import os
 from pathlib import Path
 import sys
@@ -41,9 +40,8 @@ def main() -> None:
         )
 
     for i, img_path in enumerate(image_paths):
-        # The previous test saved processed JPEGs. We base64-encode those bytes here.
-        base64_image = base64.b64encode(img_path.read_bytes()).decode("utf-8")
-        raw = convert_image_to_latex(base64_image, context="general")
+        # The previous test saved processed JPEGs; Gemini takes the raw bytes.
+        raw = convert_image_to_latex(img_path.read_bytes(), context="general")
         cleaned = post_process_latex(raw)
 
         out_path = out_dir / f"page_{i+1}.tex"
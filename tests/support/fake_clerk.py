@@ -0,0 +1,43 @@
+"""
+Offline stand-in for Clerk authentication.
+
+install_fake_clerk() sets the CLERK_* variables the app checks at startup
+and replaces the token check in app.deps, so requests carrying
+``Authorization: Bearer <token>`` authenticate as one fixed user without any
+call to Clerk. Anything else is rejected like an invalid session (401).
+"""
+
+import os
+
+FAKE_CLERK_TOKEN = "fake-clerk-session"
+
+FAKE_CLERK_ENV = {
+    "CLERK_SECRET_KEY": "sk_test_fake",
+    "CLERK_ISSUER": "https://fake-clerk.invalid",
+    "CLERK_AUDIENCE": "monogram-tests",
+}
+
+
+def install_fake_clerk(token=FAKE_CLERK_TOKEN, user_id="user_fake_clerk"):
+    """Patch app.deps in this process; returns the headers to send."""
+    for name, value in FAKE_CLERK_ENV.items():
+        os.environ.setdefault(name, value)
+
+    from app import deps
+    from app.auth.clerk import ClerkAuthError, ClerkIdentity
+
+    identity = ClerkIdentity(
+        user_id=user_id,
+        email=f"{user_id}@example.com",
+        full_name="Fake Clerk User",
+        avatar_url=None,
+    )
+
+    def authenticate_request(method, url, headers):
+        authorization = {k.lower(): v for k, v in headers.items()}.get("authorization")
+        if authorization != f"Bearer {token}":
+            raise ClerkAuthError("Invalid or expired session token")
+        return identity
+
+    deps.authenticate_request = authenticate_request
+    return {"Authorization": f"Bearer {token}"}
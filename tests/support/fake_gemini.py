@@ -0,0 +1,247 @@
+"""
+Local stand-in for the Gemini REST API.
+
+Point the backend at it with GEMINI_BASE_URL=<server.base_url>. It answers
+``models/{model}:generateContent`` with a canned LaTeX document, and can add
+latency or fail a fraction of requests so benchmarks and tests run offline.
+
+Batched requests ("PAGE n" text before each image) get one canned document per
+page behind "%%% PAGE n %%%" delimiters, unless split_batches is False.
+Latency grows by latency_per_image_s for every image, and usage metadata
+counts tokens roughly like the real API (258 per image, ~4 chars per token).
+
+``:streamGenerateContent`` requests are answered as server-sent events, the
+text split into stream_chunk_chars pieces sent stream_chunk_delay_s apart.
+
+Requests whose system instruction asks for the document body only (see
+BODY_ONLY_MARKER) are answered with body_text instead, when it is set, and
+latency_per_output_token_s adds generation time per output token, so output
+modes can be compared offline.
+
+Quota errors can be injected three ways: error_rate (random fraction),
+fail_first (the first N requests) and capacity (requests arriving while
+`capacity` others are in flight), all answered with error_status and an
+optional Retry-After header.
+"""
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_LATEX = (
+    "\\documentclass[12pt]{article}\n"
+    "\\usepackage{amsmath,amssymb,amsfonts}\n"
+    "\\begin{document}\n"
+    "\\section{Notes}\n"
+    "$E = mc^2$\n"
+    "\\end{document}"
+)
+
+# Phrase in the body-only system prompt (services/gemini.py::BODY_SYSTEM_PROMPT).
+BODY_ONLY_MARKER = "The LaTeX document body only"
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency_s=0.0,
+        error_rate=0.0,
+        error_status=429,
+        text=DEFAULT_LATEX,
+        latency_per_image_s=0.0,
+        split_batches=True,
+        fail_first=0,
+        capacity=None,
+        retry_after_s=None,
+        stream_chunk_chars=16,
+        stream_chunk_delay_s=0.0,
+        body_text=None,
+        latency_per_output_token_s=0.0,
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency_s = latency_s
+        self.latency_per_image_s = latency_per_image_s
+        self.split_batches = split_batches
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.capacity = capacity
+        self.retry_after_s = retry_after_s
+        self.errors = 0
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay_s = stream_chunk_delay_s
+        self.text = text
+        self.body_text = body_text
+        self.latency_per_output_token_s = latency_per_output_token_s
+        self.lock = threading.Lock()
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *_args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        model = self.path.split("/models/", 1)[-1].split(":", 1)[0]
+
+        with server.lock:
+            server.requests.append({"path": self.path, "model": model, "body": body})
+            over_capacity = server.capacity is not None and server.in_flight >= server.capacity
+            fail = over_capacity or len(server.requests) <= server.fail_first
+            if not fail:
+                server.in_flight += 1
+                server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        if fail:
+            # Rejected before any work, like a quota check at the front door.
+            self._send_error()
+            return
+        try:
+            images, pages = _count_parts(body)
+            page_text = server.text
+            if server.body_text is not None and BODY_ONLY_MARKER in _system_instruction(body):
+                page_text = server.body_text
+            text = page_text
+            if pages > 1 and server.split_batches:
+                text = "\n".join(f"%%% PAGE {n} %%%\n{page_text}" for n in range(1, pages + 1))
+            delay = server.latency_s + server.latency_per_image_s * images
+            delay += server.latency_per_output_token_s * _output_tokens(text)
+            if delay:
+                time.sleep(delay)
+            if server.error_rate and random.random() < server.error_rate:
+                self._send_error()
+                return
+            if ":streamGenerateContent" in self.path:
+                self._send_stream(text, _prompt_tokens(body, images))
+            else:
+                self._send_json(200, _response_payload(text, _prompt_tokens(body, images)))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send_stream(self, text, prompt_tokens):
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, server.stream_chunk_chars)
+        pieces = [text[start:start + size] for start in range(0, len(text), size)] or [""]
+        for index, piece in enumerate(pieces):
+            if index and server.stream_chunk_delay_s:
+                time.sleep(server.stream_chunk_delay_s)
+            payload = _response_payload(piece, prompt_tokens)
+            if index < len(pieces) - 1:
+                # Only the last chunk carries usage (for the whole response) and a finish reason.
+                del payload["usageMetadata"]
+                del payload["candidates"][0]["finishReason"]
+            else:
+                payload["usageMetadata"]["candidatesTokenCount"] = _output_tokens(text)
+            event = f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_error(self):
+        server = self.server
+        with server.lock:
+            server.errors += 1
+        headers = {}
+        if server.retry_after_s is not None:
+            headers["Retry-After"] = str(server.retry_after_s)
+        self._send_json(server.error_status, _error_payload(server.error_status), headers)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _count_parts(body):
+    images = pages = 0
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "inlineData" in part:
+                images += 1
+            elif part.get("text", "").startswith("PAGE "):
+                pages += 1
+    return images, pages
+
+
+def _system_instruction(body):
+    return "".join(part.get("text", "") for part in body.get("systemInstruction", {}).get("parts", []))
+
+
+def _output_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _prompt_tokens(body, images):
+    chars = len(_system_instruction(body))
+    chars += sum(
+        len(part.get("text", ""))
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    return 258 * images + chars // 4
+
+
+def _response_payload(text, prompt_tokens=1290):
+    return {
+        "candidates": [
+            {
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+            }
+        ],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": _output_tokens(text),
+        },
+    }
+
+
+def _error_payload(status):
+    reason = {429: "RESOURCE_EXHAUSTED", 503: "UNAVAILABLE"}.get(status, "INTERNAL")
+    return {"error": {"code": status, "message": f"fake {reason}", "status": reason}}
+
+
+@contextmanager
+def run_fake_gemini(**kwargs):
+    server = FakeGeminiServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
@@ -0,0 +1,62 @@
+"""
+Fake rendered PDF pages and upload bodies for the API tests.
+
+api_tests/conftest.py wraps these in fixtures (fake_pdf, post_pdf). They
+live in an importable module, not in conftest, because the process CPU
+backend pickles the renderer by reference and spawned workers must be able
+to import it.
+"""
+
+import io
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw
+
+PDF_BYTES = b"%PDF-1.4 fake"
+
+
+def fake_pages(
+    count: int = 2,
+    size: Tuple[int, int] = (200, 200),
+    lines: int = 1,
+    extra_lines: int = 0,
+) -> List[Image.Image]:
+    """
+    `count` distinct grayscale pages. Page i is i pixels wider than `size`
+    and has `lines + i * extra_lines` pen lines, each a little longer than
+    the one on the page before, so no two pages share a cache key.
+    """
+    width, height = size
+    pages = []
+    for i in range(count):
+        img = Image.new("L", (width + i, height), color=255)
+        draw = ImageDraw.Draw(img)
+        rows = lines + i * extra_lines
+        step = max(8, (height - 60) // max(1, rows))
+        for row in range(rows):
+            y = 30 + row * step
+            draw.line((10, y, width * 3 // 4 + 10 * i + 5 * row, y + step // 2), fill=0, width=4)
+        pages.append(img)
+    return pages
+
+
+def render_fake_pages(*_args, count: int = 2, size=(200, 200), lines: int = 1, extra_lines: int = 0, **_kwargs):
+    """Stands in for pdf_to_images (bind the options with functools.partial)."""
+    return fake_pages(count, size, lines, extra_lines)
+
+
+def pdf_upload(data: bytes = PDF_BYTES, filename: str = "notes.pdf") -> dict:
+    """`files=` for a PDF upload; build a new one per request."""
+    return {"file": (filename, io.BytesIO(data), "application/pdf")}
+
+
+def jpeg_bytes(size: Tuple[int, int] = (64, 64)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color="white").save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def png_bytes(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()